@@ -0,0 +1,227 @@
+"""Template-rate anomalies before error anchors (suggested precursors).
+
+Every mined line (template id + timestamp) is counted per
+``(template, time bucket)``. Keys are buffered, and each sorted batch is merged
+into sorted arrays of distinct keys and their counts (16 bytes per distinct
+key, not per line), so a window count is two binary searches and is exact.
+Exact counts matter because they are compared against exact baselines: an
+overestimate (as from a count-min sketch that is far narrower than the number
+of keys) makes steady background templates look like bursts. Past
+``max_keys`` distinct keys the oldest buckets are dropped, and windows that
+reach into dropped buckets are not scored.
+
+For the ``precursor_before`` window ahead of each anchor window, every
+template active there (per the miner's minute histogram) is checked against
+its bundle-wide baseline rate ``lines / span`` (exact per-template totals):
+
+* ``new``   - the template's first occurrence in the whole bundle falls in the
+  window;
+* ``burst`` - at least ``min_count`` lines in the window and a Poisson tail
+  probability below ``p_value`` given the baseline rate.
+
+Templates of the anchor lines and templates already matched by a precursor
+rule are skipped. The candidates carry a regex built from the template that
+can be passed to :func:`analyzer.learn.add_feedback` as a new precursor
+pattern.
+"""
+from __future__ import annotations
+
+import math
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from .templates import WILDCARD, TemplateMiner
+
+DEFAULTS = {
+    "bucket_ms": 1000,
+    "max_keys": 1 << 22,  # distinct (template, bucket) keys kept before the oldest buckets are dropped
+    "min_count": 3,
+    "p_value": 1e-3,
+    "max_suggestions": 10,  # per code
+}
+
+_BUCKET_BITS = 32
+_BUCKET_MASK = (1 << _BUCKET_BITS) - 1
+_FLUSH_KEYS = 1 << 16
+
+
+class BucketCounts:
+    """Exact counts of non-negative integer keys ``(tid << 32) | bucket``, kept sorted for range sums."""
+
+    def __init__(self, max_keys: int = DEFAULTS["max_keys"]):
+        self.max_keys = max(1, int(max_keys))
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.min_bucket = 0  # buckets below this were dropped
+        self._pending: List[int] = []
+
+    def add(self, key: int) -> None:
+        self._pending.append(key)
+        if len(self._pending) >= _FLUSH_KEYS:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        new_keys, new_counts = np.unique(np.asarray(self._pending, dtype=np.uint64), return_counts=True)
+        self._pending = []
+        if self.min_bucket:
+            keep = (new_keys & np.uint64(_BUCKET_MASK)) >= np.uint64(self.min_bucket)
+            new_keys, new_counts = new_keys[keep], new_counts[keep]
+        # merge the sorted batch into the sorted store: O(batch log n) searches
+        # plus one O(n) insert, instead of re-sorting every stored key
+        pos = np.searchsorted(self.keys, new_keys)
+        found = pos < len(self.keys)
+        found[found] = self.keys[pos[found]] == new_keys[found]
+        self.counts[pos[found]] += new_counts[found]
+        fresh = ~found
+        self.keys = np.insert(self.keys, pos[fresh], new_keys[fresh])
+        self.counts = np.insert(self.counts, pos[fresh], new_counts[fresh])
+        if len(self.keys) > self.max_keys:
+            self._drop_oldest()
+            keep = (self.keys & np.uint64(_BUCKET_MASK)) >= np.uint64(self.min_bucket)
+            self.keys, self.counts = self.keys[keep], self.counts[keep]
+
+    def _drop_oldest(self) -> None:
+        # keep the newest ~3/4 of the cap so drops are not repeated on every flush
+        buckets = np.sort(self.keys & np.uint64(_BUCKET_MASK))
+        self.min_bucket = max(self.min_bucket, int(buckets[len(buckets) - self.max_keys * 3 // 4]))
+
+    def count(self, tid: int, first_bucket: int, last_bucket: int) -> int:
+        """Lines of ``tid`` in buckets ``first_bucket..last_bucket`` (inclusive)."""
+        if self._pending:
+            self.flush()
+        lo = np.searchsorted(self.keys, np.uint64((tid << _BUCKET_BITS) | first_bucket), side="left")
+        hi = np.searchsorted(self.keys, np.uint64((tid << _BUCKET_BITS) | last_bucket), side="right")
+        return int(self.counts[lo:hi].sum())
+
+
+def poisson_sf(k: int, lam: float) -> float:
+    """P(X >= k) for X ~ Poisson(lam)."""
+    if k <= 0:
+        return 1.0
+    if lam <= 0:
+        return 0.0
+    log_lam = math.log(lam)
+    cdf = sum(math.exp(i * log_lam - lam - math.lgamma(i + 1)) for i in range(k))
+    return max(0.0, 1.0 - cdf)
+
+
+def suggest_pattern(template: str) -> str:
+    """Regex for a template; the leading time stamp is dropped and ``<*>`` matches any token text."""
+    tokens = template.split()
+    while tokens and WILDCARD in tokens[0] and not tokens[0].replace(WILDCARD, "").strip("[]:.- "):
+        tokens.pop(0)  # "[<*>:<*>:<*>]" and other all-variable leading tokens
+    parts = [re.escape(tok).replace(re.escape(WILDCARD), r"\S*") for tok in tokens]
+    return r"\s+".join(parts)
+
+
+def _rank(cand: Dict[str, Any]):
+    return (cand["kind"] != "new", cand["p_value"], cand["count"])
+
+
+class RateAnomalies:
+    """Feed ``(template id, ts)`` of every line, then ask for precursor candidates per code."""
+
+    def __init__(self, options: Optional[Dict[str, Any]] = None):
+        opts = {**DEFAULTS, **(options or {})}
+        self.bucket_ms = int(opts["bucket_ms"])
+        self.min_count = int(opts["min_count"])
+        self.p_value = float(opts["p_value"])
+        self.max_suggestions = int(opts["max_suggestions"])
+        self.buckets = BucketCounts(int(opts["max_keys"]))
+        self.totals: Dict[int, int] = {}  # timestamped lines per template
+        self.first_ts: Optional[int] = None
+        self.last_ts: Optional[int] = None
+
+    def add(self, tid: int, ts: int) -> None:
+        self.buckets.add((tid << _BUCKET_BITS) | (ts // self.bucket_ms))
+        self.totals[tid] = self.totals.get(tid, 0) + 1
+        if self.first_ts is None or ts < self.first_ts:
+            self.first_ts = ts
+        if self.last_ts is None or ts > self.last_ts:
+            self.last_ts = ts
+
+    def window_count(self, tid: int, start_ts: int, end_ts: int) -> Optional[int]:
+        """Lines of ``tid`` in the buckets overlapping ``[start_ts, end_ts)``; None if they were dropped."""
+        first, last = max(0, start_ts) // self.bucket_ms, (end_ts - 1) // self.bucket_ms
+        if first < self.buckets.min_bucket:
+            return None
+        return self.buckets.count(tid, first, last)
+
+    def _span_ms(self) -> int:
+        if self.first_ts is None:
+            return self.bucket_ms
+        return max(self.bucket_ms, self.last_ts - self.first_ts + self.bucket_ms)
+
+    def score(
+        self,
+        miner: TemplateMiner,
+        anchor_ts: int,
+        before_ms: int,
+        skip: Iterable[int] = (),
+        known: Optional[Callable[[str], bool]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Candidates in ``[anchor_ts - before_ms, anchor_ts)``: new templates first, then by p-value.
+
+        ``known(sample_text)`` returning True marks a template as already
+        covered (e.g. ``RuleSet.is_precursor``).
+        """
+        start = anchor_ts - before_ms
+        # the count covers whole buckets, so the baseline does too
+        window_ms = ((anchor_ts - 1) // self.bucket_ms - max(0, start) // self.bucket_ms + 1) * self.bucket_ms
+        span_ms = self._span_ms()
+        skip_set: Set[int] = set(skip)
+        found = []
+        for tid in miner.active_between(start, anchor_ts - 1):
+            tmpl = miner.templates[tid]
+            if tid in skip_set or tmpl.first_ts >= anchor_ts:
+                continue
+            observed = self.window_count(tmpl.id, start, anchor_ts)
+            if not observed:
+                continue
+            expected = self.totals.get(tmpl.id, 0) * window_ms / span_ms
+            p = poisson_sf(observed, expected)
+            is_new = tmpl.first_ts >= start
+            if not is_new and (observed < self.min_count or p >= self.p_value):
+                continue
+            if known is not None and known(tmpl.sample):
+                continue
+            found.append({
+                "tid": tmpl.id,
+                "kind": "new" if is_new else "burst",
+                "template": tmpl.text,
+                "sample": tmpl.sample,
+                "pattern": suggest_pattern(tmpl.text),
+                "observed": observed,
+                "expected": round(expected, 3),
+                "p_value": p,
+                "count": tmpl.count,
+                "first_ts": tmpl.first_ts,
+                "dt_ms": tmpl.first_ts - anchor_ts if is_new else None,
+            })
+        found.sort(key=_rank)
+        return found[: self.max_suggestions]
+
+    def suggest(
+        self,
+        miner: TemplateMiner,
+        code_windows: Dict[str, Any],
+        before_ms: int,
+        skip: Iterable[int] = (),
+        known: Optional[Callable[[str], bool]] = None,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Per code, candidates over all its windows (strongest occurrence per template kept)."""
+        skip = set(skip)
+        out: Dict[str, List[Dict[str, Any]]] = {}
+        for code, windows in code_windows.items():
+            best: Dict[int, Dict[str, Any]] = {}
+            for start, _end in windows:
+                for cand in self.score(miner, start, before_ms, skip, known):
+                    prev = best.get(cand["tid"])
+                    if prev is None or _rank(cand) < _rank(prev):
+                        best[cand["tid"]] = cand
+            out[code] = sorted(best.values(), key=_rank)[: self.max_suggestions]
+        return out
@@ -71,17 +71,17 @@ def _scan_err_maps(texts: Iterable[Tuple[str, str]]) -> Dict[str, Dict]:
             map_num_to_name[num] = name
             map_name_to_num[name] = num
             provenance.setdefault(num, []).append(
-                {"file": filename, "kind": "define", "line": _first_line(text, name)}
+                {"file": filename, "kind": "define", "line": _first_line(text, name), "name": name}
             )
         for block in RX_ENUM_BLOCK.findall(text):
             for name, num in RX_ENUM_KV.findall(block):
                 map_num_to_name[num] = name
                 map_name_to_num[name] = num
-                provenance.setdefault(num, []).append({"file": filename, "kind": "enum-kv"})
+                provenance.setdefault(num, []).append({"file": filename, "kind": "enum-kv", "name": name})
         for name, num in RX_CS_CONST.findall(text):
             map_num_to_name[num] = name
             map_name_to_num[name] = num
-            provenance.setdefault(num, []).append({"file": filename, "kind": "cs-const"})
+            provenance.setdefault(num, []).append({"file": filename, "kind": "cs-const", "name": name})
 
     return {
         "map_num_to_name": map_num_to_name,
@@ -90,6 +90,54 @@ def _scan_err_maps(texts: Iterable[Tuple[str, str]]) -> Dict[str, Dict]:
     }
 
 
+def _iter_sections(index: Dict) -> Iterator[Tuple[str, Dict]]:
+    if "map_num_to_name" in index:
+        yield "source", index
+        return
+    for key, section in index.items():
+        if key in ("meta", "error_lookup") or not isinstance(section, dict):
+            continue
+        if isinstance(section.get("map_num_to_name"), dict):
+            yield key, section
+
+
+def build_error_lookup(index: Dict) -> Dict[str, Dict]:
+    """Resolve every error number across bundles into one display name.
+
+    Numbers defined with more than one name (within a bundle or across
+    vehicle/motion) are listed in ``conflicts`` and displayed as
+    ``"NAME_A / NAME_B"`` instead of silently keeping the last writer.
+    """
+
+    # num -> name -> [{"source", "file"}], insertion ordered so the display is stable.
+    names: Dict[str, Dict[str, list]] = {}
+    for source, section in _iter_sections(index or {}):
+        provenance = section.get("provenance") or {}
+        for num, name in section["map_num_to_name"].items():
+            per_name = names.setdefault(str(num), {})
+            entries = [p for p in provenance.get(num, []) if p.get("name")]
+            if not entries:
+                # Indexes saved before provenance carried names only know the winner.
+                per_name.setdefault(name, []).append({"source": source, "file": None})
+                continue
+            for prov in entries:
+                per_name.setdefault(prov["name"], []).append({"source": source, "file": prov.get("file")})
+
+    display_map: Dict[str, str] = {}
+    conflicts: Dict[str, Dict] = {}
+    for num, per_name in names.items():
+        display_map[num] = " / ".join(per_name)
+        if len(per_name) > 1:
+            conflicts[num] = {
+                "names": list(per_name),
+                "sources": [
+                    {"name": name, **ref} for name, refs in per_name.items() for ref in refs
+                ],
+            }
+
+    return {"display_map": display_map, "conflicts": conflicts}
+
+
 def build_source_index(
     *, vehicle_zip_bytes: bytes | None = None, motion_zip_bytes: bytes | None = None
 ) -> Dict[str, Dict]:
@@ -120,9 +168,11 @@ def build_source_index(
     if not required_sources:
         raise ValueError("최소 하나 이상의 코드 ZIP이 필요합니다.")
 
+    result["error_lookup"] = build_error_lookup(result)
     result["meta"] = {
         "required_sources": required_sources,
         "cycle_ms": 1,
+        "conflict_count": len(result["error_lookup"]["conflicts"]),
     }
     return result
 
@@ -1,11 +1,56 @@
 from __future__ import annotations
 
+import copy
+import os
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain, islice
 from pathlib import Path
 import re
-from typing import Dict, Iterable, List, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Pattern, Tuple
 
 from .report import ms_to_hms
+from .storage import SOURCE_INDEX_FILE
+
+DIAGNOSTIC_STAGES = ("source_context", "keyword_hints", "scenario", "commentary")
+
+_WS_RX = re.compile(r"\s+")
+_AXIS_RX = re.compile(r"AXIS(\d)")
+
+# Scenario entities, each with patterns in priority order: a higher-ranked
+# pattern anywhere in the scanned lines wins over an earlier lower-ranked hit.
+_Extractor = Tuple[Pattern[str], Callable[[re.Match], str]]
+_ENTITY_EXTRACTORS: Dict[str, Tuple[_Extractor, ...]] = {
+    "vehicle": (
+        (re.compile(r"\b(?:OHT|AGV|VEH(?:ICLE)?|CAR)[-_ ]?(\d{1,4})\b", re.I), lambda m: f"{m.group(1)}번"),
+        (re.compile(r"\bV(?:EHICLE)?[:= ]?(\d{1,4})\b", re.I), lambda m: f"{m.group(1)}번"),
+        (re.compile(r"\bCAR_ID[:= ]?(\d{1,4})\b", re.I), lambda m: f"{m.group(1)}번"),
+    ),
+    "node": (
+        (re.compile(r"\bNODE[:= ]?([A-Z0-9_-]{2,})\b", re.I), lambda m: m.group(1)),
+        (re.compile(r"\bSTATION[:= ]?([A-Z0-9_-]{2,})\b", re.I), lambda m: m.group(1)),
+        (re.compile(r"\bPORT[:= ]?([A-Z0-9_-]{2,})\b", re.I), lambda m: m.group(1)),
+        (re.compile(r"\bN(\d{2,})\b"), lambda m: m.group(1)),
+    ),
+    "activity": (
+        (re.compile(r"\b(LOAD|UNLOAD|LIFT|DROP|HOIST)\b", re.I), lambda m: "이적재"),
+        (re.compile(r"\b(TRANSFER|PASS)\b", re.I), lambda m: "이동"),
+        (re.compile(r"\b(DRIVE|RUN|MOVE|TRAVEL)\b", re.I), lambda m: "주행"),
+        (re.compile(r"\b(DOCK|ALIGN)\b", re.I), lambda m: "도킹"),
+    ),
+    "sensor": (
+        (re.compile(r"\b([A-Z0-9_]+SENSOR)\b"), lambda m: m.group(1)),
+        (re.compile(r"\b([A-Z0-9_]+_SIG)\b"), lambda m: m.group(1)),
+        (re.compile(r"([가-힣A-Za-z0-9_]+센서)"), lambda m: m.group(1)),
+    ),
+}
+
+# Only the first anchor/drive lines describe the situation; long incidents can
+# carry megabytes of repeats, so the scan is capped per source and per line.
+ENTITY_SCAN_MAX_LINES = 100
+ENTITY_SCAN_MAX_CHARS = 512
 
 
 def _build_path_maps(meta: Dict) -> Tuple[Dict[str, Path], List[Path]]:
@@ -88,9 +133,47 @@ def _context_from_source(file_ref: str, line_no: int, meta: Dict, window: int =
     return ctx
 
 
+def _index_version(meta: Dict) -> Tuple[Tuple[int, int], Any]:
+    """Changes on every re-index: the index file's (mtime_ns, size) and the version saved in it."""
+    try:
+        st = os.stat(SOURCE_INDEX_FILE)
+        stamp = (st.st_mtime_ns, st.st_size)
+    except OSError:  # built-in default system index, fixed for the process
+        stamp = (0, 0)
+    return stamp, meta.get("index_version")
+
+
 def _collect_source_context(code: str, name: str, code_index: Dict, max_blocks: int = 2) -> List[Dict]:
+    """Source snippets for ``code``, cached until the source index is rebuilt.
+
+    The cache is keyed on the index version (see :func:`_index_version`), not on
+    the indexed source paths: edits to the sources show up after a re-index,
+    which is also what refreshes the provenance line numbers.
+    """
     provenance = code_index.get("provenance", {}).get(code, [])
     meta = code_index.get("meta", {})
+    prov_key = tuple((p.get("file", ""), p.get("line", -1)) for p in provenance[:max_blocks])
+    paths_key = tuple(str(raw) for raw in meta.get("paths", []))
+    version = _index_version(meta)
+    blocks = _collect_source_context_cached(code, name, prov_key, paths_key, max_blocks, version)
+    return copy.deepcopy(blocks)  # the cached blocks are shared between reports
+
+
+@lru_cache(maxsize=512)
+def _collect_source_context_cached(
+    code: str,
+    name: str,
+    prov_key: Tuple[Tuple[str, int], ...],
+    paths_key: Tuple[str, ...],
+    max_blocks: int,
+    version: Tuple[Tuple[int, int], Any],
+) -> List[Dict]:
+    # Memoised per (code, name), the index inputs that drive the lookup and the
+    # index version, so re-running a report does not re-read the same source
+    # files but a re-index does.  Only the wrapper above calls this; it hands
+    # out copies.
+    provenance = [{"file": f, "line": line} for f, line in prov_key]
+    meta = {"paths": list(paths_key)}
     blocks = []
     for prov in provenance[:max_blocks]:
         ctx = _context_from_source(prov.get("file", ""), prov.get("line", -1), meta)
@@ -195,9 +278,7 @@ def _keyword_hints(tokens: Iterable[str]) -> Tuple[str | None, List[str]]:
 
 
 def _axis_description(name: str, axis_map: Dict[str, str]) -> str | None:
-    import re
-
-    m = re.search(r"AXIS(\d)", name)
+    m = _AXIS_RX.search(name)
     if not m:
         return None
     axis = m.group(1)
@@ -223,57 +304,30 @@ def _summarize_drive(entries: List[Dict]) -> List[str]:
     return out
 
 
-def _extract_vehicle(text: str) -> str | None:
-    patterns = [
-        re.compile(r"\b(?:OHT|AGV|VEH(?:ICLE)?|CAR)[-_ ]?(\d{1,4})\b", re.I),
-        re.compile(r"\bV(?:EHICLE)?[:= ]?(\d{1,4})\b", re.I),
-        re.compile(r"\bCAR_ID[:= ]?(\d{1,4})\b", re.I),
-    ]
-    for rx in patterns:
-        m = rx.search(text)
-        if m:
-            return f"{m.group(1)}번"
-    return None
-
+def _extract_entities(lines: Iterable[str]) -> Dict[str, str | None]:
+    """Scan ``lines`` once for every scenario entity.
 
-def _extract_node(text: str) -> str | None:
-    patterns = [
-        re.compile(r"\bNODE[:= ]?([A-Z0-9_-]{2,})\b", re.I),
-        re.compile(r"\bSTATION[:= ]?([A-Z0-9_-]{2,})\b", re.I),
-        re.compile(r"\bPORT[:= ]?([A-Z0-9_-]{2,})\b", re.I),
-        re.compile(r"\bN(\d{2,})\b"),
-    ]
-    for rx in patterns:
-        m = rx.search(text)
-        if m:
-            return m.group(1)
-    return None
-
-
-def _extract_activity(text: str) -> str | None:
-    keywords = [
-        (re.compile(r"\b(LOAD|UNLOAD|LIFT|DROP|HOIST)\b", re.I), "이적재"),
-        (re.compile(r"\b(TRANSFER|PASS)\b", re.I), "이동"),
-        (re.compile(r"\b(DRIVE|RUN|MOVE|TRAVEL)\b", re.I), "주행"),
-        (re.compile(r"\b(DOCK|ALIGN)\b", re.I), "도킹"),
-    ]
-    for rx, label in keywords:
-        if rx.search(text):
-            return label
-    return None
-
-
-def _extract_sensor(text: str) -> str | None:
-    rx_list = [
-        re.compile(r"\b([A-Z0-9_]+SENSOR)\b"),
-        re.compile(r"\b([A-Z0-9_]+_SIG)\b"),
-        re.compile(r"([가-힣A-Za-z0-9_]+센서)"),
-    ]
-    for rx in rx_list:
-        m = rx.search(text)
-        if m:
-            return m.group(1)
-    return None
+    Each line is only tested against patterns that outrank the best hit so
+    far, and an entity drops out as soon as its top-ranked pattern matches.
+    """
+    best: Dict[str, Tuple[int, str]] = {}
+    pending = set(_ENTITY_EXTRACTORS)
+    for line in lines:
+        if not pending:
+            break
+        line = line[:ENTITY_SCAN_MAX_CHARS]
+        for entity in tuple(pending):
+            extractors = _ENTITY_EXTRACTORS[entity]
+            limit = best[entity][0] if entity in best else len(extractors)
+            for rank in range(limit):
+                rx, fmt = extractors[rank]
+                m = rx.search(line)
+                if m:
+                    best[entity] = (rank, fmt(m))
+                    if rank == 0:
+                        pending.discard(entity)
+                    break
+    return {entity: best[entity][1] if entity in best else None for entity in _ENTITY_EXTRACTORS}
 
 
 def _describe_source(snippet: str) -> Tuple[str, str, str]:
@@ -290,14 +344,16 @@ def _build_scenario(
     drive: List[Dict],
     source_snippets: List[str],
 ) -> str:
-    anchor_texts = [a.get("text", "") for a in anchors]
-    drive_texts = [d.get("text", "") for d in drive]
-    combined_text = " ".join(anchor_texts + drive_texts)
-
-    vehicle = _extract_vehicle(combined_text)
-    node = _extract_node(combined_text)
-    activity = _extract_activity(combined_text)
-    sensor = _extract_sensor(combined_text)
+    entities = _extract_entities(
+        chain(
+            (a.get("text", "") for a in islice(anchors, ENTITY_SCAN_MAX_LINES)),
+            (d.get("text", "") for d in islice(drive, ENTITY_SCAN_MAX_LINES)),
+        )
+    )
+    vehicle = entities["vehicle"]
+    node = entities["node"]
+    activity = entities["activity"]
+    sensor = entities["sensor"]
 
     subject = "해당 차량"
     if vehicle:
@@ -319,7 +375,7 @@ def _build_scenario(
     subject_part = f"{subject}은"
 
     def _clean_log_text(text: str) -> str:
-        trimmed = re.sub(r"\s+", " ", text.strip())
+        trimmed = _WS_RX.sub(" ", text.strip())
         if len(trimmed) > 120:
             return trimmed[:117] + "..."
         return trimmed
@@ -404,7 +460,7 @@ def _format_log_entry(entry: Dict) -> str:
     prefix = f"[{ts}] " if ts else ""
     file_ref = entry.get("file") or ""
     text = entry.get("text") or ""
-    text = re.sub(r"\s+", " ", text.strip())
+    text = _WS_RX.sub(" ", text.strip())
     return f"{prefix}{file_ref} :: {text}".strip()
 
 
@@ -494,69 +550,150 @@ def _compose_detailed_commentary(
     return "\n".join(sections).rstrip()
 
 
-def generate_diagnostic_report(result: Dict, rules) -> List[Dict]:
-    diagnostics: List[Dict] = []
+def _group_by_code(result: Dict) -> Dict[str, Dict]:
+    grouped = result.get("by_code")
+    if isinstance(grouped, dict):
+        return grouped
+
+    # Results produced before the engine carried per-code groupings.
+    grouped = {}
+
+    def _group(code) -> Dict:
+        return grouped.setdefault(
+            str(code), {"anchors": [], "precursors": [], "drive_samples": [], "banner": None}
+        )
+
+    for b in result.get("banner", []):
+        group = _group(b.get("code"))
+        if group["banner"] is None:
+            group["banner"] = b
+    for key in ("anchors", "precursors", "drive_samples"):
+        for rec in result.get(key, []):
+            _group(rec.get("code"))[key].append(rec)
+    return grouped
+
+
+def _diagnose_code(
+    code: str,
+    name: str,
+    banner: Dict,
+    group: Dict,
+    code_index: Dict,
+    axis_map: Dict[str, str],
+) -> Tuple[Dict, Dict[str, float]]:
+    timings = dict.fromkeys(DIAGNOSTIC_STAGES, 0.0)
+    anchors = group.get("anchors", [])
+    precursors = group.get("precursors", [])
+    drive = group.get("drive_samples", [])
+    banner_info = group.get("banner") or banner
+
+    t0 = time.perf_counter()
+    source_blocks = _collect_source_context(code, name, code_index)
+    source_snippets = _flatten_context(source_blocks)
+    t1 = time.perf_counter()
+    timings["source_context"] = t1 - t0
+
+    tokens: List[str] = [name]
+    for sn in source_snippets:
+        tokens.append(sn)
+    cause, actions = _keyword_hints(tokens)
+    axis_info = _axis_description(name, axis_map)
+    t2 = time.perf_counter()
+    timings["keyword_hints"] = t2 - t1
+
+    summary_parts = [
+        f"총 {banner.get('count', 0)}회 발생",
+        f"구간 {ms_to_hms(banner.get('first'))} ~ {ms_to_hms(banner.get('last'))}",
+    ]
+    if axis_info:
+        summary_parts.append(axis_info)
+
+    if not cause:
+        cause = "소스 코드 스니펫을 확인하여 상세 원인을 판단하세요."
+
+    if not actions:
+        actions = ["관련 하드웨어 상태와 인터록을 점검하고 이상 시 재기동 절차를 수행합니다."]
+
+    scenario_timeline = _build_scenario(anchors, precursors, drive, source_snippets)
+    t3 = time.perf_counter()
+    timings["scenario"] = t3 - t2
+
+    detailed_commentary = _compose_detailed_commentary(
+        banner_info,
+        axis_info,
+        cause,
+        actions,
+        anchors,
+        precursors,
+        drive,
+        scenario_timeline,
+    )
+    timings["commentary"] = time.perf_counter() - t3
+
+    diagnostic = {
+        "code": code,
+        "name": name,
+        "summary": ", ".join(summary_parts),
+        "root_cause": cause,
+        "actions": actions,
+        "scenario": detailed_commentary,
+        "precursors": _summarize_precursors(precursors),
+        "drive": _summarize_drive(drive),
+        "log_samples": [a.get("text", "") for a in anchors[:3]],
+        "code_snippets": source_snippets,
+    }
+    return diagnostic, timings
+
+
+def generate_diagnostic_report(
+    result: Dict,
+    rules,
+    max_workers: int | None = None,
+    timings: Dict[str, float] | None = None,
+) -> List[Dict]:
+    """Build one diagnostic per banner code, in banner order.
+
+    Codes are diagnosed independently on a thread pool of ``max_workers``
+    threads (``diagnostics.max_workers`` from the app config when omitted;
+    ``1`` runs serially). When ``timings`` is given it is filled with the
+    seconds spent per stage, summed over codes, plus the wall-clock ``total``.
+    """
+    started = time.perf_counter()
     code_index = getattr(rules, "code_index", {}) or {}
     axis_map = rules.rules.get("axis_map", {})
 
-    for banner in result.get("banner", []):
+    banners = result.get("banner", [])
+    names = rules.error_names(b.get("code") for b in banners)
+    grouped = _group_by_code(result)
+
+    jobs = []
+    for banner, name in zip(banners, names):
         code = str(banner.get("code"))
-        name = rules.error_map.get(code, "")
-        anchors = [a for a in result.get("anchors", []) if str(a.get("code")) == code]
-        precursors = [p for p in result.get("precursors", []) if str(p.get("code")) == code]
-        drive = [d for d in result.get("drive_samples", []) if str(d.get("code")) == code]
-
-        source_blocks = _collect_source_context(code, name, code_index)
-        source_snippets = _flatten_context(source_blocks)
-        tokens: List[str] = [name]
-        for sn in source_snippets:
-            tokens.append(sn)
-        cause, actions = _keyword_hints(tokens)
-        axis_info = _axis_description(name, axis_map)
-
-        summary_parts = [
-            f"총 {banner.get('count', 0)}회 발생",
-            f"구간 {ms_to_hms(banner.get('first'))} ~ {ms_to_hms(banner.get('last'))}",
-        ]
-        if axis_info:
-            summary_parts.append(axis_info)
-
-        if not cause:
-            cause = "소스 코드 스니펫을 확인하여 상세 원인을 판단하세요."
-
-        if not actions:
-            actions = ["관련 하드웨어 상태와 인터록을 점검하고 이상 시 재기동 절차를 수행합니다."]
-
-        scenario_timeline = _build_scenario(anchors, precursors, drive, source_snippets)
-
-        banner_info = next(
-            (b for b in result.get("banner", []) if str(b.get("code")) == code),
-            None,
-        )
+        jobs.append((code, name, banner, grouped.get(code, {}), code_index, axis_map))
 
-        detailed_commentary = _compose_detailed_commentary(
-            banner_info,
-            axis_info,
-            cause,
-            actions,
-            anchors,
-            precursors,
-            drive,
-            scenario_timeline,
-        )
+    if max_workers is None:
+        from core.config import load_config
 
-        diagnostics.append({
-            "code": code,
-            "name": name,
-            "summary": ", ".join(summary_parts),
-            "root_cause": cause,
-            "actions": actions,
-            "scenario": detailed_commentary,
-            "precursors": _summarize_precursors(precursors),
-            "drive": _summarize_drive(drive),
-            "log_samples": [a.get("text", "") for a in anchors[:3]],
-            "code_snippets": source_snippets,
-        })
+        max_workers = int(load_config().get("diagnostics", {}).get("max_workers", 1) or 1)
+    workers = max(1, min(max_workers, len(jobs)))
 
-    return diagnostics
+    if workers == 1:
+        outcomes = [_diagnose_code(*job) for job in jobs]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="diagnostics") as pool:
+            # map() yields in submission order, so output order stays deterministic.
+            outcomes = list(pool.map(lambda job: _diagnose_code(*job), jobs))
 
+    diagnostics: List[Dict] = []
+    stage_totals = dict.fromkeys(DIAGNOSTIC_STAGES, 0.0)
+    for diagnostic, stage_times in outcomes:
+        diagnostics.append(diagnostic)
+        for stage, seconds in stage_times.items():
+            stage_totals[stage] += seconds
+
+    if timings is not None:
+        timings.update(stage_totals)
+        timings["total"] = time.perf_counter() - started
+        timings["workers"] = workers
+
+    return diagnostics
@@ -1,9 +1,13 @@
 from __future__ import annotations
-from typing import Dict, Any, Iterable, Optional, Set
-from collections import defaultdict
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+import heapq
+from bisect import bisect_right
+from collections import defaultdict, deque
 
 from .parser import iter_logs, find_time_ms
 from .rules import RuleSet
+from .anomaly import RateAnomalies
+from .templates import TemplateMiner
 from . import storage
 from core.config import load_config
 
@@ -65,16 +69,23 @@ def analyze(
 ) -> Dict[str, Any]:
     assert_required_sources(source_mode)
     code_filter = _normalize_target_codes(target_codes)
+    cfg = load_config()
+    miner = TemplateMiner(cfg.get("templates"))
+    rates = RateAnomalies(cfg.get("anomaly"))
     lines = []
     by_cat = defaultdict(list)
     for fname, text in iter_logs(paths):
         cat = rules.categorize(fname)
         for raw in text.splitlines():
             ts = find_time_ms(raw)
-            rec = {"file": fname, "cat": cat, "ts": ts, "text": raw}
+            tid = miner.add(raw, ts, cat) if raw and not raw.isspace() else None
+            if tid is not None and ts is not None:
+                rates.add(tid, ts)
+            rec = {"file": fname, "cat": cat, "ts": ts, "text": raw, "tid": tid}
             lines.append(rec); by_cat[cat].append(rec)
 
     anchors = []
+    anchor_tids = set()
     for rec in lines:
         for _, code in rules.match_anchors(rec["text"]):
             if rec["ts"] is None:
@@ -83,6 +94,7 @@ def analyze(
             if code_filter and code_str not in code_filter:
                 continue
             anchors.append({"code": code_str, "ts": rec["ts"], "file": rec["file"], "text": rec["text"]})
+            anchor_tids.add(rec["tid"])
     anchors.sort(key=lambda x: x["ts"])
 
     wnd = rules.windows
@@ -101,16 +113,16 @@ def analyze(
         merged.append(tuple(cur))
         code_windows[code] = merged
 
+    precursor_lines = [rec for rec in lines if rec["ts"] is not None and rules.is_precursor(rec["text"])]
     precursors = []
     for code, merged in code_windows.items():
         for (start,end) in merged:
             first_anchor = start
             window_start = first_anchor - wnd["precursor_before"]*1000
             window_end   = first_anchor + wnd["precursor_after"]*1000
-            for rec in lines:
+            for rec in precursor_lines:
                 ts = rec["ts"]
-                if ts is None: continue
-                if window_start <= ts <= window_end and rules.is_precursor(rec["text"]):
+                if window_start <= ts <= window_end:
                     precursors.append({
                         "code": code, "file": rec["file"], "cat": rec["cat"], "ts": ts,
                         "dt_ms": ts - first_anchor, "text": rec["text"]
@@ -125,16 +137,30 @@ def analyze(
                 if anchor-10000 <= rec["ts"] <= anchor+10000:
                     drive_samples.append({"code": code, "file": rec["file"], "ts": rec["ts"], "text": rec["text"]})
 
+    by_code: Dict[str, Dict[str, Any]] = {
+        code: {"anchors": [], "precursors": [], "drive_samples": []} for code in code_windows
+    }
+    suggested = rates.suggest(miner, code_windows, wnd["precursor_before"]*1000, anchor_tids, rules.is_precursor)
+    for code, found in suggested.items():
+        by_code[code]["suggested_precursors"] = found
+    for a in anchors:
+        by_code[a["code"]]["anchors"].append(a)
+    for p in precursors:
+        by_code[p["code"]]["precursors"].append(p)
+    for d in drive_samples:
+        by_code[d["code"]]["drive_samples"].append(d)
+
     banner = []
     for code, merged in code_windows.items():
-        cnt = sum(1 for a in anchors if a["code"]==code)
+        group = by_code[code]
         b = {
-            "code": code, "count": cnt,
+            "code": code, "count": len(group["anchors"]),
             "first": merged[0][0], "last": merged[-1][1],
-            "precursor_present": any(p["code"]==code for p in precursors),
-            "drive_evidence": any(s["code"]==code for s in drive_samples)
+            "precursor_present": bool(group["precursors"]),
+            "drive_evidence": bool(group["drive_samples"])
         }
         banner.append(b)
+        group["banner"] = b
 
     section = defaultdict(lambda: {"files": set(), "first": None, "last": None, "samples": []})
     def update_sec(cat, rec):
@@ -148,11 +174,321 @@ def analyze(
     for a in anchors[:12]: section[a["file"].split(":")[0]]["samples"].append(a)
     for p in precursors[:12]: section[p["file"].split(":")[0]]["samples"].append(p)
 
+    templates, new_templates = template_report(miner, code_windows, wnd)
+    for code, found in new_templates.items():
+        by_code[code]["new_templates"] = found
+
     return {
         "anchors": anchors,
         "code_windows": code_windows,
         "precursors": precursors,
         "drive_samples": drive_samples,
         "banner": banner,
-        "section": {k: {"files": list(v["files"]), "first": v["first"], "last": v["last"], "samples": v["samples"]} for k,v in section.items()}
+        "by_code": by_code,
+        "templates": templates,
+        "section": {
+            k: {
+                "files": list(v["files"]), "first": v["first"], "last": v["last"], "samples": v["samples"],
+                "templates": miner.summary(miner.top(TEMPLATES_REPORTED, cat=k)),
+                "rare_templates": miner.summary(miner.rare(n=TEMPLATES_REPORTED, cat=k)),
+            }
+            for k, v in section.items()
+        }
+    }
+
+
+TEMPLATES_REPORTED = 10  # per category, and per code for templates new around its windows
+
+
+def template_report(miner: TemplateMiner, code_windows: Dict[str, Any], wnd: Dict[str, Any]):
+    """Overall template summary, and per code the templates first seen around its windows.
+
+    A template counts as new for a code when its first occurrence falls within
+    the precursor window (``precursor_before`` .. ``precursor_after``) of one
+    of the code's windows; rarest first.
+    """
+    before_ms, after_ms = wnd["precursor_before"] * 1000, wnd["precursor_after"] * 1000
+    new_templates: Dict[str, List[Dict[str, Any]]] = {}
+    for code, merged in code_windows.items():
+        found: Dict[int, Any] = {}
+        for start, _end in merged:
+            for t in miner.first_seen_between(start - before_ms, start + after_ms, n=TEMPLATES_REPORTED):
+                found[t.id] = t
+        picked = sorted(found.values(), key=lambda t: (t.count, t.first_ts, t.id))[:TEMPLATES_REPORTED]
+        new_templates[code] = miner.summary(picked)
+    templates = {
+        "lines": miner.lines,
+        "count": len(miner.templates),
+        "top": miner.summary(miner.top(2 * TEMPLATES_REPORTED), with_hist=True),
+        "rare": miner.summary(miner.rare(n=2 * TEMPLATES_REPORTED), with_hist=True),
     }
+    return templates, new_templates
+
+
+# Lines from several files arrive interleaved; keep this much extra history so
+# a file that lags behind the others can still be matched against windows.
+LIVE_SLACK_MS = 60_000
+DRIVE_WINDOW_MS = 10_000
+LIVE_SAMPLES = 50  # anchors / precursors / drive samples kept per code
+LIVE_BUFFER_LINES = 10_000  # recent precursor / drive lines kept while a lagging file holds the watermark
+DAY_MS = 86_400_000
+_TIME_KEYS = ("ts", "first", "last", "first_ts", "last_ts")
+
+
+def _of_day(item: Any) -> Any:
+    """Copy of ``item`` with live day offsets stripped from its time fields (back to time of day)."""
+    if isinstance(item, dict):
+        out = {}
+        for key, value in item.items():
+            if key in _TIME_KEYS and isinstance(value, int):
+                out[key] = value % DAY_MS
+            elif key == "hist":  # template histogram keyed by bucket start (str ms)
+                hist: Dict[str, int] = {}
+                for start, n in value.items():
+                    start = str(int(start) % DAY_MS)
+                    hist[start] = hist.get(start, 0) + n
+                out[key] = hist
+            else:
+                out[key] = _of_day(value)
+        return out
+    if isinstance(item, (list, tuple)):
+        return type(item)(_of_day(value) for value in item)
+    return item
+
+
+class LiveAnalyzer:
+    """Incremental counterpart of :func:`analyze` for followed (growing) logs.
+
+    ``feed`` takes only the new lines of a file and updates anchor windows,
+    precursor and drive evidence in place; work is proportional to the new
+    lines plus a binary search of the windows near them. It returns banner
+    events (``{"event": "new" | "update", "banner": {...}}``) for codes whose
+    banner changed. :meth:`feed_many` takes one poll of several files and
+    processes their lines in timestamp order.
+
+    Evidence is kept until every file has moved past it (the watermark is the
+    minimum of the per-file latest timestamps), so a file that runs ahead does
+    not prune what a lagging file still needs. Time stamps carry only the time
+    of day; a per-file day offset is added when a file wraps past midnight, so
+    internal times keep increasing. Banner events and :meth:`snapshot` report
+    times of day again, like :func:`analyze`.
+    """
+
+    def __init__(self, rules: RuleSet, target_codes: Optional[Iterable[str]] = None, source_mode: str | None = None):
+        assert_required_sources(source_mode)
+        self.rules = rules
+        self.code_filter = _normalize_target_codes(target_codes)
+        wnd = rules.windows
+        self.merge_ms = wnd["anchor_merge"] * 1000
+        self.before_ms = wnd["precursor_before"] * 1000
+        self.after_ms = wnd["precursor_after"] * 1000
+        self.horizon_ms = max(self.before_ms, DRIVE_WINDOW_MS) + LIVE_SLACK_MS
+        self.latest_ts: Optional[int] = None
+        self._clocks: Dict[str, list] = {}  # file -> [day offset ms, latest ts]
+        self.code_windows: Dict[str, list] = defaultdict(list)  # code -> [[start, end], ...]
+        self.by_code: Dict[str, Dict[str, Any]] = {}
+        self.banners: Dict[str, Dict[str, Any]] = {}
+        self._recent_precursors: deque = deque(maxlen=LIVE_BUFFER_LINES)
+        self._recent_drive: deque = deque(maxlen=LIVE_BUFFER_LINES)
+        cfg = load_config()
+        self.templates = TemplateMiner(cfg.get("templates"))
+        self.rates = RateAnomalies(cfg.get("anomaly"))
+        self._anchor_tids: Set[int] = set()
+
+    def _group(self, code: str) -> Dict[str, Any]:
+        group = self.by_code.get(code)
+        if group is None:
+            group = self.by_code[code] = {
+                "count": 0,
+                "anchors": deque(maxlen=LIVE_SAMPLES),
+                "precursors": deque(maxlen=LIVE_SAMPLES),
+                "drive_samples": deque(maxlen=LIVE_SAMPLES),
+            }
+        return group
+
+    def _attach(self, code: str, start: int, rec: Dict[str, Any], kind: str) -> None:
+        ts = rec["ts"]
+        if kind == "precursors":
+            if not start - self.before_ms <= ts <= start + self.after_ms:
+                return
+            self._group(code)["precursors"].append({
+                "code": code, "file": rec["file"], "cat": rec["cat"], "ts": ts,
+                "dt_ms": ts - start, "text": rec["text"]
+            })
+        elif abs(ts - start) <= DRIVE_WINDOW_MS:
+            self._group(code)["drive_samples"].append(
+                {"code": code, "file": rec["file"], "ts": ts, "text": rec["text"]}
+            )
+
+    def _open_window(self, code: str, start: int) -> None:
+        for rec in self._recent_precursors:
+            self._attach(code, start, rec, "precursors")
+        for rec in self._recent_drive:
+            self._attach(code, start, rec, "drive_samples")
+
+    def _add_anchor(self, rec: Dict[str, Any], code: str) -> None:
+        ts = rec["ts"]
+        group = self._group(code)
+        group["count"] += 1
+        group["anchors"].append({"code": code, "ts": ts, "file": rec["file"], "text": rec["text"]})
+        windows = self.code_windows[code]
+        if not windows or ts - windows[-1][1] > self.merge_ms:
+            windows.append([ts, ts])
+            self._open_window(code, ts)
+        elif ts >= windows[-1][1]:
+            windows[-1][1] = ts
+        else:
+            self._insert_late(code, windows, ts)
+
+    def _insert_late(self, code: str, windows: list, ts: int) -> None:
+        # A lagging file delivered an older anchor: place it like the batch merge would.
+        i = bisect_right(windows, ts, key=lambda w: w[0]) - 1
+        if i >= 0 and ts <= windows[i][1]:
+            return
+        if i >= 0 and ts - windows[i][1] <= self.merge_ms:
+            windows[i][1] = ts
+        elif i + 1 < len(windows) and windows[i + 1][0] - ts <= self.merge_ms:
+            windows[i + 1][0] = ts
+            self._open_window(code, ts)
+            i += 1
+        else:
+            windows.insert(i + 1, [ts, ts])
+            self._open_window(code, ts)
+            return
+        if i + 1 < len(windows) and windows[i + 1][0] - windows[i][1] <= self.merge_ms:
+            windows[i][1] = max(windows[i][1], windows.pop(i + 1)[1])
+
+    def _watermark(self) -> Optional[int]:
+        latest = [clock[1] for clock in self._clocks.values() if clock[1] is not None]
+        return min(latest) if latest else None
+
+    def _prune(self) -> None:
+        watermark = self._watermark()
+        if watermark is None:
+            return
+        floor = watermark - self.horizon_ms
+        for buf in (self._recent_precursors, self._recent_drive):
+            while buf and buf[0]["ts"] < floor:
+                buf.popleft()
+
+    def _windows_near(self, ts: int, kind: str):
+        """``(code, start)`` of windows whose evidence range can hold ``ts`` (late lines included)."""
+        if kind == "precursors":
+            lo, hi = ts - self.after_ms, ts + self.before_ms
+        else:
+            lo, hi = ts - DRIVE_WINDOW_MS, ts + DRIVE_WINDOW_MS
+        for code, windows in self.code_windows.items():
+            i = bisect_right(windows, lo - 1, key=lambda w: w[0])
+            while i < len(windows) and windows[i][0] <= hi:
+                yield code, windows[i][0]
+                i += 1
+
+    def _unwrap(self, clock: list, ts: int) -> int:
+        """Time of day -> monotonic ms for one file (a new file follows the other files' day)."""
+        ref = clock[1] if clock[1] is not None else self.latest_ts
+        ts += clock[0]
+        if ref is not None and ts < ref - DAY_MS // 2:
+            days = (ref - ts + DAY_MS // 2) // DAY_MS
+            clock[0] += days * DAY_MS
+            ts += days * DAY_MS
+        if clock[1] is None or ts > clock[1]:
+            clock[1] = ts
+        return ts
+
+    def _timeline(self, fname: str, lines: Iterable[str]):
+        """``(order, ts, fname, raw)`` per line; lines without a stamp keep the previous line's order."""
+        clock = self._clocks.setdefault(fname, [0, None])
+        order = clock[1] if clock[1] is not None else -1
+        for raw in lines:
+            ts = find_time_ms(raw)
+            if ts is not None:
+                ts = self._unwrap(clock, ts)
+                order = max(order, ts)
+            yield order, ts, fname, raw
+
+    def _banner(self, code: str) -> Dict[str, Any]:
+        group = self.by_code[code]
+        windows = self.code_windows[code]
+        return {
+            "code": code, "count": group["count"],
+            "first": windows[0][0] % DAY_MS, "last": windows[-1][1] % DAY_MS,
+            "precursor_present": bool(group["precursors"]),
+            "drive_evidence": bool(group["drive_samples"]),
+        }
+
+    def feed(self, fname: str, lines: Iterable[str]) -> List[Dict[str, Any]]:
+        """Process newly appended ``lines`` of ``fname``; return banner events."""
+        return self.feed_many([(fname, lines)])
+
+    def feed_many(self, batch: Iterable[Tuple[str, Iterable[str]]]) -> List[Dict[str, Any]]:
+        """Process one poll (``[(fname, new lines), ...]``, e.g. ``FileTailer.poll``) merged by time."""
+        touched: Set[str] = set()
+        cats: Dict[str, str] = {}
+        timelines = []
+        for fname, lines in batch:
+            cats.setdefault(fname, self.rules.categorize(fname))
+            timelines.append(self._timeline(fname, lines))
+        for _order, ts, fname, raw in heapq.merge(*timelines, key=lambda item: item[0]):
+            self._line(fname, cats[fname], ts, raw, touched)
+        self._prune()
+
+        events = []
+        for code in sorted(touched):
+            banner = self._banner(code)
+            if banner != self.banners.get(code):
+                events.append({"event": "update" if code in self.banners else "new", "banner": banner})
+                self.banners[code] = banner
+        return events
+
+    def _line(self, fname: str, cat: str, ts: Optional[int], raw: str, touched: Set[str]) -> None:
+        tid = self.templates.add(raw, ts, cat) if raw and not raw.isspace() else None
+        if ts is None:
+            return
+        if tid is not None:
+            self.rates.add(tid, ts)
+        rec = {"file": fname, "cat": cat, "ts": ts, "text": raw}
+        if self.latest_ts is None or ts > self.latest_ts:
+            self.latest_ts = ts
+        for _, code in self.rules.match_anchors(raw):
+            code_str = str(code)
+            if self.code_filter and code_str not in self.code_filter:
+                continue
+            self._add_anchor(rec, code_str)
+            self._anchor_tids.add(tid)
+            touched.add(code_str)
+        for kind, matcher, buf in (
+            ("precursors", self.rules.is_precursor, self._recent_precursors),
+            ("drive_samples", self.rules.is_drive_hint, self._recent_drive),
+        ):
+            if matcher(raw):
+                buf.append(rec)
+                for code, start in list(self._windows_near(ts, kind)):
+                    before = len(self.by_code[code][kind])
+                    self._attach(code, start, rec, kind)
+                    if len(self.by_code[code][kind]) != before:
+                        touched.add(code)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current banners and recent evidence, shaped like :func:`analyze` output."""
+        templates, new_templates = template_report(self.templates, self.code_windows, self.rules.windows)
+        suggested = self.rates.suggest(
+            self.templates, self.code_windows, self.before_ms, self._anchor_tids, self.rules.is_precursor
+        )
+        return {
+            "banner": [self.banners[code] for code in sorted(self.banners)],
+            "code_windows": {
+                code: [(start % DAY_MS, end % DAY_MS) for start, end in ws] for code, ws in self.code_windows.items()
+            },
+            "by_code": {
+                code: {
+                    "anchors": _of_day(list(g["anchors"])),
+                    "precursors": _of_day(list(g["precursors"])),
+                    "drive_samples": _of_day(list(g["drive_samples"])),
+                    "new_templates": _of_day(new_templates.get(code, [])),
+                    "suggested_precursors": _of_day(suggested.get(code, [])),
+                    "banner": self.banners.get(code),
+                }
+                for code, g in self.by_code.items()
+            },
+            "templates": _of_day(templates),
+        }
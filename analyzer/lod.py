@@ -0,0 +1,217 @@
+"""Min/max level-of-detail pyramid for plotting long traces.
+
+Every-n-th-row decimation drops short spikes (torque peaks in particular).
+These helpers instead keep, per bucket of rows, the rows holding each
+column's minimum and maximum, so extrema survive at every zoom level.
+"""
+from __future__ import annotations
+
+import math
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_POINTS = 2_000
+LEAF_SIZE = 64
+FANOUT = 4
+
+
+def _as_2d(values: np.ndarray) -> np.ndarray:
+    arr = np.asarray(values, dtype=np.float64)
+    return arr.reshape(-1, 1) if arr.ndim == 1 else arr
+
+
+def _bucket_extrema(values: np.ndarray, rows: np.ndarray, size: int):
+    """Reduce ``rows`` (candidate row ids, shape (n, k)) into buckets of ``size``.
+
+    Returns ``(min_rows, max_rows)``, each of shape (ceil(n / size), k), holding
+    for every bucket and column the row id of the smallest/largest value.
+    """
+    n, k = rows.shape
+    buckets = -(-n // size)
+    pad = buckets * size - n
+    if pad:
+        rows = np.concatenate([rows, np.repeat(rows[-1:], pad, axis=0)])
+    cols = np.arange(k)
+    vals = values[rows, cols]
+    low = np.where(np.isnan(vals), np.inf, vals).reshape(buckets, size, k)
+    high = np.where(np.isnan(vals), -np.inf, vals).reshape(buckets, size, k)
+    grouped = rows.reshape(buckets, size, k)
+    pick_low = np.take_along_axis(grouped, low.argmin(axis=1)[:, None, :], axis=1)[:, 0, :]
+    pick_high = np.take_along_axis(grouped, high.argmax(axis=1)[:, None, :], axis=1)[:, 0, :]
+    return pick_low, pick_high
+
+
+def _group_extrema(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """Sorted positions of each column's first min/max row per run of equal ``groups``."""
+    values = _as_2d(values)
+    boundary = np.r_[True, groups[1:] != groups[:-1]]
+    starts = np.flatnonzero(boundary)
+    group = np.cumsum(boundary) - 1
+    nan = np.isnan(values)
+    keep = np.zeros(len(values), dtype=bool)
+    for filled, reduce in ((np.where(nan, np.inf, values), np.minimum), (np.where(nan, -np.inf, values), np.maximum)):
+        extreme = reduce.reduceat(filled, starts, axis=0)
+        for col in range(values.shape[1]):
+            rows = np.flatnonzero(filled[:, col] == extreme[group, col])
+            owner = group[rows]
+            keep[rows[np.r_[True, owner[1:] != owner[:-1]]]] = True
+    return np.flatnonzero(keep)
+
+
+def minmax_indices(values: np.ndarray, max_points: int, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+    """Sorted row indices in ``[start, stop)`` that keep every column's extrema.
+
+    At most ``max_points`` rows are returned (rows are kept verbatim when the
+    range already fits). No value columns means nothing to plot: an empty array.
+    """
+    values = _as_2d(values)
+    if values.shape[1] == 0:
+        return np.zeros(0, dtype=np.int64)
+    stop = len(values) if stop is None else stop
+    count = stop - start
+    if count <= max_points:
+        return np.arange(start, stop)
+    k = values.shape[1]
+    buckets = max(1, (max_points - 2) // (2 * k))
+    size = math.ceil(count / buckets)
+    rows = np.repeat(np.arange(start, stop)[:, None], k, axis=1)
+    low, high = _bucket_extrema(values, rows, size)
+    picked = np.concatenate([low.ravel(), high.ravel(), [start, stop - 1]])
+    return np.unique(picked)
+
+
+class TracePyramid:
+    """Multi-resolution min/max index built once per trace.
+
+    Level 0 buckets hold ``LEAF_SIZE`` rows and every level above merges
+    ``FANOUT`` buckets, so the whole pyramid costs a few percent of the raw
+    data. :meth:`query` answers a time range with at most ``max_points`` rows
+    while preserving each column's extrema.
+    """
+
+    def __init__(self, time: np.ndarray, values: np.ndarray, columns: Sequence[str], time_name: str = "time"):
+        self.time = np.asarray(time, dtype=np.float64)
+        self.values = _as_2d(values)
+        self.columns = list(columns)
+        self.time_name = time_name
+        self._sorted = bool(len(self.time) < 2 or np.all(np.diff(self.time) >= 0))
+        self.levels: List[tuple] = []
+        self._build()
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, time_col: str, columns: Iterable[str]) -> "TracePyramid":
+        columns = [col for col in columns if col in frame.columns]
+        return cls(frame[time_col].to_numpy(), frame[columns].to_numpy(dtype=np.float64), columns, time_col)
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def _build(self) -> None:
+        n, k = self.values.shape
+        if n <= LEAF_SIZE or k == 0:
+            return
+        rows = np.repeat(np.arange(n, dtype=np.int64)[:, None], k, axis=1)
+        size = LEAF_SIZE
+        low, high = _bucket_extrema(self.values, rows, LEAF_SIZE)
+        self.levels.append((size, low, high))
+        while len(low) > 1:
+            size *= FANOUT
+            low = _bucket_extrema(self.values, low, FANOUT)[0]
+            high = _bucket_extrema(self.values, high, FANOUT)[1]
+            self.levels.append((size, low, high))
+
+    def row_range(self, start: Optional[float] = None, end: Optional[float] = None) -> tuple:
+        if not self._sorted:
+            return 0, len(self.time)
+        i0 = 0 if start is None else int(np.searchsorted(self.time, start, side="left"))
+        i1 = len(self.time) if end is None else int(np.searchsorted(self.time, end, side="right"))
+        return i0, i1
+
+    def query_indices(
+        self, start: Optional[float] = None, end: Optional[float] = None, max_points: int = DEFAULT_MAX_POINTS
+    ) -> np.ndarray:
+        k = self.values.shape[1]
+        if k == 0:
+            return np.zeros(0, dtype=np.int64)
+        i0, i1 = self.row_range(start, end)
+        count = i1 - i0
+        if count <= max_points:
+            return np.arange(i0, i1)
+        # Edge buckets may be partial, so leave room for two extra buckets.
+        buckets = max(1, (max_points - 2) // (2 * k) - 2)
+        wanted = math.ceil(count / buckets)
+        if not self.levels or wanted < LEAF_SIZE:
+            return minmax_indices(self.values, max_points, i0, i1)
+        size, low, high = next((lvl for lvl in self.levels if lvl[0] >= wanted), self.levels[-1])
+        # Whole buckets come from the pyramid; the partial ones at either
+        # edge are reduced from the raw rows, so no extremum inside the range
+        # is lost with a bucket extremum that lies outside it.
+        b0, b1 = -(-i0 // size), i1 // size
+        if b0 >= b1:
+            return minmax_indices(self.values, max_points, i0, i1)
+        picked = [low[b0:b1].ravel(), high[b0:b1].ravel(), [i0, i1 - 1]]
+        for a, b in ((i0, b0 * size), (b1 * size, i1)):
+            if a < b:
+                rows = np.repeat(np.arange(a, b)[:, None], k, axis=1)
+                picked += [part.ravel() for part in _bucket_extrema(self.values, rows, b - a)]
+        return np.unique(np.concatenate(picked))
+
+    def query(
+        self, start: Optional[float] = None, end: Optional[float] = None, max_points: int = DEFAULT_MAX_POINTS
+    ) -> pd.DataFrame:
+        idx = self.query_indices(start, end, max_points)
+        frame = pd.DataFrame(self.values[idx], columns=self.columns)
+        frame.insert(0, self.time_name, self.time[idx])
+        return frame
+
+
+class StreamingDecimator:
+    """Min/max decimation of a chunk stream whose length is not known up front.
+
+    Rows are reduced per bucket of ``bucket`` rows; whenever more than
+    ``max_points`` candidates pile up the bucket size doubles and the kept rows
+    are reduced again, so memory stays bounded by the output size.
+    """
+
+    def __init__(self, max_points: int, columns: Sequence[str]):
+        self.max_points = max_points
+        self.columns = list(columns)
+        self.bucket = 1
+        self.rows = 0
+        self._kept: List[pd.DataFrame] = []
+        self._kept_rows = 0
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        if chunk.empty:
+            return
+        positions = np.arange(self.rows, self.rows + len(chunk))
+        self.rows += len(chunk)
+        picked = self._reduce(chunk, positions)
+        part = chunk.iloc[picked]
+        part.index = positions[picked]
+        self._kept.append(part)
+        self._kept_rows += len(part)
+        if self._kept_rows > 2 * self.max_points:
+            self._compact()
+
+    def _reduce(self, frame: pd.DataFrame, positions: np.ndarray) -> np.ndarray:
+        if not self.columns:
+            return np.flatnonzero(positions % self.bucket == 0)
+        values = frame[self.columns].to_numpy(dtype=np.float64)
+        return _group_extrema(values, positions // self.bucket)
+
+    def _compact(self) -> None:
+        kept = pd.concat(self._kept) if len(self._kept) > 1 else self._kept[0]
+        while len(kept) > self.max_points and self.bucket < self.rows:
+            self.bucket *= 2
+            kept = kept.iloc[self._reduce(kept, kept.index.to_numpy())]
+        self._kept = [kept]
+        self._kept_rows = len(kept)
+
+    def result(self) -> pd.DataFrame:
+        if not self._kept:
+            return pd.DataFrame()
+        self._compact()
+        return self._kept[0].reset_index(drop=True)
@@ -1,16 +1,18 @@
 """M-Trace parser & visualizer for the SFU Streamlit app."""
 from __future__ import annotations
 
-import io
 import math
 import re
 from pathlib import Path
 from typing import Iterable, List, Optional
 
 import matplotlib.pyplot as plt
-import numpy as np
 import pandas as pd
 
+from core.config import load_config
+
+from .mtrace_analytics import DEFAULTS, MTraceAnalysis
+from .mtrace_stream import AMC_DEFAULT_COLUMNS, SIGNALS, stream_mtrace
 
 FILE_NAME_PATTERNS = [
     "*M_TRACE*.csv",
@@ -23,9 +25,6 @@ FILE_NAME_PATTERNS = [
     "AMC_AXIS_M_TRACE*.log",
 ]
 
-CANDIDATE_ENCODINGS = ["utf-8-sig", "utf-8", "cp949", "euc-kr", "latin-1"]
-
-
 def _norm(text: str) -> str:
     return re.sub(r"[^a-z0-9가-힣]", "", text.lower())
 
@@ -117,43 +116,18 @@ def _find_best(columns: List[str], token_list: List[str]) -> Optional[str]:
     return None
 
 
-def _read_any_delim_bytes(raw: bytes) -> pd.DataFrame:
-    last_err: Exception | None = None
-    for enc in CANDIDATE_ENCODINGS:
-        try:
-            buffer = io.BytesIO(raw)
-            frame = pd.read_csv(buffer, sep=None, engine="python", encoding=enc)
-            if frame.shape[1] == 1:
-                buffer = io.BytesIO(raw)
-                frame = pd.read_csv(buffer, delim_whitespace=True, engine="python", encoding=enc)
-            return frame
-        except Exception as exc:  # pragma: no cover - best effort sniffing
-            last_err = exc
-            continue
-    raise RuntimeError(
-        f"Failed to parse M-Trace with encodings {CANDIDATE_ENCODINGS}. Last error: {last_err}"
-    )
-
-
-def _read_any_delim_path(path: Path) -> pd.DataFrame:
-    last_err: Exception | None = None
-    for enc in CANDIDATE_ENCODINGS:
-        try:
-            frame = pd.read_csv(path, sep=None, engine="python", encoding=enc)
-            if frame.shape[1] == 1:
-                frame = pd.read_csv(path, delim_whitespace=True, engine="python", encoding=enc)
-            return frame
-        except Exception as exc:  # pragma: no cover - best effort sniffing
-            last_err = exc
-            continue
-    raise RuntimeError(
-        f"Failed to parse {path.name} with encodings {CANDIDATE_ENCODINGS}. Last error: {last_err}"
-    )
+def _mapping(columns: List[str], has_header: bool = True) -> tuple:
+    """``map_columns`` callback for :func:`stream_mtrace`.
 
-
-def _mapping(frame: pd.DataFrame) -> dict[str, Optional[str]]:
-    columns = list(frame.columns)
-    return {
+    Headed files are mapped by column-name tokens. Headerless captures only have
+    positional names, so they use the default AMC layout when they have enough
+    columns (firmware-specific profiles are handled by the visualizer).
+    """
+    if not has_header:
+        if len(columns) > max(AMC_DEFAULT_COLUMNS.values()):
+            return {key: columns[i] for key, i in AMC_DEFAULT_COLUMNS.items()}, "amc_idx"
+        return {key: None for key in SIGNALS}, "header"
+    mapping = {
         "time": _find_best(columns, TOKENS["time"]),
         "torque": _find_best(columns, TOKENS["torque"]),
         "speed_act": _find_best(columns, TOKENS["speed_act"]),
@@ -161,30 +135,25 @@ def _mapping(frame: pd.DataFrame) -> dict[str, Optional[str]]:
         "pos_act": _find_best(columns, TOKENS["pos_act"]),
         "pos_cmd": _find_best(columns, TOKENS["pos_cmd"]),
     }
+    return mapping, "header"
 
 
-def _build_time_s(frame: pd.DataFrame, time_col: Optional[str]) -> pd.Series:
-    if time_col is not None:
-        series = pd.to_numeric(frame[time_col], errors="coerce")
-        if series.notna().mean() > 0.9:
-            median = series.dropna().median()
-            if 1000 < median <= 1_000_000_000:
-                return series / 1000.0
-            return series
-        try:
-            timestamps = pd.to_datetime(frame[time_col])
-            return (timestamps - timestamps.iloc[0]).dt.total_seconds()
-        except Exception:  # pragma: no cover - best effort parsing
-            pass
-    return pd.Series(np.arange(len(frame)) * 0.001, name="time_s")
-
-
-def _downsample(frame: pd.DataFrame, max_points: int) -> pd.DataFrame:
-    count = len(frame)
-    if count <= max_points:
-        return frame
-    step = math.ceil(count / max_points)
-    return frame.iloc[::step, :].reset_index(drop=True)
+def _format_stats(stats: dict) -> str:
+    parts = [f"rows={stats['rows']:,}"]
+    labels = (
+        ("torque_peak", "torque peak |max|"),
+        ("speed_error_max", "speed following error max"),
+        ("speed_error_rms", "speed following error RMS"),
+        ("pos_error_max", "position following error max"),
+        ("pos_error_rms", "position following error RMS"),
+    )
+    for key, label in labels:
+        value = stats.get(key)
+        if value is not None and not math.isnan(value):
+            parts.append(f"{label}={value:.3f}")
+    if stats.get("torque_peak_time_s") is not None:
+        parts.append(f"torque peak at t={stats['torque_peak_time_s']:.3f}s")
+    return " · ".join(parts)
 
 
 def _plot_speed_vs_torque(
@@ -242,9 +211,36 @@ def detect_mtrace_paths(root_dirs: Iterable[Path]) -> List[Path]:
     return hits
 
 
-def render_mtrace_section(uploaded_files: Optional[List] = None, max_points: int = 100_000) -> None:
+def _render_analysis(st, analysis: MTraceAnalysis, anchors: Optional[List[dict]], window_s: float) -> None:
+    summary = analysis.summary
+    st.caption(
+        f"steps={summary['steps']} · max overshoot={summary['max_overshoot_pct']:.1f}% · "
+        f"max settling={summary['max_settling_s']:.3f}s · sample rate={summary['sample_rate_hz']:.0f}Hz"
+    )
+    intervals = analysis.aligned(anchors or [], window_s)
+    if anchors and analysis.origin_s is None:
+        st.caption("No wall-clock time column: windows are not matched to E### anchors.")
+    with st.expander(f"Suspicious windows ({len(intervals)})", expanded=bool(len(intervals))):
+        if intervals.empty:
+            st.caption("No following-error or torque-saturation window found.")
+        else:
+            st.dataframe(intervals, use_container_width=True)
+    with st.expander("Step response / speed-error spectrum"):
+        st.dataframe(analysis.steps, use_container_width=True)
+        st.dataframe(analysis.spectrum, use_container_width=True)
+
+
+def render_mtrace_section(
+    uploaded_files: Optional[List] = None,
+    max_points: int = 100_000,
+    anchors: Optional[List[dict]] = None,
+) -> None:
     import streamlit as st  # local import to avoid heavy dependency at import time
 
+    options = dict(load_config().get("mtrace") or {})
+    window_s = float(options.pop("anchor_window_s", DEFAULTS["anchor_window_s"]))
+    options.pop("amc_profiles", None)  # firmware-specific AMC profiles are a visualizer concern
+
     st.divider()
     st.subheader("📈 M-Trace Visualization (speed/position vs torque)")
 
@@ -265,35 +261,26 @@ def render_mtrace_section(uploaded_files: Optional[List] = None, max_points: int
         name = getattr(file, "name", None) or str(getattr(file, "path", "M-Trace"))
         st.write(f"**File:** {name}")
 
+        if not (hasattr(file, "read") or isinstance(file, Path)):
+            st.warning("Unsupported file type.")
+            continue
         try:
-            if hasattr(file, "read"):
-                raw = file.read()
-                frame = _read_any_delim_bytes(raw)
-            elif isinstance(file, Path):
-                frame = _read_any_delim_path(file)
-            else:
-                st.warning("Unsupported file type.")
-                continue
+            # Uploads and paths are parsed in chunks; only the decimated plot
+            # rows and running statistics are kept.
+            stream = stream_mtrace(file, _mapping, max_points, analytics=options)
         except Exception as exc:  # pragma: no cover - streamlit display path
             st.error(f"Failed to parse: {exc}")
             continue
 
-        mapping = _mapping(frame)
+        mapping = stream.mapping
         if not any(mapping.get(key) for key in ("torque", "speed_act", "pos_act")):
-            st.warning(f"Columns not recognized. Headers: {list(frame.columns)[:10]}")
+            st.warning(f"Columns not recognized. Headers: {stream.columns[:10]}")
             continue
 
-        for key in ["torque", "speed_act", "speed_cmd", "pos_act", "pos_cmd"]:
-            column = mapping.get(key)
-            if column and column in frame.columns:
-                frame[column] = pd.to_numeric(frame[column], errors="coerce")
-
-        time_s = _build_time_s(frame, mapping.get("time"))
-
-        subset = pd.DataFrame({"__t__": time_s})
-        for column in {value for value in mapping.values() if value}:
-            subset[column] = frame[column]
-        subset = _downsample(subset, max_points)
+        st.caption(_format_stats(stream.stats.summary()))
+        if stream.analysis is not None:
+            _render_analysis(st, stream.analysis, anchors, window_s)
+        subset = stream.frame
         time_s = subset["__t__"]
         subset = subset.drop(columns=["__t__"])
 
@@ -0,0 +1,322 @@
+"""Following-error, torque-saturation, step-response and spectrum analytics.
+
+:class:`MTraceAnalyzer` consumes the same chunks as :func:`stream_mtrace`
+(seconds + mapped columns) and keeps only small per-interval state, so it
+works on captures larger than memory. Interval times are seconds from the
+start of the trace; anchor ``ts`` is ms of day. Intervals are aligned with
+E### anchors only when the trace carries wall-clock stamps, whose first value
+gives ``origin_s`` (seconds of day at trace time 0); otherwise they are left
+unaligned.
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+INTERVAL_COLUMNS = ["kind", "start_s", "end_s", "duration_s", "peak", "samples"]
+STEP_COLUMNS = ["start_s", "target", "step", "overshoot", "overshoot_pct", "settling_s"]
+SPECTRUM_COLUMNS = ["freq_hz", "amplitude"]
+
+DAY_S = 86_400.0
+
+DEFAULTS = {
+    "torque_limit": None,  # None: relative to the largest |torque| seen
+    "saturation_ratio": 0.95,
+    "follow_error_limit": None,  # None: relative to the largest error seen
+    "follow_error_ratio": 0.5,
+    "settle_band_ratio": 0.02,
+    "min_plateau_samples": 20,
+    "fft_segment": 1024,
+    "spectrum_peaks": 5,
+    "anchor_window_s": 5.0,
+}
+
+
+class _IntervalTracker:
+    """Turn per-sample ``|signal| > threshold`` masks into intervals across chunks.
+
+    With a fixed ``limit`` the threshold is constant. Otherwise it is
+    ``ratio`` times the running maximum, and :meth:`finish` drops intervals
+    whose peak stays below ``ratio`` times the final maximum.
+    """
+
+    def __init__(self, kind: str, limit: Optional[float], ratio: float):
+        self.kind = kind
+        self.limit = limit
+        self.ratio = ratio
+        self.running_max = 0.0
+        self.rows: List[list] = []
+        self._open: Optional[list] = None  # [start_s, end_s, peak, samples]
+
+    def update(self, time_s: np.ndarray, magnitude: np.ndarray) -> None:
+        finite = np.isfinite(magnitude)
+        if finite.any():
+            self.running_max = max(self.running_max, float(magnitude[finite].max()))
+        threshold = self.limit if self.limit is not None else self.ratio * self.running_max
+        if threshold <= 0:
+            return
+        with np.errstate(invalid="ignore"):
+            mask = magnitude >= threshold
+        edges = np.diff(np.r_[0, mask.astype(np.int8), 0])
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)  # exclusive
+        if self._open is not None and (not starts.size or starts[0] != 0):
+            self._close()
+        if not starts.size:
+            return
+        peaks = np.fmax.reduceat(np.where(mask, magnitude, -np.inf), starts)
+        for pos, (s, e) in enumerate(zip(starts, ends)):
+            row = [float(time_s[s]), float(time_s[e - 1]), float(peaks[pos]), int(e - s)]
+            if pos == 0 and s == 0 and self._open is not None:
+                current = self._open
+                current[1] = row[1]
+                current[2] = max(current[2], row[2])
+                current[3] += row[3]
+                row = current
+            self._open = row
+            if e < len(mask):
+                self._close()
+
+    def _close(self) -> None:
+        if self._open is not None:
+            self.rows.append([self.kind, *self._open])
+            self._open = None
+
+    def finish(self) -> List[list]:
+        self._close()
+        if self.limit is None:
+            floor = self.ratio * self.running_max
+            return [row for row in self.rows if row[3] >= floor]
+        return list(self.rows)
+
+
+@dataclass
+class _Run:
+    """Constant-command run still open at a chunk boundary."""
+
+    target: float
+    start_s: float
+    samples: int = 0
+    dev_max: float = -math.inf
+    dev_min: float = math.inf
+    last_out_s: Optional[float] = None
+    step: Optional[float] = None
+
+
+class _StepResponse:
+    """Overshoot and settling time for every command plateau."""
+
+    def __init__(self, band_ratio: float, min_samples: int):
+        self.band_ratio = band_ratio
+        self.min_samples = min_samples
+        self.rows: List[list] = []
+        self._run: Optional[_Run] = None
+        self._last_plateau: Optional[float] = None
+
+    def _band(self, run: _Run) -> float:
+        return self.band_ratio * abs(run.step) if run.step else math.inf
+
+    def _start(self, target: float, start_s: float) -> _Run:
+        step = None if self._last_plateau is None else target - self._last_plateau
+        return _Run(target=target, start_s=start_s, step=step)
+
+    def _finish(self, run: _Run) -> None:
+        if run.samples < self.min_samples:
+            return
+        if run.step:
+            overshoot = max(0.0, run.dev_max if run.step > 0 else -run.dev_min)
+            settling = 0.0 if run.last_out_s is None else run.last_out_s - run.start_s
+            self.rows.append([
+                run.start_s, run.target, run.step, overshoot,
+                100.0 * overshoot / abs(run.step), settling,
+            ])
+        self._last_plateau = run.target
+
+    def update(self, time_s: np.ndarray, cmd: np.ndarray, act: np.ndarray) -> None:
+        if not len(cmd):
+            return
+        boundary = np.r_[True, cmd[1:] != cmd[:-1]]
+        starts = np.flatnonzero(boundary)
+        ends = np.r_[starts[1:], len(cmd)]
+        dev = act - cmd
+        dev_max = np.fmax.reduceat(np.where(np.isnan(dev), -np.inf, dev), starts)
+        dev_min = np.fmin.reduceat(np.where(np.isnan(dev), np.inf, dev), starts)
+        # Runs are only walked in Python when they can matter: long plateaus,
+        # plus the first/last run which may continue across chunk boundaries.
+        relevant = np.flatnonzero(ends - starts >= self.min_samples)
+        for idx in sorted({0, len(starts) - 1, *relevant.tolist()}):
+            s, e = int(starts[idx]), int(ends[idx])
+            target = float(cmd[s])
+            run = self._run
+            if idx > 0 or run is None or run.target != target:
+                if run is not None:
+                    self._finish(run)
+                run = self._start(target, float(time_s[s]))
+            run.samples += e - s
+            run.dev_max = max(run.dev_max, float(dev_max[idx]))
+            run.dev_min = min(run.dev_min, float(dev_min[idx]))
+            outside = np.flatnonzero(np.abs(dev[s:e]) > self._band(run))
+            if outside.size:
+                run.last_out_s = float(time_s[s + outside[-1]])
+            self._run = run
+
+    def finish(self) -> List[list]:
+        if self._run is not None:
+            self._finish(self._run)
+            self._run = None
+        return self.rows
+
+
+class _WelchSpectrum:
+    """Welch-averaged amplitude spectrum (Hann window, 50% overlap) over chunks."""
+
+    def __init__(self, segment: int):
+        self.segment = segment
+        self.window = np.hanning(segment)
+        self.psd = np.zeros(segment // 2 + 1)
+        self.count = 0
+        self._tail = np.empty(0)
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.nan_to_num(values, nan=0.0)
+        data = np.concatenate([self._tail, values])
+        hop = self.segment // 2
+        n_seg = (len(data) - self.segment) // hop + 1 if len(data) >= self.segment else 0
+        if n_seg > 0:
+            idx = np.arange(self.segment)[None, :] + hop * np.arange(n_seg)[:, None]
+            frames = data[idx]
+            frames = (frames - frames.mean(axis=1, keepdims=True)) * self.window
+            self.psd += np.square(np.abs(np.fft.rfft(frames, axis=1))).sum(axis=0)
+            self.count += n_seg
+            data = data[n_seg * hop:]
+        self._tail = data
+
+    def peaks(self, sample_rate: float, top: int) -> List[list]:
+        if not self.count or not sample_rate:
+            return []
+        amplitude = np.sqrt(self.psd / self.count) * 2.0 / self.window.sum()
+        freqs = np.fft.rfftfreq(self.segment, d=1.0 / sample_rate)
+        inner = amplitude[1:-1]
+        local = np.flatnonzero((inner > amplitude[:-2]) & (inner >= amplitude[2:])) + 1
+        best = local[np.argsort(amplitude[local])[::-1][:top]]
+        return [[float(freqs[i]), float(amplitude[i])] for i in sorted(best)]
+
+
+@dataclass
+class MTraceAnalysis:
+    intervals: pd.DataFrame
+    steps: pd.DataFrame
+    spectrum: pd.DataFrame
+    summary: Dict[str, float] = field(default_factory=dict)
+    origin_s: Optional[float] = None  # seconds of day at trace time 0; None when unknown
+
+    def aligned(self, anchors: Iterable[Dict], window_s: float = DEFAULTS["anchor_window_s"]) -> pd.DataFrame:
+        return align_with_anchors(self.intervals, anchors, window_s, self.origin_s)
+
+
+class MTraceAnalyzer:
+    """Chunked analytics over mapped M-Trace columns (see ``_mapping``)."""
+
+    def __init__(self, mapping: Dict[str, Optional[str]], options: Optional[Dict] = None):
+        self.mapping = mapping
+        self.options = {**DEFAULTS, **(options or {})}
+        opts = self.options
+        self.follow_kind = "position" if mapping.get("pos_cmd") and mapping.get("pos_act") else "speed"
+        self.saturation = _IntervalTracker("torque_saturation", opts["torque_limit"], opts["saturation_ratio"])
+        self.following = _IntervalTracker(
+            f"{self.follow_kind}_following_error", opts["follow_error_limit"], opts["follow_error_ratio"]
+        )
+        self.steps = _StepResponse(opts["settle_band_ratio"], opts["min_plateau_samples"])
+        self.spectrum = _WelchSpectrum(int(opts["fft_segment"]))
+        self.sample_period: Optional[float] = None
+
+    def _column(self, chunk: pd.DataFrame, key: str) -> Optional[np.ndarray]:
+        col = self.mapping.get(key)
+        if not col or col not in chunk:
+            return None
+        return chunk[col].to_numpy(dtype=np.float64)
+
+    def update(self, time_s: np.ndarray, chunk: pd.DataFrame) -> None:
+        if self.sample_period is None and len(time_s) > 1:
+            dt = np.diff(time_s)
+            dt = dt[np.isfinite(dt) & (dt > 0)]
+            if dt.size:
+                self.sample_period = float(np.median(dt))
+        torque = self._column(chunk, "torque")
+        if torque is not None:
+            self.saturation.update(time_s, np.abs(torque))
+        prefix = "pos" if self.follow_kind == "position" else "speed"
+        cmd, act = self._column(chunk, f"{prefix}_cmd"), self._column(chunk, f"{prefix}_act")
+        if cmd is not None and act is not None:
+            self.following.update(time_s, np.abs(cmd - act))
+            self.steps.update(time_s, cmd, act)
+        speed_cmd, speed_act = self._column(chunk, "speed_cmd"), self._column(chunk, "speed_act")
+        if speed_cmd is not None and speed_act is not None:
+            self.spectrum.update(speed_cmd - speed_act)
+
+    def finish(self, origin_s: Optional[float] = None) -> MTraceAnalysis:
+        rows = self.saturation.finish() + self.following.finish()
+        intervals = pd.DataFrame(
+            [[kind, s, e, e - s, peak, n] for kind, s, e, peak, n in rows], columns=INTERVAL_COLUMNS
+        ).sort_values("start_s", ignore_index=True)
+        steps = pd.DataFrame(self.steps.finish(), columns=STEP_COLUMNS)
+        rate = 1.0 / self.sample_period if self.sample_period else 0.0
+        spectrum = pd.DataFrame(
+            self.spectrum.peaks(rate, int(self.options["spectrum_peaks"])), columns=SPECTRUM_COLUMNS
+        )
+        summary = {
+            "torque_max": self.saturation.running_max,
+            "follow_error_max": self.following.running_max,
+            "sample_rate_hz": rate,
+            "steps": len(steps),
+            "max_overshoot_pct": float(steps["overshoot_pct"].max()) if len(steps) else math.nan,
+            "max_settling_s": float(steps["settling_s"].max()) if len(steps) else math.nan,
+        }
+        return MTraceAnalysis(intervals=intervals, steps=steps, spectrum=spectrum, summary=summary, origin_s=origin_s)
+
+
+def _anchor_s(ts: float, origin_s: float) -> float:
+    # anchors from just after midnight belong to a trace that started the evening before
+    sec = ts / 1000.0
+    return sec + DAY_S if sec < origin_s - DAY_S / 2 else sec
+
+
+def align_with_anchors(
+    intervals: pd.DataFrame, anchors: Iterable[Dict], window_s: float, origin_s: Optional[float] = None
+) -> pd.DataFrame:
+    """Attach the nearest E### anchor within ``window_s`` of every interval.
+
+    ``origin_s`` (seconds of day at trace time 0) puts the intervals on the
+    anchors' clock; without it the intervals are returned unaligned.
+    """
+    out = intervals.copy()
+    out["anchor_code"] = None
+    out["anchor_dt_s"] = np.nan
+    if origin_s is None or out.empty:
+        return out
+    pairs = sorted(
+        (_anchor_s(float(a["ts"]), origin_s), str(a.get("code", "")))
+        for a in anchors or []
+        if a.get("ts") is not None
+    )
+    if not pairs:
+        return out
+    times = np.array([t for t, _ in pairs])
+    codes = np.array([c for _, c in pairs], dtype=object)
+    start = out["start_s"].to_numpy() + origin_s
+    end = out["end_s"].to_numpy() + origin_s
+    # Last anchor at/before the interval end, and the first one after it.
+    before = np.searchsorted(times, end, side="right") - 1
+    after = np.minimum(before + 1, len(times) - 1)
+    safe_before = np.maximum(before, 0)
+    gap_before = np.where(before < 0, np.inf, np.maximum(start - times[safe_before], 0.0))
+    gap_after = np.where(times[after] > end, times[after] - end, np.inf)
+    best = np.where(gap_before <= gap_after, safe_before, after)
+    hit = np.minimum(gap_before, gap_after) <= window_s
+    out.loc[hit, "anchor_code"] = codes[best[hit]]
+    out.loc[hit, "anchor_dt_s"] = start[hit] - times[best[hit]]
+    return out
@@ -0,0 +1,266 @@
+"""Chunked M-Trace ingestion for captures larger than memory.
+
+The header is sniffed once and mapped to signals, then fixed-size chunks of
+only the mapped columns are parsed, min/max-decimated for plotting and folded
+into running statistics. The full frame is never materialised.
+"""
+from __future__ import annotations
+
+import codecs
+import io
+import math
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .lod import StreamingDecimator
+from .mtrace_analytics import MTraceAnalysis, MTraceAnalyzer
+from .tabular import WHITESPACE_SEP, TableFormat, TableSource, open_table, read_table
+
+CHUNK_ROWS = 200_000
+# Headerless numeric captures are parsed in line-aligned byte blocks of this size.
+BLOCK_BYTES = 16 << 20
+SIGNALS = ("time", "torque", "speed_act", "speed_cmd", "pos_act", "pos_cmd")
+# Column positions of a headerless AMC_AXIS capture (default firmware layout).
+AMC_DEFAULT_COLUMNS = {"time": 0, "speed_cmd": 3, "speed_act": 4, "torque": 5, "pos_cmd": 6, "pos_act": 9}
+
+Mapping = Dict[str, Optional[str]]
+
+
+@dataclass
+class RunningStats:
+    """Following error and torque peaks accumulated chunk by chunk."""
+
+    rows: int = 0
+    torque_peak: float = math.nan
+    torque_peak_time_s: Optional[float] = None
+    speed_error_max: float = math.nan
+    pos_error_max: float = math.nan
+    _sq_sums: Dict[str, float] = field(default_factory=lambda: {"speed": 0.0, "pos": 0.0})
+    _counts: Dict[str, int] = field(default_factory=lambda: {"speed": 0, "pos": 0})
+
+    def _follow(self, kind: str, cmd: np.ndarray, act: np.ndarray) -> float:
+        err = np.abs(cmd - act)
+        err = err[np.isfinite(err)]
+        if err.size == 0:
+            return math.nan
+        self._sq_sums[kind] += float(np.square(err).sum())
+        self._counts[kind] += int(err.size)
+        return float(err.max())
+
+    def update(self, time_s: np.ndarray, chunk: pd.DataFrame, mapping: Mapping) -> None:
+        self.rows += len(chunk)
+        col = mapping.get("torque")
+        if col:
+            torque = np.abs(chunk[col].to_numpy(dtype=np.float64))
+            if np.isfinite(torque).any():
+                pos = int(np.nanargmax(torque))
+                if not torque[pos] <= self.torque_peak:
+                    self.torque_peak = float(torque[pos])
+                    self.torque_peak_time_s = float(time_s[pos])
+        for kind, cmd, act in (("speed", "speed_cmd", "speed_act"), ("pos", "pos_cmd", "pos_act")):
+            if mapping.get(cmd) and mapping.get(act):
+                peak = self._follow(
+                    kind,
+                    chunk[mapping[cmd]].to_numpy(dtype=np.float64),
+                    chunk[mapping[act]].to_numpy(dtype=np.float64),
+                )
+                attr = f"{kind}_error_max"
+                setattr(self, attr, float(np.fmax(getattr(self, attr), peak)))
+
+    def _rms(self, kind: str) -> float:
+        count = self._counts[kind]
+        return math.sqrt(self._sq_sums[kind] / count) if count else math.nan
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "rows": self.rows,
+            "torque_peak": self.torque_peak,
+            "torque_peak_time_s": self.torque_peak_time_s,
+            "speed_error_max": self.speed_error_max,
+            "speed_error_rms": self._rms("speed"),
+            "pos_error_max": self.pos_error_max,
+            "pos_error_rms": self._rms("pos"),
+        }
+
+
+class _TimeBase:
+    """Convert the time column chunk by chunk, deciding the unit on the first chunk.
+
+    ``header`` mode keeps numeric time (ms -> s when the median looks like ms) or
+    uses seconds since the first timestamp; ``amc_idx`` mode starts at zero and
+    scales by the median sample period, like the AMC profile path did.
+    ``origin_s`` is the wall-clock time of day (seconds) at time 0, known only
+    for datetime stamps.
+    """
+
+    def __init__(self, column: Optional[str], mode: str):
+        self.column = column
+        self.mode = mode
+        self.kind: Optional[str] = None
+        self.scale = 1.0
+        self.origin = 0.0
+        self.origin_s: Optional[float] = None
+
+    def _decide(self, raw: pd.Series) -> None:
+        numeric = pd.to_numeric(raw, errors="coerce")
+        if self.mode == "amc_idx":
+            self.kind = "numeric"
+            dt = float(numeric.diff().median()) if len(numeric) > 1 else 1.0
+            self.scale = 1000.0 if 1.0 <= dt <= 20.0 else 1.0
+            self.origin = float(numeric.iloc[0])
+            return
+        if numeric.notna().mean() > 0.9:
+            self.kind = "numeric"
+            median = numeric.dropna().median()
+            self.scale = 1000.0 if 1000 < median <= 1_000_000_000 else 1.0
+            return
+        try:
+            self.origin = pd.to_datetime(raw).iloc[0]
+            self.kind = "datetime"
+        except (ValueError, TypeError):
+            self.kind = "index"
+            return
+        if not pd.isna(self.origin):
+            self.origin_s = (self.origin - self.origin.normalize()).total_seconds()
+
+    def convert(self, chunk: pd.DataFrame, start_row: int) -> np.ndarray:
+        if self.column is None or self.column not in chunk:
+            return (np.arange(len(chunk)) + start_row) * 0.001
+        raw = chunk[self.column]
+        if self.kind is None:
+            self._decide(raw)
+        if self.kind == "numeric":
+            values = pd.to_numeric(raw, errors="coerce").to_numpy(dtype=np.float64)
+            return (values - self.origin) / self.scale
+        if self.kind == "datetime":
+            stamps = pd.to_datetime(raw, errors="coerce")
+            return (stamps - self.origin).dt.total_seconds().to_numpy()
+        return (np.arange(len(chunk)) + start_row) * 0.001
+
+
+def _line_blocks(handle: BinaryIO, block_bytes: int) -> Iterator[bytes]:
+    carry = b""
+    while True:
+        data = handle.read(block_bytes)
+        if not data:
+            break
+        data = carry + data
+        cut = data.rfind(b"\n")
+        if cut < 0:
+            carry = data
+            continue
+        carry = data[cut + 1 :]
+        yield data[: cut + 1]
+    if carry.strip():
+        yield carry
+
+
+def _numeric_chunks(
+    handle, fmt: TableFormat, usecols: List[str], time_col: Optional[str], block_bytes: int = BLOCK_BYTES
+) -> Iterator[pd.DataFrame]:
+    """Headerless all-numeric path (AMC profiles).
+
+    Each line-aligned block is parsed in bulk by ``np.loadtxt`` straight into a
+    record array (float64 time, float32 signals) with no dtype inference; only
+    a block with a malformed line falls back to pandas plus coercion.
+    """
+    positions = [fmt.columns.index(col) for col in usecols]
+    dtype = np.dtype([(col, "f8" if col == time_col else "f4") for col in usecols])
+    delimiter = None if fmt.sep == WHITESPACE_SEP else fmt.sep
+    owned = isinstance(handle, (str, Path))
+    fh = open(handle, "rb") if owned else handle
+    try:
+        for block in _line_blocks(fh, block_bytes):
+            if block.startswith(codecs.BOM_UTF8):
+                block = block[len(codecs.BOM_UTF8) :]
+            try:
+                # Numbers are ASCII: latin-1 is the cheapest decode and cannot fail.
+                records = np.loadtxt(
+                    io.BytesIO(block),
+                    dtype=dtype,
+                    delimiter=delimiter,
+                    usecols=positions,
+                    encoding="latin-1",
+                    ndmin=1,
+                )
+                chunk = pd.DataFrame({col: records[col] for col in usecols})
+            except ValueError:
+                chunk = pd.read_csv(
+                    io.BytesIO(block),
+                    sep=fmt.sep,
+                    header=None,
+                    names=fmt.columns,
+                    usecols=usecols,
+                    encoding=fmt.encoding,
+                    engine="c",
+                    on_bad_lines="skip",
+                    low_memory=False,
+                )
+                for col in usecols:
+                    chunk[col] = pd.to_numeric(chunk[col], errors="coerce").astype(dtype[col])
+            yield chunk
+    finally:
+        if owned:
+            fh.close()
+
+
+@dataclass
+class MTraceStream:
+    columns: List[str]
+    mapping: Mapping
+    mode: str
+    frame: pd.DataFrame  # decimated: "__t__" (seconds) + mapped columns
+    stats: RunningStats
+    analysis: Optional[MTraceAnalysis] = None
+
+
+def stream_mtrace(
+    source: TableSource,
+    map_columns: Callable[[List[str], bool], tuple],
+    max_points: int,
+    chunksize: int = CHUNK_ROWS,
+    analytics: Optional[Dict] = None,
+) -> MTraceStream:
+    """Parse ``source`` in chunks into a plot-ready decimated frame and stats.
+
+    ``map_columns(columns, has_header)`` returns ``(mapping, mode)`` for the
+    sniffed header (mode ``"header"`` or ``"amc_idx"``). When ``analytics``
+    options are given (``{}`` for defaults) the chunks also feed an
+    :class:`MTraceAnalyzer`.
+    """
+    handle, fmt = open_table(source)
+    mapping, mode = map_columns(fmt.columns, fmt.header is not None)
+    used = [col for col in dict.fromkeys(mapping.get(key) for key in SIGNALS) if col]
+    value_cols = [col for col in used if col != mapping.get("time")]
+    stats = RunningStats()
+    if not any(mapping.get(key) for key in SIGNALS if key != "time"):
+        return MTraceStream(fmt.columns, mapping, mode, pd.DataFrame(), stats)
+
+    timebase = _TimeBase(mapping.get("time"), mode)
+    decimator = StreamingDecimator(max_points, value_cols)
+    analyzer = MTraceAnalyzer(mapping, analytics) if analytics is not None else None
+    if fmt.header is None and all(col in fmt.dtypes for col in used):
+        chunks = _numeric_chunks(handle, fmt, used, mapping.get("time"))
+    else:
+        # Untyped chunks: one bad cell must not abort a multi-GB stream, so coerce here.
+        untyped = replace(fmt, dtypes={})
+        chunks = read_table(handle, untyped, usecols=used, chunksize=chunksize)
+    for chunk in chunks:
+        chunk = chunk.reset_index(drop=True)
+        time_s = timebase.convert(chunk, stats.rows)
+        for col in value_cols:
+            if chunk[col].dtype.kind != "f":
+                chunk[col] = pd.to_numeric(chunk[col], errors="coerce")
+            chunk[col] = chunk[col].astype("float32")
+        stats.update(time_s, chunk, mapping)
+        if analyzer is not None:
+            analyzer.update(time_s, chunk)
+        part = chunk[value_cols]
+        part.insert(0, "__t__", time_s)
+        decimator.add(part)
+    analysis = analyzer.finish(timebase.origin_s) if analyzer is not None else None
+    return MTraceStream(fmt.columns, mapping, mode, decimator.result(), stats, analysis)
@@ -1,37 +1,44 @@
 from __future__ import annotations
-import io, re, zipfile
+import io, json, os, re, time, zipfile
 from pathlib import Path
-from typing import Iterable, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 TIME_RX = re.compile(r"\[(\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,3}))?\]")
 
 def to_ms(h, m, s, ms="0"):
     return ((int(h)*60+int(m))*60+int(s))*1000 + int(str(ms or "0").ljust(3,"0"))
 
-def iter_logs(paths) -> Iterable[Tuple[str, str]]:
+NameFilter = Optional[Callable[[str], bool]]
+
+def iter_logs(paths, name_filter: NameFilter = None) -> Iterable[Tuple[str, str]]:
+    """Yield (name, text) for every log; ``name_filter`` skips members before they are decoded."""
     for p in paths:
         p = Path(p)
         if p.is_dir():
             for q in sorted(p.rglob("*")):
-                yield from _iter_one(q)
+                yield from _iter_one(q, name_filter)
         else:
-            yield from _iter_one(p)
+            yield from _iter_one(p, name_filter)
 
-def _iter_one(p: Path):
+def _iter_one(p: Path, name_filter: NameFilter = None):
     name = str(p.name)
     if p.suffix.lower() == ".zip":
         with zipfile.ZipFile(p, "r") as z:
             for info in z.infolist():
                 if info.is_dir(): continue
-                data = z.read(info)
                 inner_name = f"{p.name}:{info.filename}"
-                if info.filename.lower().endswith(".log.zip"):
+                is_nested = info.filename.lower().endswith(".log.zip")
+                if name_filter and not is_nested and not name_filter(inner_name): continue
+                data = z.read(info)
+                if is_nested:
                     try:
                         with zipfile.ZipFile(io.BytesIO(data), "r") as inner:
                             for info2 in inner.infolist():
                                 if info2.is_dir(): continue
+                                nested_name = f"{inner_name}:{info2.filename}"
+                                if name_filter and not name_filter(nested_name): continue
                                 txt = inner.read(info2).decode("utf-8", errors="ignore")
-                                yield (f"{inner_name}:{info2.filename}", txt)
+                                yield (nested_name, txt)
                     except Exception:
                         pass
                 else:
@@ -41,6 +48,8 @@ def _iter_one(p: Path):
                         txt = data.decode("cp949", errors="ignore")
                     yield (inner_name, txt)
     else:
+        if name_filter and not name_filter(name):
+            return
         try:
             txt = p.read_text(encoding="utf-8")
         except Exception:
@@ -52,3 +61,141 @@ def find_time_ms(line: str):
     if not m: return None
     h, M, s, ms = m.groups()
     return to_ms(h, M, s, ms or "0")
+
+# --- follow mode ---------------------------------------------------------
+TAIL_SUFFIXES = (".log", ".txt", ".csv")
+
+def _decode_chunk(data: bytes) -> str:
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("cp949", errors="ignore")
+
+class FileTailer:
+    """Follow growing plain-text logs, yielding only lines appended since the last poll.
+
+    Read offsets (inode + byte position after the last complete line) are kept
+    per file and optionally persisted to ``state_path``, so a restart resumes
+    where it stopped. When a followed name no longer holds its inode (rotation),
+    the old inode is looked up among all files of the followed folders, whatever
+    the rotated name (``app.log.1``, ``app.1.log``, ...); its remaining lines are
+    emitted under the original name and the rotated file is tracked at its end,
+    so it is never read again as a new file. A file that shrank (truncation) is
+    re-read from the start. Cost per poll is one ``stat`` per file plus the new
+    bytes (plus one folder scan in a poll that sees a rotation).
+    """
+
+    def __init__(self, paths, state_path: Optional[Path] = None, name_filter: NameFilter = None, from_end: bool = False):
+        self.paths = [Path(p) for p in paths]
+        self.state_path = Path(state_path) if state_path else None
+        self.name_filter = name_filter
+        self._skip_existing = from_end  # first poll only: files already present start at their end
+        self.state: Dict[str, Dict[str, int]] = {}
+        if self.state_path and self.state_path.exists():
+            try: self.state = json.loads(self.state_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError): self.state = {}
+
+    def _files(self) -> List[Path]:
+        out = []
+        for p in self.paths:
+            cands = sorted(q for q in p.rglob("*") if q.is_file()) if p.is_dir() else [p]
+            for q in cands:
+                if q.suffix.lower() not in TAIL_SUFFIXES: continue
+                if self.name_filter and not self.name_filter(q.name): continue
+                out.append(q)
+        return out
+
+    def _by_inode(self) -> Dict[int, Path]:
+        """Every file of the followed folders (any name or suffix) by inode."""
+        out: Dict[int, Path] = {}
+        for p in self.paths:
+            cands = p.rglob("*") if p.is_dir() else p.parent.glob("*")
+            for q in cands:
+                try:
+                    if q.is_file(): out.setdefault(q.stat().st_ino, q)
+                except OSError: continue
+        return out
+
+    @staticmethod
+    def _read_from(path: Path, offset: int, final: bool = False) -> Tuple[bytes, int]:
+        with path.open("rb") as fh:
+            fh.seek(offset)
+            data = fh.read()
+        # keep a partial last line for the next poll (a rotated file no longer grows)
+        cut = len(data) if final else data.rfind(b"\n") + 1
+        return data[:cut], offset + cut
+
+    def _rotations(self, current: Dict[str, os.stat_result]) -> Dict[str, Path]:
+        """Tracked name -> file now holding its old inode under another name."""
+        moved = [
+            key for key, prev in self.state.items()
+            if key not in current or current[key].st_ino != prev["inode"]
+        ]
+        if not moved: return {}
+        inodes = self._by_inode()
+        out = {}
+        for key in moved:
+            q = inodes.get(self.state[key]["inode"])
+            if q is not None and str(q) != key: out[key] = q
+        return out
+
+    def poll(self) -> List[Tuple[str, List[str]]]:
+        """New complete lines per file since the previous call."""
+        out = []
+        dirty = self._skip_existing
+        current: Dict[str, os.stat_result] = {}
+        paths: Dict[str, Path] = {}
+        for path in self._files():
+            try: current[str(path)] = path.stat()
+            except OSError: continue
+            paths[str(path)] = path
+        # remainders of rotated files go out under their original name, before the new file's lines
+        pending: Dict[str, List[bytes]] = {}
+        rotated_to: set = set()
+        old_state = dict(self.state)
+        for key, old in self._rotations(current).items():
+            prev = old_state[key]
+            try: data, end = self._read_from(old, prev["offset"], final=True)
+            except OSError: continue
+            if data: pending[key] = [data if data.endswith(b"\n") else data + b"\n"]
+            self.state[str(old)] = {"inode": prev["inode"], "offset": end}
+            rotated_to.add(str(old))
+            dirty = True
+        for key, st in current.items():
+            if key in rotated_to: continue
+            prev = self.state.get(key)
+            chunks = pending.pop(key, [])
+            offset = 0
+            if prev is None and self._skip_existing:
+                self.state[key] = {"inode": st.st_ino, "offset": st.st_size}
+                continue
+            if prev is not None and prev["inode"] == st.st_ino and st.st_size >= prev["offset"]:
+                offset = prev["offset"]
+                if st.st_size == offset and not chunks: continue
+            data, offset = self._read_from(paths[key], offset)
+            chunks.append(data)
+            self.state[key] = {"inode": st.st_ino, "offset": offset}
+            dirty = True
+            text = _decode_chunk(b"".join(chunks))
+            if text: out.append((paths[key].name, text.splitlines()))
+        for key, chunks in pending.items():  # rotated away and not recreated (yet)
+            text = _decode_chunk(b"".join(chunks))
+            if text: out.append((Path(key).name, text.splitlines()))
+        # forget names that are gone, so a recycled inode is not taken for a rotation
+        kept = {key: v for key, v in self.state.items() if key in current}
+        if len(kept) != len(self.state):
+            self.state = kept
+            dirty = True
+        self._skip_existing = False
+        if dirty and self.state_path:
+            tmp = self.state_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.state), encoding="utf-8")
+            os.replace(tmp, self.state_path)
+        return out
+
+    def follow(self, interval_s: float = 1.0, stop: Optional[Callable[[], bool]] = None) -> Iterable[List[Tuple[str, List[str]]]]:
+        """Yield non-empty poll results until ``stop()`` returns True."""
+        while not (stop and stop()):
+            batch = self.poll()
+            if batch: yield batch
+            else: time.sleep(interval_s)
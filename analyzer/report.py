@@ -23,3 +23,12 @@ def banner_lines(banner, error_map) -> str:
 
 def one_line(rec: Dict[str,Any]) -> str:
     return f"[{ms_to_hms(rec.get('ts'))}] {rec.get('file')} :: {rec.get('text')}"
+
+def template_line(t: Dict[str,Any]) -> str:
+    return f"[{ms_to_hms(t.get('first_ts'))}] x{t.get('count')} {t.get('template')}"
+
+def template_rows(templates) -> list:
+    return [
+        {"유형": t["template"], "건수": t["count"], "최초": ms_to_hms(t.get("first_ts")), "최종": ms_to_hms(t.get("last_ts"))}
+        for t in templates
+    ]
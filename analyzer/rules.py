@@ -1,6 +1,8 @@
 from __future__ import annotations
 import re
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Tuple
+
+from .code_indexer import build_error_lookup
 
 class RuleSet:
     def __init__(self, rules: Dict, code_index: Dict | None = None):
@@ -11,6 +13,8 @@ class RuleSet:
         self._precursor_rx = [re.compile(p, re.I) for p in rules["precursor_patterns"]]
         self._conf_whitelist = [re.compile(p, re.I) for p in rules["confusion_whitelist"]]
         self._drive_rx = [re.compile(p, re.I) for p in rules["drive_keywords"]]
+        self._lookup = self._build_lookup()
+        self._error_map = self._build_error_map()
 
     def categorize(self, filename: str) -> str:
         for cat, rx in self._cat_rx.items():
@@ -45,25 +49,26 @@ class RuleSet:
 
     @property
     def error_map(self):
-        em = self.rules["error_patterns"].get("confirm_map", {}).copy()
-        for num, name in self._iter_code_mappings():
-            em[str(num)] = name
-        return em
+        return self._error_map
+
+    @property
+    def error_conflicts(self) -> Dict[str, Dict]:
+        return self._lookup.get("conflicts", {})
+
+    def error_names(self, codes: Iterable) -> List[str]:
+        em = self._error_map
+        return [em.get(str(code), "") for code in codes]
 
-    def _iter_code_mappings(self):
+    def _build_lookup(self) -> Dict[str, Dict]:
         index = self.code_index or {}
         if not isinstance(index, dict):
-            return []
-        if "map_num_to_name" in index:
-            return list(index.get("map_num_to_name", {}).items())
+            return {"display_map": {}, "conflicts": {}}
+        lookup = index.get("error_lookup")
+        if isinstance(lookup, dict) and isinstance(lookup.get("display_map"), dict):
+            return lookup
+        return build_error_lookup(index)
 
-        pairs = []
-        for key, section in index.items():
-            if key == "meta":
-                continue
-            if not isinstance(section, dict):
-                continue
-            map_num_to_name = section.get("map_num_to_name")
-            if isinstance(map_num_to_name, dict):
-                pairs.extend(map_num_to_name.items())
-        return pairs
+    def _build_error_map(self) -> Dict[str, str]:
+        em = self.rules["error_patterns"].get("confirm_map", {}).copy()
+        em.update(self._lookup.get("display_map", {}))
+        return em
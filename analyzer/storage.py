@@ -1,6 +1,7 @@
 from __future__ import annotations
 import io
 import json
+import time
 import zipfile
 from pathlib import Path
 from typing import Any, Dict, Optional
@@ -217,6 +218,7 @@ def save_source_index(obj: Dict[str, Any]) -> None:
         meta["required_sources"] = [str(r) for r in required]
 
     meta["cycle_ms"] = 1
+    meta["index_version"] = time.time_ns()  # keys caches of data derived from the index
 
     if not _is_valid_source_index(obj, tuple(meta["required_sources"])):
         raise ValueError("source_index.json must include the configured required sections")
@@ -224,5 +226,8 @@ def save_source_index(obj: Dict[str, Any]) -> None:
     save_json(SOURCE_INDEX_FILE, obj)
 
 
-def required_sources_present(required: tuple[str, ...] | None = None) -> bool:
-    return _is_valid_source_index(load_source_index(), required)
+def required_sources_present(
+    required: tuple[str, ...] | None = None, index: Dict[str, Any] | None = None
+) -> bool:
+    """``index`` defaults to :func:`load_source_index` (pass an already loaded one to skip the read)."""
+    return _is_valid_source_index(load_source_index() if index is None else index, required)
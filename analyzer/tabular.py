@@ -0,0 +1,238 @@
+"""Fast delimited-table reader shared by the M-Trace parsers.
+
+The format (encoding, delimiter, header row, numeric dtypes) is sniffed once
+from the first few KB, then the whole file is parsed by pandas' C engine, or
+pyarrow when it is installed, with explicit dtypes.
+"""
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+try:  # optional: faster multi-threaded parser
+    import pyarrow  # noqa: F401
+
+    HAS_PYARROW = True
+except ImportError:  # pragma: no cover - depends on the environment
+    HAS_PYARROW = False
+
+CANDIDATE_ENCODINGS = ("utf-8-sig", "utf-8", "cp949", "euc-kr", "latin-1")
+DELIMITER_CANDIDATES = (",", "\t", ";", "|")
+WHITESPACE_SEP = r"\s+"
+SNIFF_BYTES = 64 * 1024
+SAMPLE_ROWS = 200
+SEP_MAJORITY = 0.6  # share of sniffed lines that must agree on a delimiter count
+
+# float32 holds integers exactly up to 2**24; larger or monotonically increasing
+# columns (time/tick counters) stay float64.
+_FLOAT32_LIMIT = float(2**24)
+
+TableSource = Union[bytes, str, Path, BinaryIO]
+
+
+@dataclass
+class TableFormat:
+    encoding: str
+    sep: str
+    header: Optional[int]
+    columns: List[str]
+    dtypes: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def engine(self) -> str:
+        if HAS_PYARROW and self.sep != WHITESPACE_SEP:
+            return "pyarrow"
+        return "c"
+
+
+class _PrefixedStream(io.RawIOBase):
+    """Replay already-consumed head bytes in front of a non-seekable stream."""
+
+    def __init__(self, head: bytes, rest: BinaryIO):
+        self._head = memoryview(head)
+        self._rest = rest
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._head:
+            n = min(len(buffer), len(self._head))
+            buffer[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        data = self._rest.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def _decode_head(head: bytes) -> Tuple[str, str]:
+    # Drop a trailing partial line so a multi-byte character cut at the sniff
+    # boundary does not reject the right encoding.
+    cut = head.rfind(b"\n")
+    if 0 < cut < len(head) - 1:
+        head = head[: cut + 1]
+    for enc in CANDIDATE_ENCODINGS:
+        try:
+            return enc, head.decode(enc)
+        except UnicodeDecodeError:
+            continue
+    return "latin-1", head.decode("latin-1", errors="ignore")
+
+
+def _is_number(token: str) -> bool:
+    try:
+        float(token)
+    except ValueError:
+        return False
+    return True
+
+
+def _sniff_sep(lines: List[str]) -> str:
+    """Delimiter whose per-line count is the most consistent.
+
+    A real delimiter appears the same number of times on most lines. A few
+    comment or malformed lines must not push a CSV to the whitespace fallback
+    (which would parse it as one column), so a clear majority
+    (``SEP_MAJORITY``) of lines is enough, and the most consistent candidate
+    wins (ties go to the higher count).
+    """
+    best, best_key = WHITESPACE_SEP, (0.0, 0)
+    for sep in DELIMITER_CANDIDATES:
+        counts = [line.count(sep) for line in lines]
+        present = [count for count in counts if count]
+        if not present:
+            continue
+        mode = max(set(present), key=present.count)
+        key = (counts.count(mode) / len(counts), mode)
+        if key[0] >= SEP_MAJORITY and key > best_key:
+            best, best_key = sep, key
+    return best
+
+
+def _split(line: str, sep: str) -> List[str]:
+    return line.split() if sep == WHITESPACE_SEP else [tok.strip() for tok in line.split(sep)]
+
+
+def _float_dtype(values: pd.Series) -> str:
+    finite = values.dropna()
+    if finite.empty:
+        return "float32"
+    if finite.abs().max() >= _FLOAT32_LIMIT:
+        return "float64"
+    if len(finite) > 2 and finite.is_monotonic_increasing and finite.nunique() == len(finite):
+        return "float64"
+    return "float32"
+
+
+def sniff_table(head: bytes) -> TableFormat:
+    """Infer encoding, delimiter, header and numeric dtypes from ``head``."""
+    encoding, text = _decode_head(head)
+    lines = [line for line in text.splitlines() if line.strip()][: SAMPLE_ROWS + 1]
+    if not lines:
+        raise ValueError("empty table")
+    sep = _sniff_sep(lines[:50])
+    first = _split(lines[0], sep)
+    header = None if all(_is_number(tok) for tok in first if tok) else 0
+
+    sample = pd.read_csv(
+        io.StringIO("\n".join(lines)),
+        sep=sep,
+        header=header,
+        engine="c",
+        on_bad_lines="skip",
+    )
+    if header is None:
+        sample.columns = [str(i) for i in range(sample.shape[1])]
+    columns = [str(col) for col in sample.columns]
+
+    dtypes: Dict[str, str] = {}
+    for col in sample.columns:
+        series = sample[col]
+        if series.dtype.kind in "iuf":
+            dtypes[str(col)] = _float_dtype(series.astype("float64"))
+    return TableFormat(encoding=encoding, sep=sep, header=header, columns=columns, dtypes=dtypes)
+
+
+def _open(source: TableSource) -> Tuple[Union[str, Path, BinaryIO], bytes]:
+    """Return a re-readable handle for ``source`` plus its first SNIFF_BYTES."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        buffer = io.BytesIO(source)
+        return buffer, bytes(source[:SNIFF_BYTES])
+    if isinstance(source, (str, Path)):
+        path = Path(source)
+        with path.open("rb") as fh:
+            head = fh.read(SNIFF_BYTES)
+        return path, head
+    head = source.read(SNIFF_BYTES)
+    if hasattr(source, "seekable") and source.seekable():
+        source.seek(0)
+        return source, head
+    return io.BufferedReader(_PrefixedStream(head, source)), head
+
+
+def open_table(source: TableSource) -> Tuple[Union[str, Path, BinaryIO], TableFormat]:
+    """Sniff ``source`` once; the returned handle can be passed on to :func:`read_table`."""
+    handle, head = _open(source)
+    return handle, sniff_table(head)
+
+
+def _read_kwargs(fmt: TableFormat, usecols: Optional[List[str]], float32: bool) -> Dict:
+    dtypes = {col: (dt if float32 else "float64") for col, dt in fmt.dtypes.items()}
+    if usecols is not None:
+        dtypes = {col: dt for col, dt in dtypes.items() if col in usecols}
+    kwargs: Dict = {
+        "sep": fmt.sep,
+        "encoding": fmt.encoding,
+        "header": fmt.header,
+        "dtype": dtypes or None,
+    }
+    if fmt.header is None:
+        kwargs["names"] = fmt.columns
+    if usecols is not None:
+        kwargs["usecols"] = usecols
+    return kwargs
+
+
+def read_table(
+    source: TableSource,
+    fmt: Optional[TableFormat] = None,
+    *,
+    usecols: Optional[List[str]] = None,
+    float32: bool = True,
+    chunksize: Optional[int] = None,
+):
+    """Parse ``source`` with a single sniff and the fastest available engine.
+
+    Returns a DataFrame, or a chunk iterator when ``chunksize`` is given.
+    Columns sniffed as numeric get explicit float dtypes (float32 where it is
+    lossless enough); rows that break the sniffed layout are skipped.
+    """
+    handle, head = _open(source)
+    if fmt is None:
+        fmt = sniff_table(head)
+    kwargs = _read_kwargs(fmt, usecols, float32)
+
+    engine = "c" if chunksize else fmt.engine
+    if chunksize:
+        return pd.read_csv(handle, engine=engine, chunksize=chunksize, on_bad_lines="skip", **kwargs)
+    try:
+        return pd.read_csv(handle, engine=engine, on_bad_lines="skip", **kwargs)
+    except (ValueError, TypeError):
+        # A sniffed-numeric column holds text further down: parse untyped, coerce.
+        if not isinstance(handle, (str, Path)):
+            if not handle.seekable():
+                raise
+            handle.seek(0)
+        kwargs["dtype"] = None
+        frame = pd.read_csv(handle, engine="c", on_bad_lines="skip", **kwargs)
+        for col, dtype in fmt.dtypes.items():
+            if col in frame.columns:
+                frame[col] = pd.to_numeric(frame[col], errors="coerce").astype(
+                    dtype if float32 else "float64"
+                )
+        return frame
@@ -0,0 +1,220 @@
+"""Online message-template mining (Drain-style) for log lines.
+
+Every line is reduced to a template such as
+``[<*>:<*>:<*>] AMC axis <*> follow error <*>`` and gets that template's id.
+Numbers (including decimals and ``0x`` codes) are masked first; the masked
+line is looked up in a cache, so a repeated message shape costs one regex
+substitution and one dict lookup. Only a new shape walks the Drain parse tree (token count, then the
+first ``prefix_tokens`` tokens) and is compared token-by-token against the
+templates of that leaf; positions that differ become ``<*>``.
+
+Per template the miner keeps the count, first/last timestamp, per-category
+counts and a sparse time histogram (``bucket_ms`` buckets), which is enough to
+list rare messages or messages that first appeared around an anchor. The
+miner also indexes which templates occur in each bucket, so the templates
+active in a time window are found without walking all of them.
+Parameters are extracted on demand with :meth:`TemplateMiner.params`.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .parser import find_time_ms
+
+WILDCARD = "<*>"
+_MASK_RX = re.compile(r"\d[\dA-Fa-fx.]*")  # digit-led runs: integers, decimals, 0x codes, dotted ids
+
+DEFAULTS = {
+    "sim_threshold": 0.5,  # share of equal tokens needed to join a template
+    "prefix_tokens": 2,  # tree depth below the token-count level (the time stamp is one)
+    "max_children": 100,  # per tree node; further keys share the wildcard child
+    "bucket_ms": 60_000,  # time histogram resolution
+    "cache_size": 200_000,  # masked line -> template id entries before the cache is reset
+}
+
+
+@dataclass
+class Template:
+    id: int
+    tokens: List[str]
+    sample: str
+    count: int = 0
+    first_ts: Optional[int] = None
+    last_ts: Optional[int] = None
+    cats: Dict[str, int] = field(default_factory=dict)
+    hist: Dict[int, int] = field(default_factory=dict)  # bucket index -> lines
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.tokens)
+
+    def to_dict(self, bucket_ms: int, with_hist: bool = False) -> Dict:
+        out = {
+            "id": self.id,
+            "template": self.text,
+            "count": self.count,
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "cats": dict(self.cats),
+            "sample": self.sample,
+        }
+        if with_hist:
+            out["hist"] = {str(b * bucket_ms): n for b, n in sorted(self.hist.items())}
+        return out
+
+
+def iter_lines(text: str) -> Iterator[str]:
+    """Lines of ``text`` one at a time (no list of all lines is built)."""
+    start = 0
+    find = text.find
+    while True:
+        end = find("\n", start)
+        if end < 0:
+            if start < len(text):
+                yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+class TemplateMiner:
+    def __init__(self, options: Optional[Dict] = None):
+        opts = {**DEFAULTS, **(options or {})}
+        self.sim_threshold = float(opts["sim_threshold"])
+        self.prefix_tokens = int(opts["prefix_tokens"])
+        self.max_children = int(opts["max_children"])
+        self.bucket_ms = int(opts["bucket_ms"])
+        self.cache_size = int(opts["cache_size"])
+        self.templates: List[Template] = []
+        self.lines = 0
+        self._root: Dict[int, Dict] = {}
+        self._cache: Dict[str, int] = {}
+        self._active: Dict[int, List[int]] = {}  # histogram bucket -> ids of templates with lines there
+
+    # --- matching ---
+    def _leaf(self, tokens: List[str]) -> List[int]:
+        node = self._root.setdefault(len(tokens), {})
+        for token in tokens[: self.prefix_tokens]:
+            key = WILDCARD if WILDCARD in token else token
+            child = node.get(key)
+            if child is None:
+                if len(node) >= self.max_children:
+                    key = WILDCARD
+                child = node.setdefault(key, {})
+            node = child
+        return node.setdefault(None, [])  # None key holds the leaf's template ids
+
+    def _similarity(self, template: List[str], tokens: List[str]) -> Tuple[float, int]:
+        same = wild = 0
+        for a, b in zip(template, tokens):
+            if a == WILDCARD:
+                wild += 1
+            elif a == b:
+                same += 1
+        return same / len(tokens), wild
+
+    def _match(self, masked: str, raw: str) -> int:
+        tokens = masked.split()
+        if not tokens:
+            tokens = [""]
+        leaf = self._leaf(tokens)
+        best, best_key = None, (-1.0, -1)
+        for tid in leaf:
+            key = self._similarity(self.templates[tid].tokens, tokens)
+            if key > best_key:
+                best, best_key = tid, key
+        if best is not None and best_key[0] >= self.sim_threshold:
+            tmpl = self.templates[best]
+            tmpl.tokens = [a if a == b else WILDCARD for a, b in zip(tmpl.tokens, tokens)]
+            return best
+        tid = len(self.templates)
+        self.templates.append(Template(tid, tokens, raw.strip()))
+        leaf.append(tid)
+        return tid
+
+    # --- ingestion ---
+    def add(self, line: str, ts: Optional[int] = None, cat: Optional[str] = None) -> int:
+        """Template id of ``line``; updates that template's count, times and histogram."""
+        masked = _MASK_RX.sub(WILDCARD, line)
+        tid = self._cache.get(masked)
+        if tid is None:
+            tid = self._match(masked, line)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[masked] = tid
+        tmpl = self.templates[tid]
+        tmpl.count += 1
+        self.lines += 1
+        if cat is not None:
+            tmpl.cats[cat] = tmpl.cats.get(cat, 0) + 1
+        if ts is not None:
+            if tmpl.first_ts is None or ts < tmpl.first_ts:
+                tmpl.first_ts = ts
+            if tmpl.last_ts is None or ts > tmpl.last_ts:
+                tmpl.last_ts = ts
+            bucket = ts // self.bucket_ms
+            n = tmpl.hist.get(bucket, 0)
+            if not n:
+                self._active.setdefault(bucket, []).append(tid)
+            tmpl.hist[bucket] = n + 1
+        return tid
+
+    def add_text(self, text: str, cat: Optional[str] = None) -> int:
+        """Mine every non-empty line of ``text``; returns the number of lines mined."""
+        n = 0
+        for line in iter_lines(text):
+            if line and not line.isspace():
+                self.add(line, find_time_ms(line), cat)
+                n += 1
+        return n
+
+    def params(self, tid: int, line: str) -> List[str]:
+        """Values of ``line`` at the template's variable positions."""
+        out: List[str] = []
+        for tmpl_tok, tok in zip(self.templates[tid].tokens, line.split()):
+            if tmpl_tok == WILDCARD:
+                out.append(tok)
+            elif WILDCARD in tmpl_tok:
+                out.extend(_MASK_RX.findall(tok))
+        return out
+
+    # --- queries ---
+    def count_between(self, tid: int, start_ts: int, end_ts: int) -> int:
+        """Lines of a template in the histogram buckets overlapping ``[start_ts, end_ts]``."""
+        hist = self.templates[tid].hist
+        lo, hi = start_ts // self.bucket_ms, end_ts // self.bucket_ms
+        if hi - lo + 1 < len(hist):
+            return sum(hist.get(b, 0) for b in range(lo, hi + 1))
+        return sum(n for b, n in hist.items() if lo <= b <= hi)
+
+    def active_between(self, start_ts: int, end_ts: int) -> List[int]:
+        """Sorted ids of templates with lines in the histogram buckets overlapping ``[start_ts, end_ts]``."""
+        lo, hi = start_ts // self.bucket_ms, end_ts // self.bucket_ms
+        if hi - lo + 1 < len(self._active):
+            found = {tid for b in range(lo, hi + 1) for tid in self._active.get(b, ())}
+        else:
+            found = {tid for b, tids in self._active.items() if lo <= b <= hi for tid in tids}
+        return sorted(found)
+
+    def top(self, n: int = 10, cat: Optional[str] = None) -> List[Template]:
+        pool = self.templates if cat is None else [t for t in self.templates if cat in t.cats]
+        key = (lambda t: t.count) if cat is None else (lambda t: t.cats[cat])
+        return sorted(pool, key=lambda t: (-key(t), t.id))[:n]
+
+    def rare(self, max_count: int = 2, n: int = 10, cat: Optional[str] = None) -> List[Template]:
+        """Templates seen at most ``max_count`` times, earliest first."""
+        pool = [
+            t for t in self.templates
+            if t.count <= max_count and (cat is None or cat in t.cats)
+        ]
+        return sorted(pool, key=lambda t: (t.first_ts is None, t.first_ts or 0, t.id))[:n]
+
+    def first_seen_between(self, start_ts: int, end_ts: int, n: int = 20) -> List[Template]:
+        """Templates whose first occurrence falls in ``[start_ts, end_ts]``, rarest first."""
+        pool = [t for t in self.templates if t.first_ts is not None and start_ts <= t.first_ts <= end_ts]
+        return sorted(pool, key=lambda t: (t.count, t.first_ts, t.id))[:n]
+
+    def summary(self, templates: Iterable[Template], with_hist: bool = False) -> List[Dict]:
+        return [t.to_dict(self.bucket_ms, with_hist) for t in templates]
@@ -0,0 +1,88 @@
+"""Server-side trace tiles on top of the min/max pyramid.
+
+Zoom level ``z`` splits a trace's time span into ``2**z`` equal tiles. Each
+tile is answered from the :class:`~analyzer.lod.TracePyramid` with at most
+``tile_points`` rows, so the payload sent to the browser stays bounded no
+matter how long the trace is. Recently used tiles are kept in a small LRU.
+"""
+from __future__ import annotations
+
+import math
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .lod import TracePyramid
+
+TILE_POINTS = 1_000
+TILE_CACHE_SIZE = 64
+MAX_ZOOM = 16
+
+
+class TileRenderer:
+    def __init__(self, pyramid: TracePyramid, tile_points: int = TILE_POINTS, cache_size: int = TILE_CACHE_SIZE):
+        self.pyramid = pyramid
+        self.tile_points = tile_points
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[int, int], pd.DataFrame]" = OrderedDict()
+        time = pyramid.time[np.isfinite(pyramid.time)]
+        self.t0 = float(time.min()) if time.size else 0.0
+        self.t1 = float(time.max()) if time.size else 0.0
+
+    @property
+    def max_zoom(self) -> int:
+        """Deepest useful level: below it a tile already holds raw samples."""
+        rows = len(self.pyramid)
+        if rows <= self.tile_points:
+            return 0
+        return min(MAX_ZOOM, math.ceil(math.log2(rows / self.tile_points)))
+
+    def tile_count(self, zoom: int) -> int:
+        return 2 ** max(0, min(zoom, self.max_zoom))
+
+    def bounds(self, zoom: int, index: int) -> Tuple[float, float]:
+        count = self.tile_count(zoom)
+        index = max(0, min(index, count - 1))
+        width = (self.t1 - self.t0) / count
+        return self.t0 + index * width, self.t0 + (index + 1) * width
+
+    def tile_for(self, zoom: int, time_value: float) -> int:
+        count = self.tile_count(zoom)
+        if self.t1 <= self.t0:
+            return 0
+        return int(max(0, min(count - 1, (time_value - self.t0) / (self.t1 - self.t0) * count)))
+
+    def tile(self, zoom: int, index: int) -> pd.DataFrame:
+        zoom = max(0, min(zoom, self.max_zoom))
+        index = max(0, min(index, self.tile_count(zoom) - 1))
+        key = (zoom, index)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+        start, end = self.bounds(zoom, index)
+        frame = self.pyramid.query(start, end, self.tile_points)
+        self._cache[key] = frame
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return frame
+
+    def payload(self, zoom: int, index: int, digits: int = 6) -> Dict[str, object]:
+        """Compact JSON-ready tile: column names plus row-major rounded values."""
+        frame = self.tile(zoom, index)
+        start, end = self.bounds(zoom, index)
+        rows: List[list] = [
+            [value if value == value else None for value in row]  # NaN -> null
+            for row in np.round(frame.to_numpy(dtype=np.float64), digits).tolist()
+        ]
+        return {
+            "zoom": zoom,
+            "index": index,
+            "tiles": self.tile_count(zoom),
+            "start": start,
+            "end": end,
+            "columns": list(frame.columns),
+            "rows": rows,
+        }
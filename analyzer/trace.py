@@ -1,14 +1,17 @@
 from __future__ import annotations
 
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from io import StringIO
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 
+from .lod import TracePyramid
 from .parser import iter_logs
+from .tiles import TileRenderer
+from .trace_store import HAS_FEATHER, compact_frame, read_columns, read_meta, trace_key, write_trace
 
 
 _COLUMN_KEYWORDS = {
@@ -20,14 +23,28 @@ _COLUMN_KEYWORDS = {
     "torque_percent": {"torque", "torquepercent", "tq", "tqpercent"},
 }
 
-_KV_PATTERNS = {
-    "time_ms": re.compile(r"(?:time|ms|tick)\s*[:=]\s*(-?\d+(?:\.\d+)?)", re.I),
-    "command_position": re.compile(r"cmd(?:_?|\s*)(?:pos|position)\s*[:=]\s*(-?\d+(?:\.\d+)?)", re.I),
-    "actual_position": re.compile(r"(?:real|act|fb)(?:_?|\s*)(?:pos|position)\s*[:=]\s*(-?\d+(?:\.\d+)?)", re.I),
-    "command_velocity": re.compile(r"cmd(?:_?|\s*)(?:vel|velocity|speed)\s*[:=]\s*(-?\d+(?:\.\d+)?)", re.I),
-    "actual_velocity": re.compile(r"(?:real|act|fb)(?:_?|\s*)(?:vel|velocity|speed)\s*[:=]\s*(-?\d+(?:\.\d+)?)", re.I),
-    "torque_percent": re.compile(r"(?:torque|tq)(?:\(\%\))?\s*[:=]\s*(-?\d+(?:\.\d+)?)", re.I),
+_KV_FIELDS = {
+    "time_ms": r"(?:time|ms|tick)",
+    "command_position": r"cmd(?:_?|\s*)(?:pos|position)",
+    "actual_position": r"(?:real|act|fb)(?:_?|\s*)(?:pos|position)",
+    "command_velocity": r"cmd(?:_?|\s*)(?:vel|velocity|speed)",
+    "actual_velocity": r"(?:real|act|fb)(?:_?|\s*)(?:vel|velocity|speed)",
+    "torque_percent": r"(?:torque|tq)(?:\(\%\))?",
 }
+# One pass over the whole buffer: group 1 matches line breaks (to number the
+# lines), group i+1 holds the value of the i-th key. The leading lookahead lets
+# the regex engine skip positions that cannot start a match.
+_KV_KEYS = tuple(_KV_FIELDS)
+_KV_RX = re.compile(
+    r"(?=[\ntmcrafTMCRAF])(?:(\n)|"
+    + "|".join(rf"{prefix}\s*[:=]\s*(-?\d+(?:\.\d+)?)" for prefix in _KV_FIELDS.values())
+    + ")",
+    re.I,
+)
+
+_HAS_ALPHA = re.compile(r"[A-Za-z]")
+_COMMENT_LINE = re.compile(r"^[ \t]*(?:#|//|;).*$", re.M)
+_DELIMS_TO_SPACE = str.maketrans({",": " ", ";": " ", "\t": " "})
 
 
 def _clean_tokens(line: str) -> List[str]:
@@ -43,30 +60,54 @@ def _normalise_column(name: str) -> Optional[str]:
     return None
 
 
-def _build_dataframe_from_table(text: str) -> pd.DataFrame:
-    header: Optional[List[str]] = None
-    rows: List[List[str]] = []
-    for raw_line in text.splitlines():
-        line = raw_line.strip()
+def _find_header(text: str) -> Tuple[Optional[List[str]], int]:
+    """Return the header tokens and the offset of the first line after them."""
+    pos, size = 0, len(text)
+    while pos < size:
+        end = text.find("\n", pos)
+        if end < 0:
+            end = size
+        line = text[pos:end].strip()
+        pos = end + 1
         if not line or line.startswith(("#", "//", ";")):
             continue
         tokens = _clean_tokens(line)
-        if not tokens:
-            continue
-        if header is None and any(re.search(r"[A-Za-z]", tok) for tok in tokens):
-            header = tokens
-            continue
-        if header is None:
-            # No explicit header detected yet; continue searching.
-            continue
-        if len(tokens) < len(header):
-            continue
-        rows.append(tokens[: len(header)])
+        if tokens and any(_HAS_ALPHA.search(tok) for tok in tokens):
+            seen: Dict[str, int] = {}
+            header = []
+            for tok in tokens:
+                # Mangle duplicates the way pandas does for a parsed header row.
+                count = seen.get(tok, 0)
+                seen[tok] = count + 1
+                header.append(f"{tok}.{count}" if count else tok)
+            return header, pos
+    return None, size
+
 
-    if not rows or header is None:
+def _build_dataframe_from_table(text: str) -> pd.DataFrame:
+    header, offset = _find_header(text)
+    if header is None:
         return pd.DataFrame()
 
-    df = pd.read_csv(StringIO("\n".join([",".join(header)] + [",".join(row) for row in rows])), engine="python")
+    # Strip comment lines and fold every delimiter into whitespace, then let the
+    # C parser convert the remaining buffer in bulk.
+    body = _COMMENT_LINE.sub("", text[offset:]).translate(_DELIMS_TO_SPACE)
+    try:
+        # usecols truncates longer rows to the header width, as before.
+        df = pd.read_csv(
+            StringIO(body),
+            sep=r"\s+",
+            header=None,
+            names=header,
+            usecols=range(len(header)),
+            engine="c",
+        )
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, ValueError):
+        return pd.DataFrame()
+    if df.empty:
+        return pd.DataFrame()
+    # Rows shorter than the header were skipped by the old tokeniser.
+    df = df[df.iloc[:, -1].notna()]
 
     rename_map: Dict[str, str] = {}
     for col in df.columns:
@@ -78,24 +119,25 @@ def _build_dataframe_from_table(text: str) -> pd.DataFrame:
 
 
 def _build_dataframe_from_key_values(text: str) -> pd.DataFrame:
-    records: List[Dict[str, float]] = []
-    for raw_line in text.splitlines():
-        line = raw_line.strip()
-        if not line:
+    found = _KV_RX.findall(text)
+    if not found:
+        return pd.DataFrame()
+    hits = np.array(found, dtype=object)
+    is_break = hits[:, 0] == "\n"
+    line_no = np.cumsum(is_break)
+
+    columns: Dict[str, pd.Series] = {}
+    for pos, key in enumerate(_KV_KEYS, start=1):
+        values = hits[:, pos]
+        mask = (values != "") & ~is_break
+        if not mask.any():
             continue
-        values: Dict[str, float] = {}
-        for key, rx in _KV_PATTERNS.items():
-            m = rx.search(line)
-            if m:
-                try:
-                    values[key] = float(m.group(1))
-                except ValueError:
-                    continue
-        if values:
-            records.append(values)
-    if not records:
+        # First value per key and line, like a per-key regex search.
+        lines, first = np.unique(line_no[mask], return_index=True)
+        columns[key] = pd.Series(values[mask][first].astype(float), index=lines)
+    if not columns:
         return pd.DataFrame()
-    return pd.DataFrame(records)
+    return pd.DataFrame(columns).reset_index(drop=True)
 
 
 def _ensure_numeric(df: pd.DataFrame) -> pd.DataFrame:
@@ -120,23 +162,27 @@ def _augment_timebase(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def _detect_command_events(df: pd.DataFrame) -> List[float]:
-    candidates: List[pd.Series] = []
-    if "command_position" in df.columns:
-        candidates.append(df["command_position"].diff().abs())
-    if "command_velocity" in df.columns:
-        candidates.append(df["command_velocity"].diff().abs())
-    if not candidates:
-        return []
+_COMMAND_COLUMNS = ("command_position", "command_velocity")
+
 
-    combined = pd.concat(candidates, axis=1, ignore_index=True).max(axis=1)
-    finite = combined.replace([np.inf, -np.inf], np.nan).dropna()
-    if finite.empty:
-        return []
-    threshold = max(finite.std() * 2, finite.max() * 0.15, 1e-3)
-    mask = combined >= threshold
-    times = df.loc[mask, "time_ms"].dropna().unique()
-    return sorted(float(t) for t in times)
+def _detect_command_events(df: pd.DataFrame) -> np.ndarray:
+    """Row indices where any command channel jumps (one 2-D diff over all channels)."""
+    cols = [col for col in _COMMAND_COLUMNS if col in df.columns]
+    if not cols or len(df) < 2:
+        return np.empty(0, dtype=np.int64)
+    values = df[cols].to_numpy(dtype=np.float64)
+    steps = np.abs(np.diff(values, axis=0))
+    steps[~np.isfinite(steps)] = np.nan
+    with np.errstate(invalid="ignore"):
+        combined = np.fmax.reduce(steps, axis=1)
+    finite = combined[~np.isnan(combined)]
+    if finite.size == 0:
+        return np.empty(0, dtype=np.int64)
+    spread = finite.std(ddof=1) if finite.size > 1 else 0.0
+    threshold = max(spread * 2, finite.max() * 0.15, 1e-3)
+    with np.errstate(invalid="ignore"):
+        hits = np.flatnonzero(combined >= threshold) + 1
+    return hits[np.isfinite(df["time_ms"].to_numpy()[hits])]
 
 
 def parse_trace_text(text: str) -> pd.DataFrame:
@@ -161,42 +207,130 @@ class TraceDataset:
     file: str
     category: str
     axis: Optional[str]
-    frame: pd.DataFrame
-    error_times: List[float]
-    command_times: List[float]
+    columns: List[str]
+    time_origin: float
+    error_times: np.ndarray
+    command_index: np.ndarray
+    cache_key: Optional[str] = None
+    source: Optional[str] = None  # path handed to iter_logs that holds ``file``
+    _frame: Optional[pd.DataFrame] = field(default=None, repr=False, compare=False)
+    _pyramids: Dict[Tuple[str, ...], TracePyramid] = field(default_factory=dict, repr=False, compare=False)
+    _tiles: Dict[Tuple[str, ...], TileRenderer] = field(default_factory=dict, repr=False, compare=False)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        return self.load(self.columns)
+
+    @property
+    def command_times(self) -> np.ndarray:
+        if self.command_index.size == 0:
+            return np.empty(0)
+        return self.load(["time_ms"])["time_ms"].to_numpy()[self.command_index]
+
+    def load(self, columns: Iterable[str]) -> pd.DataFrame:
+        """Frame with ``columns`` only, read from the trace cache on first use."""
+        wanted = [col for col in dict.fromkeys(columns) if col in self.columns]
+        loaded = set(self._frame.columns) if self._frame is not None else set()
+        missing = [col for col in wanted if col not in loaded]
+        if missing:
+            try:
+                part = read_columns(self.cache_key, missing)
+            except FileNotFoundError:  # pruned from the cache while this dataset was open
+                part = self._reparse()[missing]
+            self._frame = part if self._frame is None else pd.concat([self._frame, part], axis=1)
+        if self._frame is None:
+            return pd.DataFrame(columns=wanted)
+        return self._frame[wanted]
+
+    def _reparse(self) -> pd.DataFrame:
+        """Parse ``file`` from ``source`` again (and re-cache it); its text must still match ``cache_key``."""
+        if self.source is not None:
+            for _, text in iter_logs([self.source], name_filter=lambda name: name == self.file):
+                if trace_key(text) != self.cache_key:
+                    continue
+                frame, _ = _parse_trace(text)
+                return frame if frame is not None else read_columns(self.cache_key, self.columns)
+        raise FileNotFoundError(f"trace cache entry {self.cache_key} was pruned and {self.file} changed or is gone")
+
+    def _pyramid(self, columns: Iterable[str]) -> Tuple[Tuple[str, ...], TracePyramid]:
+        key = tuple(col for col in columns if col in self.columns)
+        pyramid = self._pyramids.get(key)
+        if pyramid is None:
+            frame = self.load(["time_offset_sec", *key])
+            pyramid = TracePyramid.from_frame(frame, "time_offset_sec", key)
+            self._pyramids[key] = pyramid
+        return key, pyramid
+
+    def tiles(self, columns: Iterable[str]) -> TileRenderer:
+        """Tile renderer (zoom level x tile index) sharing the column set's pyramid."""
+        key, pyramid = self._pyramid(columns)
+        renderer = self._tiles.get(key)
+        if renderer is None:
+            renderer = TileRenderer(pyramid)
+            self._tiles[key] = renderer
+        return renderer
+
+
+def _parse_trace(text: str) -> Tuple[Optional[pd.DataFrame], Optional[Dict[str, object]]]:
+    """Parse ``text`` or reuse its cached columns; returns (frame or None, summary)."""
+    key = trace_key(text) if HAS_FEATHER else None
+    meta = read_meta(key) if key else None
+    if meta is not None:
+        return None, meta
+    df = parse_trace_text(text)
+    if df.empty:
+        return df, None
+    command_index = _detect_command_events(df)
+    df = compact_frame(df)
+    time_ms = df["time_ms"]
+    meta = {
+        "key": key,
+        "columns": [str(col) for col in df.columns],
+        "time_origin": float(time_ms.iloc[0]),
+        "time_min": float(time_ms.min()),
+        "time_max": float(time_ms.max()),
+        "command_index": command_index.tolist(),
+    }
+    if key and write_trace(key, df, meta):
+        # Served from the memory-mapped cache from now on.
+        return None, meta
+    return df, meta
 
 
 def collect_trace_datasets(paths: Iterable, rules, result: Dict[str, object]) -> List[TraceDataset]:
     traces: List[TraceDataset] = []
     axis_rx = re.compile(r"AXIS\[(\d)\]")
-    error_times = [float(a["ts"]) for a in result.get("anchors", []) if a.get("ts") is not None]
-
-    for fname, text in iter_logs(paths):
-        category = rules.categorize(fname)
-        if category not in {"트레이스_C", "트레이스_M"}:
-            continue
-        df = parse_trace_text(text)
-        if df.empty:
-            continue
-        m = axis_rx.search(fname)
-        axis_label: Optional[str] = None
-        if m:
-            axis_label = rules.axis_name(m.group(1))
-        trace_errors = []
-        if error_times:
-            min_time = df["time_ms"].min()
-            max_time = df["time_ms"].max()
-            trace_errors = [t for t in error_times if min_time <= t <= max_time]
-        command_times = _detect_command_events(df)
-        traces.append(
-            TraceDataset(
-                file=fname,
-                category=category,
-                axis=axis_label,
-                frame=df,
-                error_times=trace_errors,
-                command_times=command_times,
+    anchor_times = np.sort(
+        np.array([a["ts"] for a in result.get("anchors", []) if a.get("ts") is not None], dtype=np.float64)
+    )
+
+    def _is_trace(name: str) -> bool:
+        return rules.categorize(name) in {"트레이스_C", "트레이스_M"}
+
+    for source in paths:
+        for fname, text in iter_logs([source], name_filter=_is_trace):
+            category = rules.categorize(fname)
+            frame, meta = _parse_trace(text)
+            if meta is None:
+                continue
+            m = axis_rx.search(fname)
+            axis_label: Optional[str] = None
+            if m:
+                axis_label = rules.axis_name(m.group(1))
+            lo = np.searchsorted(anchor_times, meta["time_min"], side="left")
+            hi = np.searchsorted(anchor_times, meta["time_max"], side="right")
+            traces.append(
+                TraceDataset(
+                    file=fname,
+                    category=category,
+                    axis=axis_label,
+                    columns=list(meta["columns"]),
+                    time_origin=meta["time_origin"],
+                    error_times=anchor_times[lo:hi],
+                    command_index=np.asarray(meta["command_index"], dtype=np.int64),
+                    cache_key=meta["key"] if frame is None else None,
+                    source=str(source),
+                    _frame=frame,
+                )
             )
-        )
     return traces
-
@@ -0,0 +1,138 @@
+"""Feather cache for parsed trace logs.
+
+Parsed 트레이스_C/트레이스_M frames are written once per file content (sha256 of
+the text plus ``PARSER_VERSION``) under ``data/trace_cache``. Value columns are
+stored as float32 and the time base as float64; per-trace summary values live
+in the Arrow schema metadata so a cache hit needs no column data at all.
+Without pyarrow the cache is disabled and traces stay in memory.
+
+Reads touch the file's mtime; after each write the least recently used
+entries are removed until the cache fits ``TRACE_CACHE_MAX_BYTES``. Entries
+used within ``TRACE_CACHE_GRACE_S`` are kept even above the cap, because
+open trace datasets still read columns from them; a dataset whose entry was
+pruned anyway (e.g. held longer by the app's resource cache) parses its
+source log again.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from .storage import DATA
+
+try:  # optional: Arrow IPC (Feather v2) files
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    HAS_FEATHER = True
+except ImportError:  # pragma: no cover - depends on the environment
+    HAS_FEATHER = False
+
+# Bump whenever parse_trace_text() output or the stored summary changes so stale
+# entries are ignored.
+PARSER_VERSION = "2"
+TRACE_CACHE_DIR = DATA / "trace_cache"
+TRACE_CACHE_MAX_BYTES = 2 << 30
+TRACE_CACHE_GRACE_S = 3600
+TIME_COLUMNS = ("time_ms", "time_index", "time_offset_ms", "time_sec", "time_offset_sec")
+_META_KEY = b"sfu_trace"
+
+
+def trace_key(text: str) -> str:
+    digest = hashlib.sha256(PARSER_VERSION.encode("ascii"))
+    digest.update(text.encode("utf-8", errors="surrogatepass"))
+    return digest.hexdigest()
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """float32 for value columns, float64 for the time base."""
+    dtypes = {col: ("float64" if col in TIME_COLUMNS else "float32") for col in df.columns}
+    return df.astype(dtypes).reset_index(drop=True)
+
+
+def _path(key: str) -> Path:
+    return TRACE_CACHE_DIR / f"{key}.feather"
+
+
+def _touch(path: Path) -> None:
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune_cache(max_bytes: int = TRACE_CACHE_MAX_BYTES, grace_s: float = TRACE_CACHE_GRACE_S) -> int:
+    """Remove least recently used entries above ``max_bytes``; returns the number removed."""
+    entries = []
+    for path in TRACE_CACHE_DIR.glob("*.feather"):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - grace_s
+    removed = 0
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes or mtime >= cutoff:
+            break
+        try:
+            path.unlink()
+        except OSError:  # e.g. still memory-mapped on Windows
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def read_meta(key: str) -> Optional[Dict[str, Any]]:
+    """Summary stored with a cached trace, or None on a cache miss."""
+    if not HAS_FEATHER:
+        return None
+    path = _path(key)
+    if not path.exists():
+        return None
+    try:
+        with pa.memory_map(str(path)) as source:
+            schema = pa.ipc.open_file(source).schema
+        raw = (schema.metadata or {}).get(_META_KEY)
+        meta = json.loads(raw) if raw else None
+    except (OSError, ValueError, pa.ArrowException):
+        return None
+    if meta is not None:
+        _touch(path)
+    return meta
+
+
+def write_trace(key: str, frame: pd.DataFrame, meta: Dict[str, Any]) -> bool:
+    if not HAS_FEATHER:
+        return False
+    tmp: Optional[Path] = None
+    try:
+        TRACE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata({_META_KEY: json.dumps(meta).encode("utf-8")})
+        # unique temp name: the app and batch workers may write the same key at once
+        with tempfile.NamedTemporaryFile(dir=TRACE_CACHE_DIR, prefix=f"{key}.", suffix=".tmp", delete=False) as fh:
+            tmp = Path(fh.name)
+        feather.write_feather(table, str(tmp))
+        os.replace(tmp, _path(key))
+    except (OSError, pa.ArrowException):
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
+        return False
+    prune_cache()
+    return True
+
+
+def read_columns(key: str, columns: List[str]) -> pd.DataFrame:
+    """Load only ``columns`` of a cached trace (memory-mapped)."""
+    _touch(_path(key))
+    return feather.read_table(str(_path(key)), columns=columns, memory_map=True).to_pandas()
@@ -1,15 +1,18 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import re
 
 import streamlit as st
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import altair as alt
 import pandas as pd
 
 from analyzer.storage import (
+    SOURCE_INDEX_FILE,
     load_rules,
     save_rules,
     load_source_index,
@@ -18,8 +21,8 @@ from analyzer.storage import (
 )
 from analyzer.rules import RuleSet
 from analyzer.engine import analyze
-from analyzer.report import banner_lines, one_line, ms_to_hms
-from analyzer.diagnostics import generate_diagnostic_report
+from analyzer.report import banner_lines, one_line, ms_to_hms, template_line, template_rows
+from analyzer.diagnostics import DIAGNOSTIC_STAGES, generate_diagnostic_report
 from analyzer.learn import add_feedback
 from analyzer.code_indexer import build_source_index
 from analyzer.trace import collect_trace_datasets
@@ -30,18 +33,90 @@ from analyzer.viz import configure_altair
 from core.config import load_config
 from core.ingest import load_zip, basic_validate, summarize_source, SourceBundle
 from core.git_loader import fetch_from_git
+from oht_analyzer.pipeline.watcher import load_index
 
 configure_altair()
 # ────────────────────────────────────────────────────────────────
 
 cfg = load_config()
 
+# ── Caching across reruns ────────────────────────────────────────
+# Every widget interaction reruns this script. The source index and the
+# compiled RuleSet are shared resources keyed by content stamps; analysis
+# results are cached per (log file hashes, ruleset hash, target codes, source
+# mode), so opening an expander or moving a slider does not re-analyze.
+ANALYSIS_CACHE_ENTRIES = 8
+ANALYSIS_CACHE_TTL_S = 6 * 3600
+TRACE_CACHE_ENTRIES = 2  # parsed trace frames are large
+
+
+def _index_stamp() -> Tuple[int, int]:
+    """Changes whenever source_index.json is rewritten (0, 0 = built-in default system)."""
+    try:
+        st_ = SOURCE_INDEX_FILE.stat()
+        return (st_.st_mtime_ns, st_.st_size)
+    except OSError:
+        return (0, 0)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _source_index(stamp: Tuple[int, int]) -> Dict[str, Any]:
+    return load_source_index()
+
+
+def _ruleset_key(rules: Dict[str, Any], index_stamp: Tuple[int, int]) -> str:
+    blob = json.dumps(rules, sort_keys=True, ensure_ascii=False) + repr(index_stamp)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _ruleset(ruleset_key: str, _rules: Dict[str, Any], _index: Dict[str, Any]) -> RuleSet:
+    return RuleSet(_rules, code_index=_index)
+
+
+def _file_hashes(paths: List[Path]) -> Tuple[Tuple[str, str], ...]:
+    """(name, sha256) per log file; digests are memoized per (path, size, mtime)."""
+    memo = st.session_state.setdefault("_file_hash_memo", {})
+    out = []
+    for p in paths:
+        files = sorted(q for q in p.rglob("*") if q.is_file()) if p.is_dir() else [p]
+        for q in files:
+            stat = q.stat()
+            stamp = (str(q), stat.st_size, stat.st_mtime_ns)
+            digest = memo.get(stamp)
+            if digest is None:
+                digest = memo[stamp] = hashlib.sha256(q.read_bytes()).hexdigest()
+            out.append((q.name, digest))
+    return tuple(out)
+
+
+@st.cache_data(max_entries=ANALYSIS_CACHE_ENTRIES, ttl=ANALYSIS_CACHE_TTL_S, show_spinner=False)
+def _analysis(files, ruleset_key: str, target_codes, source_mode, _paths, _rules: RuleSet) -> Dict[str, Any]:
+    return analyze(list(_paths), _rules, target_codes=set(target_codes) or None, source_mode=source_mode)
+
+
+@st.cache_data(max_entries=ANALYSIS_CACHE_ENTRIES, ttl=ANALYSIS_CACHE_TTL_S, show_spinner=False)
+def _diagnostics(files, ruleset_key: str, target_codes, source_mode, _result, _rules: RuleSet):
+    timings: dict = {}
+    report = generate_diagnostic_report(
+        _result, _rules, max_workers=cfg.get("diagnostics", {}).get("max_workers"), timings=timings
+    )
+    return report, timings
+
+
+@st.cache_resource(max_entries=TRACE_CACHE_ENTRIES, ttl=ANALYSIS_CACHE_TTL_S, show_spinner=False)
+def _trace_datasets(files, ruleset_key: str, target_codes, source_mode, _paths, _rules: RuleSet, _result):
+    # shared, read-only: datasets keep their tile caches between reruns
+    return collect_trace_datasets(list(_paths), _rules, _result)
+
+
 st.set_page_config(page_title="OHT 로그 분석기 (로그 + 코드 참조)", layout="wide")
 
 st.markdown("## ✅ OHT 로그 분석기 — 증거-우선 / 보수적 결론 / 피드백 학습 / **코드 ZIP 자동참조**")
 st.caption("축: 0=Driving-Rear, 1=Driving-Front, 2=Hoist, 3=Slide | 1ms 통신 | amulation/crc15_ccitt 제외")
 
-current_idx = load_source_index()
+index_stamp = _index_stamp()
+current_idx = _source_index(index_stamp)
 vehicle_count = len(current_idx.get("vehicle", {}).get("map_num_to_name", {}))
 motion_count = len(current_idx.get("motion", {}).get("map_num_to_name", {}))
 idx_source = current_idx.get("meta", {}).get("source")
@@ -58,6 +133,10 @@ if vehicle_count and motion_count:
 else:
     st.caption("현재 코드 매핑이 비어 있습니다.")
 
+conflict_count = len(current_idx.get("error_lookup", {}).get("conflicts", {}))
+if conflict_count:
+    st.caption(f"⚠️ 동일 번호에 서로 다른 이름이 정의된 에러코드 {conflict_count}건 — 리포트에는 `이름A / 이름B`로 표기됩니다.")
+
 with st.sidebar:
     st.markdown("### 설정 / 룰셋")
     rules_obj = load_rules()
@@ -80,6 +159,10 @@ SOURCE_MODE_MOTION = "모션만 ZIP(빠른 모드)"
 SOURCE_MODE_GIT = "Git Import(선택)"
 
 VALIDATION_KEYWORDS = ["err_"]
+# Trace charts are drawn from server-side tiles (analyzer.tiles) over these columns.
+TRACE_PLOT_COLUMNS = [
+    "actual_position", "command_position", "actual_velocity", "command_velocity", "torque_percent",
+]
 
 both_required = cfg.get("require_both_code_zips", True)
 allow_git_sources = cfg.get("allow_git_sources", False)
@@ -275,19 +358,21 @@ with col_idx1:
             st.exception(exc)
 with col_idx2:
     if st.button("현재 코드 매핑 요약 보기"):
-        idx = load_source_index()
+        idx = _source_index(_index_stamp())
         vehicle_preview = dict(list(idx.get("vehicle", {}).get("map_num_to_name", {}).items())[:20])
         motion_preview = dict(list(idx.get("motion", {}).get("map_num_to_name", {}).items())[:20])
+        conflict_preview = dict(list(idx.get("error_lookup", {}).get("conflicts", {}).items())[:20])
         st.json(
             {
                 "meta": idx.get("meta", {}),
                 "vehicle": {"map_num_to_name": vehicle_preview},
                 "motion": {"map_num_to_name": motion_preview},
+                "conflicts": conflict_preview,
             }
         )
 
 required_tuple = ("vehicle", "motion") if both_required else None
-if not required_sources_present(required_tuple):
+if not required_sources_present(required_tuple, index=current_idx):
     if both_required:
         st.warning("vehicle_control.zip과 motion_control.zip을 모두 인덱싱해야 로그 분석을 진행할 수 있습니다.")
     else:
@@ -301,9 +386,13 @@ case_name = st.text_input("케이스 이름(리포트 표기용)", value="CASE_0
 uploaded_paths: List[Path] = []
 if uploads:
     tmpdir = Path("./_work"); tmpdir.mkdir(exist_ok=True)
+    written = st.session_state.setdefault("_written_uploads", {})
     for f in uploads:
         p = tmpdir / f.name
-        p.write_bytes(f.getbuffer())
+        upload_id = getattr(f, "file_id", None) or (f.name, f.size)
+        if written.get(f.name) != upload_id or not p.exists():  # rewriting would change mtime and force a rehash
+            p.write_bytes(f.getbuffer())
+            written[f.name] = upload_id
         uploaded_paths.append(p)
     st.success(f"{len(uploaded_paths)}개 로그 파일 저장 완료")
 
@@ -345,21 +434,31 @@ with colB:
 
 if st.session_state.get("analyze_now") and uploaded_paths:
     with st.spinner("분석 중..."):
-        rs = RuleSet(load_rules(), code_index=load_source_index())
-        result = analyze(
-            uploaded_paths,
-            rs,
-            target_codes=target_code_set,
-            source_mode=st.session_state.get("source_mode"),
+        rules_now = load_rules()
+        rs_key = _ruleset_key(rules_now, index_stamp)
+        rs = _ruleset(rs_key, rules_now, current_idx)
+        analysis_key = (
+            _file_hashes(uploaded_paths),
+            rs_key,
+            tuple(sorted(target_code_set or ())),
+            st.session_state.get("source_mode"),
         )
+        result = _analysis(*analysis_key, tuple(uploaded_paths), rs)
     st.success("분석 완료!")
+    st.session_state["suggested_precursors"] = sorted({
+        c["pattern"] for group in result["by_code"].values() for c in group.get("suggested_precursors", [])
+    })
 
     st.markdown("#### ✔ 검증 배너(요약)")
     st.code(banner_lines(result["banner"], rs.error_map), language="markdown")
 
-    diagnostics = generate_diagnostic_report(result, rs)
+    diagnostics, diag_timings = _diagnostics(*analysis_key, result, rs)
     if diagnostics:
         st.markdown("#### 🧠 자동 진단 요약")
+        st.caption(
+            f"진단 {len(diagnostics)}건 · {diag_timings['total']:.2f}s (스레드 {diag_timings['workers']}) — "
+            + ", ".join(f"{stage} {diag_timings[stage]:.2f}s" for stage in DIAGNOSTIC_STAGES)
+        )
         for diag in diagnostics:
             title = f"E{diag['code']}"
             if diag.get("name"):
@@ -397,41 +496,76 @@ if st.session_state.get("analyze_now") and uploaded_paths:
     for b in result["banner"]:
         code = str(b["code"]); name = rs.error_map.get(code, "")
         st.markdown(f"**E{code} {f'({name})' if name else ''}** — {ms_to_hms(b['first'])} ~ {ms_to_hms(b['last'])}, count={b['count']}")
-        precs = [p for p in result["precursors"] if str(p["code"])==code]
+        group = result["by_code"].get(code, {})
+        precs = group.get("precursors", [])
         if precs:
             st.write(f"전조 이벤트 {len(precs)}건 (앵커 최초 대비 Δt ms):")
             for p in precs[:10]:
                 st.code(one_line(p), language="text")
         else:
             st.write("전조 이벤트: 없음")
-        drives = [d for d in result["drive_samples"] if str(d["code"])==code]
+        drives = group.get("drive_samples", [])
         if drives:
             with st.expander("주행 힌트 원문 보기"):
                 for d in drives[:10]:
                     st.code(one_line(d), language="text")
         else:
             st.caption("주행 힌트: 미확정(증거 부족)")
-
-    trace_datasets = collect_trace_datasets(uploaded_paths, rs, result)
+        suggested = group.get("suggested_precursors", [])
+        if suggested:
+            with st.expander(f"전조 후보(자동 제안) {len(suggested)}건 — 아래 피드백에서 룰로 추가 가능"):
+                for c in suggested:
+                    if c["kind"] == "new":
+                        st.caption(f"첫 등장 · 앵커 대비 {c['dt_ms']} ms")
+                    else:
+                        st.caption(f"빈도 급증 · 직전 구간 {c['observed']}건 (평소 {c['expected']:.2f}건, p={c['p_value']:.1e})")
+                    st.code(c["sample"], language="text")
+        new_tmpls = group.get("new_templates", [])
+        if new_tmpls:
+            with st.expander(f"앵커 주변에서 처음 나타난 메시지 유형 {len(new_tmpls)}건 (드문 순)"):
+                for t in new_tmpls:
+                    st.code(template_line(t), language="text")
+
+    trace_datasets = _trace_datasets(*analysis_key, tuple(uploaded_paths), rs, result)
     if trace_datasets:
         st.markdown("#### 📈 트레이스 로그 상세 분석")
         st.caption("실제/명령 궤적과 토크를 비교하고 주요 이벤트 시점을 표시합니다.")
         for trace in trace_datasets:
-            df = trace.frame
             header = f"{trace.file}"
             if trace.axis:
                 header += f" · 축: {trace.axis}"
             st.markdown(f"**{header}**")
 
-            origin = df["time_ms"].iloc[0]
+            plot_cols = [col for col in TRACE_PLOT_COLUMNS if col in trace.columns]
+            if not plot_cols:
+                st.caption("위치/속도/토크 열이 없어 그래프를 표시하지 않습니다.")
+                continue
+            tiles = trace.tiles(plot_cols)
+            zoom, tile_index = 0, 0
+            if tiles.max_zoom > 0:
+                zoom_col, tile_col = st.columns([1, 3])
+                zoom = zoom_col.slider(
+                    "확대 단계", 0, tiles.max_zoom, 0, key=f"trace_zoom_{trace.file}_{trace.axis}"
+                )
+                if tiles.tile_count(zoom) > 1:
+                    tile_index = tile_col.slider(
+                        "구간", 0, tiles.tile_count(zoom) - 1, 0, key=f"trace_tile_{trace.file}_{trace.axis}_{zoom}"
+                    )
+            tile_start, tile_end = tiles.bounds(zoom, tile_index)
+            tile_df = tiles.tile(zoom, tile_index)
+
+            origin = trace.time_origin
+            command_times = trace.command_times
             error_df = pd.DataFrame({
-                "time_offset_sec": [(t - origin) / 1000.0 for t in trace.error_times],
-                "label": ["에러 발생"] * len(trace.error_times),
-            }) if trace.error_times else pd.DataFrame(columns=["time_offset_sec", "label"])
+                "time_offset_sec": (trace.error_times - origin) / 1000.0,
+                "label": "에러 발생",
+            })
             command_df = pd.DataFrame({
-                "time_offset_sec": [(t - origin) / 1000.0 for t in trace.command_times],
-                "label": ["명령 시점"] * len(trace.command_times),
-            }) if trace.command_times else pd.DataFrame(columns=["time_offset_sec", "label"])
+                "time_offset_sec": (command_times - origin) / 1000.0,
+                "label": "명령 시점",
+            })
+            error_df = error_df[error_df["time_offset_sec"].between(tile_start, tile_end)]
+            command_df = command_df[command_df["time_offset_sec"].between(tile_start, tile_end)]
 
             def _marker_layer(data: pd.DataFrame, color: str, dash: Optional[List[int]] = None):
                 if data.empty:
@@ -444,13 +578,13 @@ if st.session_state.get("analyze_now") and uploaded_paths:
 
             layers = []
 
-            if {"actual_position", "command_position"}.intersection(df.columns):
+            if {"actual_position", "command_position"}.intersection(trace.columns):
                 pos_cols = {}
-                if "actual_position" in df.columns:
+                if "actual_position" in trace.columns:
                     pos_cols["actual_position"] = "실제 위치"
-                if "command_position" in df.columns:
+                if "command_position" in trace.columns:
                     pos_cols["command_position"] = "명령 위치"
-                pos_df = df[["time_offset_sec", *pos_cols.keys()]].rename(columns=pos_cols)
+                pos_df = tile_df[["time_offset_sec", *pos_cols.keys()]].rename(columns=pos_cols)
                 pos_melt = pos_df.melt("time_offset_sec", var_name="항목", value_name="값")
                 pos_chart = alt.Chart(pos_melt).mark_line().encode(
                     x=alt.X("time_offset_sec:Q", title="시간 (s)"),
@@ -460,13 +594,13 @@ if st.session_state.get("analyze_now") and uploaded_paths:
                 )
                 layers.append((pos_chart, "위치"))
 
-            if {"actual_velocity", "command_velocity"}.intersection(df.columns):
+            if {"actual_velocity", "command_velocity"}.intersection(trace.columns):
                 vel_cols = {}
-                if "actual_velocity" in df.columns:
+                if "actual_velocity" in trace.columns:
                     vel_cols["actual_velocity"] = "실제 속도"
-                if "command_velocity" in df.columns:
+                if "command_velocity" in trace.columns:
                     vel_cols["command_velocity"] = "명령 속도"
-                vel_df = df[["time_offset_sec", *vel_cols.keys()]].rename(columns=vel_cols)
+                vel_df = tile_df[["time_offset_sec", *vel_cols.keys()]].rename(columns=vel_cols)
                 vel_melt = vel_df.melt("time_offset_sec", var_name="항목", value_name="값")
                 vel_chart = alt.Chart(vel_melt).mark_line().encode(
                     x=alt.X("time_offset_sec:Q", title="시간 (s)"),
@@ -476,8 +610,9 @@ if st.session_state.get("analyze_now") and uploaded_paths:
                 )
                 layers.append((vel_chart, "속도"))
 
-            if "torque_percent" in df.columns:
-                tq_chart = alt.Chart(df).mark_line(color="#9467bd").encode(
+            if "torque_percent" in trace.columns:
+                tq_df = tile_df[["time_offset_sec", "torque_percent"]]
+                tq_chart = alt.Chart(tq_df).mark_line(color="#9467bd").encode(
                     x=alt.X("time_offset_sec:Q", title="시간 (s)"),
                     y=alt.Y("torque_percent:Q", title="토크(%)"),
                     tooltip=[alt.Tooltip("time_offset_sec:Q", title="Δt(s)"), alt.Tooltip("torque_percent:Q", title="토크(%)")],
@@ -519,10 +654,17 @@ if st.session_state.get("analyze_now") and uploaded_paths:
                 with st.expander("근거 원문 샘플"):
                     for rec in s["samples"][:8]:
                         st.code(one_line(rec), language="text")
+            if s.get("templates"):
+                with st.expander("메시지 유형(템플릿) 요약"):
+                    st.dataframe(pd.DataFrame(template_rows(s["templates"])), use_container_width=True, hide_index=True)
+                    if s.get("rare_templates"):
+                        st.caption("드문 메시지 유형 (2회 이하)")
+                        for t in s["rare_templates"]:
+                            st.code(template_line(t), language="text")
             st.markdown('---')
 
     # --- M-Trace: speed/position vs torque charts ---
-    render_mtrace_section()
+    render_mtrace_section(anchors=result.get("anchors"))
 
 st.markdown("### 3) 피드백 / 재학습")
 with st.form("feedback_form"):
@@ -530,9 +672,14 @@ with st.form("feedback_form"):
     fb_comment = st.text_area("피드백 메모", "")
     new_precursors = st.text_area("추가 전조 패턴 (줄바꿈 구분)", "")
     new_confusions = st.text_area("추가 혼동어(에러 아님) 패턴 (줄바꿈 구분)", "")
+    picked_suggestions = st.multiselect(
+        "자동 제안 전조 패턴 (앵커 직전 빈도 급증/첫 등장 메시지)",
+        st.session_state.get("suggested_precursors", []),
+    )
     submitted = st.form_submit_button("피드백 저장 & 룰 업데이트")
     if submitted:
         pc = [s.strip() for s in new_precursors.splitlines() if s.strip()]
+        pc += [s for s in picked_suggestions if s not in pc]
         cf = [s.strip() for s in new_confusions.splitlines() if s.strip()]
         rules_after = add_feedback(case_name, fb_comment, pc, cf)
         st.success("피드백 저장 & 룰 업데이트 완료")
@@ -541,14 +688,50 @@ with st.form("feedback_form"):
 if st.button("피드백 반영하여 재분석 ▶"):
     if uploads:
         with st.spinner("재분석 중..."):
-            rs = RuleSet(load_rules(), code_index=load_source_index())
-            result = analyze(
-                [Path("./_work")],
+            rules_now = load_rules()  # includes the rules saved by the feedback form
+            rs_key = _ruleset_key(rules_now, index_stamp)
+            rs = _ruleset(rs_key, rules_now, current_idx)
+            work = (Path("./_work"),)
+            result = _analysis(
+                _file_hashes(list(work)),
+                rs_key,
+                tuple(sorted(target_code_set or ())),
+                st.session_state.get("source_mode"),
+                work,
                 rs,
-                target_codes=target_code_set,
-                source_mode=st.session_state.get("source_mode"),
             )
         st.success("재분석 완료")
         st.code(banner_lines(result["banner"], rs.error_map), language="markdown")
     else:
         st.warning("먼저 로그 파일을 업로드하세요.")
+
+st.markdown("### 4) 감시 폴더 자동 분석 결과")
+watch_cfg = cfg.get("watch", {}) or {}
+watch_index = load_index(watch_cfg.get("out_dir") or "artifacts/watch")
+if not watch_index:
+    st.caption(
+        "아직 게시된 결과가 없습니다. `python -m oht_analyzer watch <드롭 폴더>`로 감시 서비스를 실행하면 "
+        "번들이 도착하는 즉시 분석되어 여기에 표시됩니다."
+    )
+else:
+    index_df = pd.DataFrame(watch_index)
+    index_cols = [
+        "vehicle", "bundle", "status", "master_errors", "amc_recv_errors", "user_errors", "incidents",
+        "finished_at", "latency_s",
+    ]
+    st.dataframe(index_df[[c for c in index_cols if c in index_df.columns]], use_container_width=True, hide_index=True)
+    picked = st.selectbox("결과 보기", [e["bundle"] for e in watch_index], key="watch_pick")
+    entry = next(e for e in watch_index if e["bundle"] == picked)
+    if entry.get("error"):
+        st.error(entry["error"])
+    plan_path = Path(entry.get("artifacts_dir") or "") / "analysis_plan.json"
+    if plan_path.is_file():
+        watch_plan = json.loads(plan_path.read_text(encoding="utf-8"))
+        for step in watch_plan.get("plan", []):
+            with st.expander(f"{step['step']}) {step['title']} · {len(step.get('items', []))}건"):
+                if step["step"] == 3:
+                    for item in step.get("items", []):
+                        for key in ("speed_png", "pos_png"):
+                            if item.get(key) and Path(item[key]).is_file():
+                                st.image(item[key], caption=item["source"])
+                st.json(step.get("items", []), expanded=False)
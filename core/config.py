@@ -10,6 +10,46 @@ import yaml
 _DEFAULT_CONFIG = {
     "require_both_code_zips": True,
     "allow_git_sources": False,
+    "diagnostics": {
+        "max_workers": 4,
+    },
+    "mtrace": {
+        "torque_limit": None,
+        "saturation_ratio": 0.95,
+        "follow_error_limit": None,
+        "anchor_window_s": 5.0,
+        "amc_profiles": {},
+    },
+    "crosslog": {
+        "link_cycles": 5,
+        "incident_gap_cycles": 1000,
+        "min_sources": 2,
+        "max_incidents": 100,
+    },
+    "errscan": {
+        "sample_size": 500,
+        "top_k": 200,
+    },
+    "templates": {
+        "sim_threshold": 0.5,
+        "prefix_tokens": 2,
+        "max_children": 100,
+        "bucket_ms": 60000,
+    },
+    "anomaly": {
+        "bucket_ms": 1000,
+        "max_keys": 4194304,
+        "min_count": 3,
+        "p_value": 0.001,
+        "max_suggestions": 10,
+    },
+    "watch": {
+        "drop_dir": "",
+        "out_dir": "artifacts/watch",
+        "jobs": 1,
+        "settle_s": 2.0,
+        "poll_s": 1.0,
+    },
     "git": {
         "default_vehicle_repo": "",
         "default_motion_repo": "",
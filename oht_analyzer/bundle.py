@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import hashlib
+import tarfile
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Optional
+
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+@dataclass
+class BundleMember:
+    """One file inside a folder/zip/tar bundle, opened only on demand."""
+
+    name: str
+    size: Optional[int]
+    opener: Callable[[], BinaryIO]
+    bundle: Optional[Path] = None
+    kind: str = "file"  # dir | zip | tar | file
+    crc: Optional[int] = None
+
+    def open(self) -> BinaryIO:
+        return self.opener()
+
+    def fingerprint(self) -> str:
+        """Content identity: the stored CRC for zip members, else a streamed sha256."""
+        if self.crc is not None:
+            return f"crc32:{self.crc:08x}:{self.size}"
+        digest = hashlib.sha256()
+        with self.open() as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                digest.update(block)
+        return f"sha256:{digest.hexdigest()}"
+
+    def read_bytes(self) -> bytes:
+        with self.open() as fh:
+            return fh.read()
+
+
+def iter_bundle_members(
+    bundle: Path, name_filter: Optional[Callable[[str], bool]] = None
+) -> Iterable[BundleMember]:
+    """Yield members of ``bundle`` without reading them.
+
+    Archive members can only be opened while the generator is suspended on
+    them (the archive is closed once iteration finishes).
+    """
+    bundle = Path(bundle)
+
+    def wanted(name: str) -> bool:
+        return name_filter is None or name_filter(name)
+
+    if bundle.is_dir():
+        for fp in bundle.rglob("*"):
+            if fp.is_file() and wanted(str(fp)):
+                yield BundleMember(str(fp), fp.stat().st_size, lambda fp=fp: fp.open("rb"), bundle, "dir")
+        return
+    lower = bundle.name.lower()
+    if lower.endswith(".zip"):
+        with zipfile.ZipFile(bundle, "r") as zp:
+            for info in zp.infolist():
+                if info.is_dir() or not wanted(info.filename):
+                    continue
+                yield BundleMember(
+                    info.filename, info.file_size, lambda info=info: zp.open(info), bundle, "zip", info.CRC
+                )
+        return
+    if lower.endswith(TAR_SUFFIXES):
+        with tarfile.open(bundle, "r:*") as tp:
+            for m in tp.getmembers():
+                if not m.isfile() or not wanted(m.name):
+                    continue
+                yield BundleMember(m.name, m.size, lambda m=m: tp.extractfile(m), bundle, "tar")
+        return
+    if bundle.is_file() and wanted(bundle.name):
+        yield BundleMember(bundle.name, bundle.stat().st_size, lambda: bundle.open("rb"), bundle, "file")
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def bundle_fingerprint(bundle: Path) -> str:
+    """Content identity of a whole bundle.
+
+    Zip bundles hash their central directory (member names, CRCs, sizes)
+    without decompressing anything; folders hash every file; tar and single
+    files hash the raw bytes.
+    """
+    bundle = Path(bundle)
+    digest = hashlib.sha256()
+    if bundle.is_dir():
+        for fp in sorted(p for p in bundle.rglob("*") if p.is_file()):
+            digest.update(f"{fp.relative_to(bundle).as_posix()}\0{_file_sha256(fp)}\n".encode("utf-8"))
+        return f"dir:{digest.hexdigest()}"
+    if bundle.name.lower().endswith(".zip"):
+        with zipfile.ZipFile(bundle, "r") as zp:
+            for info in sorted(zp.infolist(), key=lambda i: i.filename):
+                digest.update(f"{info.filename}\0{info.CRC:08x}\0{info.file_size}\n".encode("utf-8"))
+        return f"zip:{digest.hexdigest()}"
+    return f"sha256:{_file_sha256(bundle)}"
@@ -1,14 +1,25 @@
 from __future__ import annotations
-import argparse, json
+import argparse, json, sys
+from typing import List, Optional
 from oht_analyzer.pipeline import analyze_in_order
 
 
-def main():
-    ap = argparse.ArgumentParser(description="Run standard OHT log analysis in the required order")
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["batch"]:
+        from oht_analyzer.cli.batch import main as batch_main
+        return batch_main(argv[1:])
+    if argv[:1] == ["watch"]:
+        from oht_analyzer.cli.watch import main as watch_main
+        return watch_main(argv[1:])
+    ap = argparse.ArgumentParser(
+        description="Run standard OHT log analysis in the required order",
+        epilog="Many bundles at once: 'batch <dir-or-glob> --jobs N'; drop-folder service: 'watch <dir>'.",
+    )
     ap.add_argument("--bundle", required=True, help="Path to folder/zip/tar or single file")
     ap.add_argument("--out", default="artifacts/analysis", help="Output directory for summaries/plots")
-    ap.add_argument("--axis", type=int, default=3, help="Axis focus (default 3=SLIDE)")
-    args = ap.parse_args()
+    ap.add_argument("--axis", type=int, default=3, help="Axis for axis_focus_errors (default 3=SLIDE); all axes are bucketed in axis_errors")
+    args = ap.parse_args(argv)
     res = analyze_in_order(args.bundle, args.out, axis_focus=args.axis)
     print(json.dumps({"artifacts_dir": res.artifacts_dir, "steps": res.plan}, ensure_ascii=False, indent=2))
 
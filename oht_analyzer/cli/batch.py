@@ -0,0 +1,22 @@
+from __future__ import annotations
+import argparse, json
+from typing import List, Optional
+from oht_analyzer.pipeline.batch import analyze_batch
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="oht_analyzer batch", description="Analyze many bundles and write a fleet summary")
+    ap.add_argument("bundles", help="Directory of bundles (zip/tar/folders) or a glob, e.g. 'nightly/*.zip'")
+    ap.add_argument("--out", default="artifacts/batch", help="Output root; one artifacts dir per bundle + fleet_summary.json/csv")
+    ap.add_argument("--axis", type=int, default=3, help="Axis for axis_focus_errors (default 3=SLIDE); all axes are bucketed in axis_errors")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (bundles analyzed in parallel)")
+    ap.add_argument("--force", action="store_true", help="Re-analyze bundles even if their artifacts are up to date")
+    args = ap.parse_args(argv)
+    res = analyze_batch(args.bundles, args.out, axis_focus=args.axis, jobs=args.jobs, force=args.force)
+    counts = {s: sum(1 for b in res.bundles if b.status == s) for s in ("analyzed", "skipped", "error")}
+    print(json.dumps({"summary_json": res.summary_json, "summary_csv": res.summary_csv, "bundles": counts,
+                      "vehicles": res.vehicles}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
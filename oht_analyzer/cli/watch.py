@@ -0,0 +1,32 @@
+from __future__ import annotations
+import argparse, json
+from typing import List, Optional
+from core.config import load_config
+from oht_analyzer.pipeline.watcher import HAS_INOTIFY, BundleWatcher
+
+
+def main(argv: Optional[List[str]] = None):
+    cfg = load_config().get("watch") or {}
+    ap = argparse.ArgumentParser(prog="oht_analyzer watch", description="Analyze bundles as soon as they land in a drop directory")
+    ap.add_argument("drop", nargs="?", default=cfg.get("drop_dir") or None, help="Directory to watch (config watch.drop_dir)")
+    ap.add_argument("--out", default=cfg.get("out_dir", "artifacts/watch"), help="Artifacts root + index.json for the UI")
+    ap.add_argument("--axis", type=int, default=3, help="Axis for axis_focus_errors (default 3=SLIDE); all axes are bucketed in axis_errors")
+    ap.add_argument("--jobs", type=int, default=int(cfg.get("jobs", 1)), help="Bundles analyzed in parallel")
+    ap.add_argument("--settle", type=float, default=float(cfg.get("settle_s", 2.0)), help="Seconds a bundle must stay unchanged before analysis")
+    ap.add_argument("--poll", type=float, default=float(cfg.get("poll_s", 1.0)), help="Polling interval when inotify is unavailable")
+    args = ap.parse_args(argv)
+    if not args.drop:
+        ap.error("drop directory required (argument or config watch.drop_dir)")
+    print(f"watching {args.drop} -> {args.out} ({'inotify' if HAS_INOTIFY else 'polling'}, jobs={args.jobs})", flush=True)
+    watcher = BundleWatcher(args.drop, args.out, axis_focus=args.axis, jobs=args.jobs, settle_s=args.settle,
+                            poll_s=args.poll, on_result=lambda r: print(json.dumps(
+                                {k: r[k] for k in ("bundle", "status", "latency_s", "artifacts_dir", "error")},
+                                ensure_ascii=False), flush=True))
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
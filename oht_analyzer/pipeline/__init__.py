@@ -1,3 +1,4 @@
 from .analysis_order import analyze_in_order, AnalysisResult
+from .scheduler import Stage, StageScheduler
 
-__all__ = ["analyze_in_order", "AnalysisResult"]
+__all__ = ["analyze_in_order", "AnalysisResult", "Stage", "StageScheduler"]
@@ -3,11 +3,19 @@ from __future__ import annotations
 import json
 import os
 import re
-import tarfile
-import zipfile
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Iterable, List, Tuple
+from queue import Queue
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from analyzer.templates import TemplateMiner
+from core.config import load_config
+from oht_analyzer.bundle import iter_bundle_members
+
+from .crosslog import LogEvent, correlate, event_recorder
+from .errscan import ErrorScan, scan_errors
+from .scheduler import Stage, StageScheduler
 
 # ---------- File discovery ----------
 MASTER_PATTERNS = (r"(?i)master\.log", r"(?i)ecmaster", r"(?i)\bmaster\b")
@@ -15,8 +23,6 @@ AMC_RECV_PATTERNS = (r"(?i)amc.*recv", r"(?i)recv.*amc", r"(?i)amc[_-]?recv")
 TRACE_PATTERNS = (r"(?i)M[-_]?TRACE", r"(?i)C[-_]?TRACE", r"(?i)\bTRACE\b")
 USER_PATTERNS = (r"(?i)user.*\.log", r"(?i)\buser\b", r"(?i)\bui.*\.log")
 
-STRICT_ERR_PAT = re.compile(r"(\bERROR\b|\bFAULT\b|\bALARM\b|ALM\b|0x[0-9A-Fa-f]{2,8})")
-
 
 def _is_texty(name: str) -> bool:
     bad_ext = (
@@ -43,32 +49,6 @@ def _match_any(name: str, pats: Iterable[str]) -> bool:
     return any(re.search(p, low) for p in pats)
 
 
-def _iter_bundle(bundle: Path) -> Iterable[Tuple[str, bytes]]:
-    """Yield (virtual_path, bytes) for each file within folder/zip/tar/single."""
-    if bundle.is_dir():
-        for fp in bundle.rglob("*"):
-            if fp.is_file():
-                yield (str(fp), fp.read_bytes())
-        return
-    lower = bundle.name.lower()
-    if lower.endswith(".zip"):
-        with zipfile.ZipFile(bundle, "r") as zp:
-            for n in zp.namelist():
-                if _is_texty(n):
-                    yield (n, zp.read(n))
-        return
-    if lower.endswith((".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")):
-        with tarfile.open(bundle, "r:*") as tp:
-            for m in tp.getmembers():
-                if m.isfile():
-                    f = tp.extractfile(m)
-                    if f:
-                        yield (m.name, f.read())
-        return
-    if bundle.is_file():
-        yield (bundle.name, bundle.read_bytes())
-
-
 # ---------- Small utilities ----------
 def _read_text_guess(b: bytes) -> str:
     for enc in ("utf-8-sig", "utf-8", "cp949", "euc-kr", "latin-1"):
@@ -79,69 +59,179 @@ def _read_text_guess(b: bytes) -> str:
     return b.decode("latin-1", errors="ignore")
 
 
-def _grep_errors(text: str, max_hits: int = 500) -> List[Dict]:
-    out: List[Dict] = []
-    for i, ln in enumerate(text.splitlines(), start=1):
-        if STRICT_ERR_PAT.search(ln):
-            out.append({"line": i, "text": ln.strip()})
-            if len(out) >= max_hits:
-                break
-    return out
-
+# 0=Driving-Rear, 1=Driving-Front, 2=Hoist, 3=Slide
+AXIS_KEYWORDS: Dict[int, Tuple[str, ...]] = {
+    0: ("driving-rear", "driving rear"),
+    1: ("driving-front", "driving front"),
+    2: ("hoist", "호이스트"),
+    3: ("slide", "슬라이드"),
+}
 
-def _filter_axis(
-    lines: List[Dict], axis: int = 3, keywords: Tuple[str, ...] = ("slide", "슬라이드")
-) -> List[Dict]:
-    pats = [rf"axis\s*{axis}", rf"axis\[{axis}\]"] + list(keywords)
-    sel = []
-    for row in lines:
-        t = row["text"]
-        if any(re.search(p, t, re.IGNORECASE) for p in pats):
-            sel.append(row)
-    return sel
 
+class AxisRouter:
+    """Classify error lines to every axis they mention with one combined pattern.
 
-# ---------- Trace invocation (optional) ----------
-def _try_plot_traces(bundle: Path, out_dir: Path) -> List[Dict]:
+    ``axis 3`` / ``axis[3]`` name an axis by number; the keywords of
+    ``AXIS_KEYWORDS`` name it by role. The pattern is compiled once, and each
+    line is scanned a single time regardless of the number of axes.
     """
-    If mtrace_visualizer is installed in the repo, call it.
-    Otherwise, just list found TRACE files in order.
+
+    def __init__(self, keywords: Dict[int, Tuple[str, ...]] = AXIS_KEYWORDS):
+        self.axes = sorted(keywords)
+        parts = [r"axis\s*(?P<num>\d)", r"axis\[(?P<idx>\d)\]"]
+        parts += [
+            f"(?P<k{axis}>" + "|".join(re.escape(k) for k in words) + ")"
+            for axis, words in keywords.items()
+            if words
+        ]
+        self._rx = re.compile("|".join(parts), re.IGNORECASE)
+
+    def classify(self, text: str) -> List[int]:
+        hit = set()
+        for m in self._rx.finditer(text):
+            group = m.lastgroup
+            if group in ("num", "idx"):
+                hit.add(int(m.group(group)))
+            else:
+                hit.add(int(group[1:]))
+        return sorted(hit)
+
+    def route(self, rows: List[Dict]) -> Dict[int, List[Dict]]:
+        """Per-axis buckets (every known axis present, possibly empty) in input order."""
+        buckets: Dict[int, List[Dict]] = {axis: [] for axis in self.axes}
+        for row in rows:
+            for axis in self.classify(row["text"]):
+                buckets.setdefault(axis, []).append(row)
+        return buckets
+
+
+AXIS_ROUTER = AxisRouter()
+
+
+# ---------- Stage routing ----------
+STAGE_QUEUE_SIZE = 4  # members buffered per text stage while the bundle is scanned
+_DONE = object()
+
+
+@dataclass
+class _TextStage:
+    """A text stage claims members by name and scans them on its own thread.
+
+    The bundle scan feeds claimed members through a small bounded queue, so
+    at most ``STAGE_QUEUE_SIZE`` members per stage are held in memory. Each
+    member is reduced to a bounded :class:`ErrorScan` (see :mod:`.errscan`)
+    for the report, while every timestamped error line goes to ``events``.
     """
-    results: List[Dict] = []
+
+    source: str
+    patterns: Tuple[str, ...]
+    summarize: Callable[[str, ErrorScan], Dict]
+    scan_options: Dict = field(default_factory=dict)
+    tagger: Optional[Callable[[str], Iterable]] = None
+    template_options: Dict = field(default_factory=dict)
+    items: List[Dict] = field(default_factory=list)
+    events: List[LogEvent] = field(default_factory=list)  # every timestamped error line, for step 5
+    queue: "Queue" = field(default_factory=lambda: Queue(maxsize=STAGE_QUEUE_SIZE))
+    busy_s: float = 0.0  # time spent scanning, excluding waits on the bundle scan
+
+    def claims(self, name: str) -> bool:
+        return _match_any(name, self.patterns)
+
+    def consume(self, _deps: Dict) -> List[Dict]:
+        while True:
+            got = self.queue.get()
+            if got is _DONE:
+                self.events.sort(key=lambda e: e.ts)
+                return self.items
+            vp, data = got
+            started = time.perf_counter()
+            try:
+                text = _read_text_guess(data)
+                events: List[LogEvent] = []
+                scan = scan_errors(text, self.scan_options, self.tagger, event_recorder(self.source, vp, events))
+                item = self.summarize(vp, scan)
+                item.update(_template_fields(text, self.source, self.template_options))
+                self.items.append(item)
+                self.events.extend(events)
+            except Exception as e:  # keep draining: the scan blocks on a full queue
+                self.items.append({"file": vp, "error": repr(e)})
+            self.busy_s += time.perf_counter() - started
+
+
+ERRORS_REPORTED = 200  # error rows listed per file (and per axis)
+SIGNATURES_REPORTED = 20  # most frequent message signatures listed per file
+TEMPLATES_REPORTED = 10  # most frequent / rarest message templates listed per file
+
+
+def _thin(rows: List[Dict], n: int = ERRORS_REPORTED) -> List[Dict]:
+    """``n`` rows evenly spread over ``rows``; a thinned uniform sample stays uniform."""
+    if len(rows) <= n:
+        return rows
+    step = len(rows) / n
+    return [rows[int(i * step)] for i in range(n)]
+
+
+def _template_fields(text: str, source: str, options: Dict) -> Dict:
+    # every line, not only error lines: rare messages are often the precursors
+    miner = TemplateMiner(options)
+    miner.add_text(text, source)
+    return {
+        "templates_total": len(miner.templates),
+        "top_templates": miner.summary(miner.top(TEMPLATES_REPORTED)),
+        "rare_templates": miner.summary(miner.rare(n=TEMPLATES_REPORTED)),
+    }
+
+
+def _text_item(vp: str, scan: ErrorScan) -> Dict:
+    return {
+        "file": vp,
+        "lines": scan.lines,
+        "errors_total": scan.total,
+        "errors": _thin(scan.sample),
+        "signatures_tracked": len(scan.signatures),
+        "top_signatures": scan.signatures[:SIGNATURES_REPORTED],
+    }
+
+
+def _master_item(vp: str, scan: ErrorScan, axis_focus: int) -> Dict:
+    axes = [str(axis) for axis in AXIS_ROUTER.axes]
+    axes += sorted(set(scan.tag_counts) - set(axes), key=int)
+    return {
+        "file": vp,
+        "lines": scan.lines,
+        "errors_total": scan.total,
+        "axis_focus_errors": _thin(scan.tag_samples.get(str(axis_focus), [])),
+        "axis_counts": {axis: scan.tag_counts.get(axis, 0) for axis in axes},
+        "axis_errors": {axis: _thin(scan.tag_samples.get(axis, [])) for axis in axes},
+        "signatures_tracked": len(scan.signatures),
+        "top_signatures": scan.signatures[:SIGNATURES_REPORTED],
+    }
+
+
+def _trace_renderer(out_dir: Path, workers: Optional[int] = None):
+    """RenderQueue of the M-Trace visualizer, or None if it is unavailable."""
     try:
         # Lazy import (may not exist yet in some deployments)
-        from oht_analyzer.vis.mtrace_visualizer import visualize_from_bundle
-
-        vis = visualize_from_bundle(
-            str(bundle), str(out_dir), smooth_window=5, max_points=120_000
-        )
-        for v in vis:
-            results.append(
-                {
-                    "source": v.source,
-                    "speed_png": str(v.speed_png)
-                    if getattr(v, "speed_png", None)
-                    else None,
-                    "pos_png": str(v.pos_png) if getattr(v, "pos_png", None) else None,
-                    "notes": v.notes,
-                }
-            )
-        return results
+        from oht_analyzer.vis.mtrace_visualizer import RenderQueue
+
+        return RenderQueue(out_dir, max_points=120_000, workers=workers)
     except Exception:
-        pass
-
-    # fallback: just enumerate TRACE files so UI can link them
-    for vp, _ in _iter_bundle(bundle):
-        if _match_any(vp, TRACE_PATTERNS):
-            results.append(
-                {
-                    "source": vp,
-                    "speed_png": None,
-                    "pos_png": None,
-                    "notes": "visualizer not available",
-                }
-            )
-    return results
+        return None
+
+
+def _trace_listing(vp: str, notes: str) -> Dict:
+    # fallback when a member cannot be rendered: just enumerate it so the UI can link it
+    return {"source": vp, "speed_png": None, "pos_png": None, "analysis_csv": None, "notes": notes}
+
+
+def _trace_item(v) -> Dict:
+    return {
+        "source": v.source,
+        "speed_png": str(v.speed_png) if getattr(v, "speed_png", None) else None,
+        "pos_png": str(v.pos_png) if getattr(v, "pos_png", None) else None,
+        "analysis_csv": str(v.analysis_csv) if getattr(v, "analysis_csv", None) else None,
+        "notes": v.notes,
+    }
 
 
 # ---------- Main API ----------
@@ -149,10 +239,14 @@ def _try_plot_traces(bundle: Path, out_dir: Path) -> List[Dict]:
 class AnalysisResult:
     plan: List[Dict]
     artifacts_dir: str
+    stage_timings: Dict[str, Dict[str, float]] = field(default_factory=dict)  # start/duration (s) per stage
 
 
 def analyze_in_order(
-    bundle_path: str | os.PathLike, out_dir: str | os.PathLike, axis_focus: int = 3
+    bundle_path: str | os.PathLike,
+    out_dir: str | os.PathLike,
+    axis_focus: int = 3,
+    render_workers: Optional[int] = None,
 ) -> AnalysisResult:
     """
     Execute the **standard analysis order**:
@@ -161,63 +255,118 @@ def analyze_in_order(
       3) Summarize AMC Recv logs
       4) Plot/collect TRACE logs (M-TRACE/C-TRACE)
       5) Summarize USER logs
-      6) (Reserved) later: cross-log reasoning (not included here)
+      6) Cross-log reasoning: error lines of all text logs joined on one ms
+         timeline into ranked incident chains (see :mod:`.crosslog`)
+    Stages run concurrently where they do not depend on each other; the plan
+    keeps this order and ``stage_timings`` records when each stage started and
+    how long it ran.
+    ``render_workers`` caps the trace plot process pool (None = cpu count).
     Returns a plan + artifact pointers for UI rendering.
     """
     bundle = Path(bundle_path)
     outroot = Path(out_dir)
     outroot.mkdir(parents=True, exist_ok=True)
 
-    master_items: List[Dict] = []
-    amc_items: List[Dict] = []
-    trace_items: List[Dict] = []
-    user_items: List[Dict] = []
-
-    # Discover all
-    files: List[Tuple[str, bytes]] = list(_iter_bundle(bundle))
-    # 1,2) Master first
-    for vp, data in files:
-        if _match_any(vp, MASTER_PATTERNS) and _is_texty(vp):
-            txt = _read_text_guess(data)
-            errs = _grep_errors(txt)
-            axis_errs = _filter_axis(errs, axis=axis_focus)
-            master_items.append(
-                {
-                    "file": vp,
-                    "errors_total": len(errs),
-                    "axis_focus_errors": axis_errs[:200],
-                }
-            )
-    # 3) AMC Recv
-    for vp, data in files:
-        if _match_any(vp, AMC_RECV_PATTERNS) and _is_texty(vp):
-            txt = _read_text_guess(data)
-            hits = _grep_errors(txt)
-            amc_items.append({"file": vp, "errors": hits[:200]})
-    # 4) TRACE
+    cfg = load_config()
+    scan_opts = cfg.get("errscan") or {}
+    tmpl_opts = cfg.get("templates") or {}
+    master = _TextStage(
+        "master",
+        MASTER_PATTERNS,
+        lambda vp, scan: _master_item(vp, scan, axis_focus),
+        scan_opts,
+        tagger=AXIS_ROUTER.classify,
+        template_options=tmpl_opts,
+    )
+    amc = _TextStage("amc_recv", AMC_RECV_PATTERNS, _text_item, scan_opts, template_options=tmpl_opts)
+    user = _TextStage("user", USER_PATTERNS, _text_item, scan_opts, template_options=tmpl_opts)
+    text_stages = (master, amc, user)
+
     trace_dir = outroot / "trace_plots"
     trace_dir.mkdir(parents=True, exist_ok=True)
-    trace_items = _try_plot_traces(bundle, trace_dir)
-    # 5) USER
-    for vp, data in files:
-        if _match_any(vp, USER_PATTERNS) and _is_texty(vp):
-            txt = _read_text_guess(data)
-            hits = _grep_errors(txt)
-            user_items.append({"file": vp, "errors": hits[:200]})
+    renderer = _trace_renderer(trace_dir, render_workers)
+    trace_listing: List[Dict] = []
+    trace_members: List[str] = []  # members handed to the renderer
+    trace_errors: List[Dict] = []
+
+    def scan(_deps: Dict) -> int:
+        # Single pass: each member is routed to the stages that claim it and is
+        # read at most once; unclaimed members are never read.
+        seen = 0
+        try:
+            for member in iter_bundle_members(bundle):
+                seen += 1
+                vp = member.name
+                claimed = [stage for stage in text_stages if stage.claims(vp)] if _is_texty(vp) else []
+                if claimed:
+                    data = member.read_bytes()
+                    for stage in claimed:
+                        stage.queue.put((vp, data))
+                if renderer is not None:
+                    if renderer.accepts(vp):
+                        trace_members.append(vp)
+                        try:
+                            renderer.add(member)  # renders in the visualizer's process pool
+                        except Exception as e:  # one bad member must not abort the text stages
+                            trace_errors.append({"file": vp, "error": repr(e)})
+                elif _match_any(vp, TRACE_PATTERNS):
+                    trace_listing.append(_trace_listing(vp, "visualizer not available"))
+        finally:
+            for stage in text_stages:
+                stage.queue.put(_DONE)
+        return seen
+
+    def trace(_deps: Dict) -> List[Dict]:
+        if renderer is None:
+            return trace_listing
+        try:
+            results = renderer.finish()
+        except Exception as e:  # e.g. BrokenProcessPool: keep what was rendered, list the rest
+            trace_errors.append({"file": str(bundle), "error": repr(e)})
+            results = renderer.results
+        items = [_trace_item(v) for v in results if v is not None]
+        rendered = {item["source"] for item in items}
+        items += [_trace_listing(vp, "render failed") for vp in trace_members if vp not in rendered]
+        return trace_errors + items or [_trace_listing(str(bundle), "No M-Trace files found")]
+
+    def cross(_deps: Dict) -> List[Dict]:
+        return correlate([master.events, amc.events, user.events], cfg.get("crosslog") or {})
+
+    # Only the presentation order is prescribed: text stages grep while the
+    # scan is still walking the bundle and trace plots render in parallel.
+    started = time.perf_counter()
+    runs = StageScheduler(
+        [
+            Stage("scan", scan),
+            Stage("master", master.consume),
+            Stage("amc_recv", amc.consume),
+            Stage("user", user.consume),
+            Stage("trace", trace, deps=("scan",)),
+            Stage("cross", cross, deps=("master", "amc_recv", "user")),
+        ]
+    ).run()
+    stage_timings: Dict[str, Dict[str, float]] = {
+        name: {"start_s": round(run.started - started, 3), "duration_s": round(run.duration_s, 3)}
+        for name, run in runs.items()
+    }
+    for name, stage in (("master", master), ("amc_recv", amc), ("user", user)):
+        stage_timings[name]["busy_s"] = round(stage.busy_s, 3)
+    stage_timings["total"] = {"start_s": 0.0, "duration_s": round(time.perf_counter() - started, 3)}
 
     # Assemble plan in the prescribed order
     plan: List[Dict] = []
-    if master_items:
-        plan.append({"step": 1, "title": "Master logs (first)", "items": master_items})
-    plan.append({"step": 2, "title": "AMC Recv logs", "items": amc_items})
-    plan.append({"step": 3, "title": "Trace logs (M-TRACE/C-TRACE)", "items": trace_items})
-    plan.append({"step": 4, "title": "User logs", "items": user_items})
-    plan.append({"step": 5, "title": "Cross-log reasoning (reserved)", "items": []})
+    if runs["master"].result:
+        plan.append({"step": 1, "title": "Master logs (first)", "items": runs["master"].result})
+    plan.append({"step": 2, "title": "AMC Recv logs", "items": runs["amc_recv"].result})
+    plan.append({"step": 3, "title": "Trace logs (M-TRACE/C-TRACE)", "items": runs["trace"].result})
+    plan.append({"step": 4, "title": "User logs", "items": runs["user"].result})
+    plan.append({"step": 5, "title": "Cross-log reasoning", "items": runs["cross"].result})
 
     # Save a machine-readable summary for UI
     summary_path = outroot / "analysis_plan.json"
     summary_path.write_text(
-        json.dumps({"plan": plan}, ensure_ascii=False, indent=2), encoding="utf-8"
+        json.dumps({"plan": plan, "stage_timings": stage_timings}, ensure_ascii=False, indent=2),
+        encoding="utf-8",
     )
 
-    return AnalysisResult(plan=plan, artifacts_dir=str(outroot))
+    return AnalysisResult(plan=plan, artifacts_dir=str(outroot), stage_timings=stage_timings)
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import csv
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from oht_analyzer.bundle import TAR_SUFFIXES, bundle_fingerprint
+
+from .analysis_order import analyze_in_order
+
+BATCH_MANIFEST = "batch_manifest.json"
+BATCH_VERSION = "3"  # bump when analyze_in_order output changes for identical input
+FLEET_SUMMARY = "fleet_summary"
+BUNDLE_SUFFIXES = (".zip",) + TAR_SUFFIXES
+# OHT-123 / VHL_0042 / V123 in a bundle name; otherwise the bundle name is the vehicle
+VEHICLE_RX = re.compile(r"(?i)(?<![A-Z0-9])(OHT|VHL|V)[-_]?(\d{2,})")
+
+
+@dataclass
+class BundleSummary:
+    bundle: str
+    vehicle: str
+    status: str  # analyzed | skipped | error
+    artifacts_dir: str
+    fingerprint: str = ""
+    duration_s: float = 0.0
+    master_errors: int = 0
+    amc_recv_errors: int = 0
+    user_errors: int = 0
+    incidents: int = 0
+    axis_errors: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+def discover_bundles(spec: str) -> List[Path]:
+    """Bundles named by ``spec``: a directory of bundles (zip/tar files or sub-folders) or a glob."""
+    root = Path(spec)
+    if root.is_dir():
+        found = [
+            p for p in root.iterdir()
+            if p.is_dir() or p.name.lower().endswith(BUNDLE_SUFFIXES)
+        ]
+    else:
+        found = [Path(p) for p in glob.glob(spec)]
+    return sorted(found)
+
+
+def _stem(bundle: Path) -> str:
+    name = bundle.name
+    for suffix in BUNDLE_SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def vehicle_id(bundle: Path) -> str:
+    m = VEHICLE_RX.search(bundle.name)
+    if m:
+        return f"{m.group(1).upper()}{m.group(2)}"
+    return _stem(bundle)
+
+
+def artifact_dirs(bundles: List[Path], out: Path, taken: Iterable[Path] = ()) -> List[Path]:
+    """One artifacts dir per bundle, named after it.
+
+    Names clashing with an earlier bundle or with a dir in ``taken`` get a
+    numeric suffix.
+    """
+    dirs: List[Path] = []
+    used = set(taken)
+    for bundle in bundles:
+        name = re.sub(r"[^A-Za-z0-9._-]+", "_", _stem(bundle))
+        art_dir, n = out / name, 1
+        while art_dir in used:
+            n += 1
+            art_dir = out / f"{name}-{n}"
+        used.add(art_dir)
+        dirs.append(art_dir)
+    return dirs
+
+
+def _errors_total(item: Dict) -> int:
+    # "errors" is a bounded sample; "errors_total" counts every error line.
+    # Plans written before the streaming scanner only carry the (capped) hit list.
+    return item.get("errors_total", len(item.get("errors", [])))
+
+
+def _summarize_plan(plan: List[Dict], axis_focus: int) -> Dict:
+    by_step = {step["step"]: step.get("items", []) for step in plan}
+    master = by_step.get(1, [])
+    counts = {
+        "master_errors": sum(_errors_total(item) for item in master),
+        "amc_recv_errors": sum(_errors_total(item) for item in by_step.get(2, [])),
+        "user_errors": sum(_errors_total(item) for item in by_step.get(4, [])),
+        "incidents": len(by_step.get(5, [])),
+    }
+    axis_errors: Dict[str, int] = {}
+    for item in master:
+        # plans written before per-axis buckets only carry the focus axis
+        per_axis = item.get("axis_counts") or {str(axis_focus): len(item.get("axis_focus_errors", []))}
+        for axis, n in per_axis.items():
+            axis_errors[axis] = axis_errors.get(axis, 0) + n
+    counts["axis_errors"] = axis_errors
+    return counts
+
+
+def _read_manifest(art_dir: Path) -> Dict:
+    try:
+        return json.loads((art_dir / BATCH_MANIFEST).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _load_plan(art_dir: Path) -> Optional[List[Dict]]:
+    try:
+        return json.loads((art_dir / "analysis_plan.json").read_text(encoding="utf-8"))["plan"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def run_bundle(bundle: Path, art_dir: Path, axis_focus: int, render_workers: int, force: bool) -> BundleSummary:
+    """Analyze one bundle unless its artifacts already match its content hash."""
+    summary = BundleSummary(str(bundle), vehicle_id(bundle), "analyzed", str(art_dir))
+    started = time.perf_counter()
+    try:
+        summary.fingerprint = bundle_fingerprint(bundle)
+        manifest = _read_manifest(art_dir)
+        plan = _load_plan(art_dir)
+        up_to_date = (
+            not force
+            and plan is not None
+            and manifest.get("fingerprint") == summary.fingerprint
+            and manifest.get("version") == BATCH_VERSION
+            and manifest.get("axis_focus") == axis_focus
+        )
+        if up_to_date:
+            summary.status = "skipped"
+        else:
+            plan = analyze_in_order(bundle, art_dir, axis_focus=axis_focus, render_workers=render_workers).plan
+            (art_dir / BATCH_MANIFEST).write_text(
+                json.dumps(
+                    {
+                        "bundle": str(bundle),
+                        "fingerprint": summary.fingerprint,
+                        "version": BATCH_VERSION,
+                        "axis_focus": axis_focus,
+                    },
+                    ensure_ascii=False,
+                    indent=2,
+                ),
+                encoding="utf-8",
+            )
+        for key, value in _summarize_plan(plan, axis_focus).items():
+            setattr(summary, key, value)
+    except Exception as e:
+        summary.status = "error"
+        summary.error = repr(e)
+    summary.duration_s = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def _fleet(rows: List[BundleSummary]) -> Dict[str, Dict]:
+    vehicles: Dict[str, Dict] = {}
+    for row in rows:
+        veh = vehicles.setdefault(
+            row.vehicle,
+            {"bundles": 0, "master_errors": 0, "amc_recv_errors": 0, "user_errors": 0, "incidents": 0, "axis_errors": {}},
+        )
+        veh["bundles"] += 1
+        for key in ("master_errors", "amc_recv_errors", "user_errors", "incidents"):
+            veh[key] += getattr(row, key)
+        for axis, n in row.axis_errors.items():
+            veh["axis_errors"][axis] = veh["axis_errors"].get(axis, 0) + n
+    return dict(sorted(vehicles.items()))
+
+
+def _write_summary(out: Path, rows: List[BundleSummary], vehicles: Dict[str, Dict]) -> Tuple[Path, Path]:
+    json_path = out / f"{FLEET_SUMMARY}.json"
+    json_path.write_text(
+        json.dumps({"bundles": [asdict(r) for r in rows], "vehicles": vehicles}, ensure_ascii=False, indent=2),
+        encoding="utf-8",
+    )
+    axes = sorted({axis for row in rows for axis in row.axis_errors}, key=int)
+    csv_path = out / f"{FLEET_SUMMARY}.csv"
+    with csv_path.open("w", encoding="utf-8-sig", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(
+            ["vehicle", "bundle", "status", "master_errors", "amc_recv_errors", "user_errors", "incidents"]
+            + [f"axis{axis}_errors" for axis in axes]
+            + ["duration_s", "artifacts_dir", "error"]
+        )
+        for r in rows:
+            writer.writerow(
+                [r.vehicle, r.bundle, r.status, r.master_errors, r.amc_recv_errors, r.user_errors, r.incidents]
+                + [r.axis_errors.get(axis, 0) for axis in axes]
+                + [r.duration_s, r.artifacts_dir, r.error or ""]
+            )
+    return json_path, csv_path
+
+
+@dataclass
+class BatchResult:
+    bundles: List[BundleSummary]
+    vehicles: Dict[str, Dict]
+    summary_json: str
+    summary_csv: str
+
+
+def analyze_batch(
+    spec: str, out_dir: str | os.PathLike, axis_focus: int = 3, jobs: int = 1, force: bool = False
+) -> BatchResult:
+    """Run :func:`analyze_in_order` over every bundle matched by ``spec``.
+
+    Bundles are analyzed across ``jobs`` worker processes (each renders its
+    trace plots in-process to avoid oversubscription). A bundle whose content
+    fingerprint matches the manifest in its artifacts dir is skipped and
+    summarized from the existing ``analysis_plan.json``.
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    bundles = discover_bundles(spec)
+    art_dirs = artifact_dirs(bundles, out)
+    render_workers = 1 if jobs > 1 else None
+    args = [(b, d, axis_focus, render_workers, force) for b, d in zip(bundles, art_dirs)]
+    if jobs <= 1 or len(args) <= 1:
+        rows = [run_bundle(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            rows = list(pool.map(run_bundle, *zip(*args)))
+    vehicles = _fleet(rows)
+    json_path, csv_path = _write_summary(out, rows, vehicles)
+    return BatchResult(rows, vehicles, str(json_path), str(csv_path))
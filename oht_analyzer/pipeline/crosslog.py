@@ -0,0 +1,128 @@
+"""Cross-log reasoning: join error events of several logs on one ms timeline.
+
+Every source (master, AMC Recv, user) yields its error lines sorted by
+time-of-day in ms. The sources are combined with a k-way ``heapq.merge`` and
+swept once, so the cost is linear in the number of events:
+
+* consecutive events closer than ``incident_gap_cycles`` belong to the same
+  incident;
+* an event that follows an event of *another* source within
+  ``link_cycles`` counts as a cross-log link (the vehicle and motion programs
+  exchange data every ``CYCLE_MS``, so a reaction shows up a few cycles later).
+
+Each incident becomes a chain ordered by the first appearance of each source;
+the first source is the presumed cause. Incidents are ranked by the number of
+sources involved, then by links, then by how tight they are.
+"""
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+from analyzer.parser import find_time_ms
+
+CYCLE_MS = 1  # vehicle <-> motion exchange period (analyzer.engine.CYCLE_MS)
+
+DEFAULTS = {
+    "link_cycles": 5,
+    "incident_gap_cycles": 1000,
+    "min_sources": 2,
+    "max_incidents": 100,
+}
+
+
+@dataclass(frozen=True)
+class LogEvent:
+    ts: int  # ms of day
+    source: str
+    file: str
+    line: int
+    text: str
+
+
+def event_recorder(source: str, file: str, events: List[LogEvent]) -> Callable[[int, str], None]:
+    """``on_hit`` callback for ``ErrorScanner`` appending a :class:`LogEvent` per timestamped error line.
+
+    It sees every error line, not the report sample, so each incident is found;
+    sort ``events`` by ``ts`` once the scan is done.
+    """
+
+    def record(line_no: int, text: str) -> None:
+        ts = find_time_ms(text)
+        if ts is not None:
+            events.append(LogEvent(ts, source, file, line_no, text))
+
+    return record
+
+
+class _Incident:
+    __slots__ = ("start", "end", "events", "links", "first")
+
+    def __init__(self, event: LogEvent):
+        self.start = self.end = event.ts
+        self.events = 0
+        self.links = 0
+        self.first: Dict[str, LogEvent] = {}
+
+    def add(self, event: LogEvent, linked: bool) -> None:
+        self.end = event.ts
+        self.events += 1
+        self.links += linked
+        self.first.setdefault(event.source, event)
+
+    def to_dict(self) -> Dict:
+        chain = [
+            {
+                "source": e.source,
+                "file": e.file,
+                "line": e.line,
+                "ts": e.ts,
+                "dt_ms": e.ts - self.start,
+                "text": e.text.strip(),
+            }
+            for e in self.first.values()  # insertion order = first appearance
+        ]
+        return {
+            "start_ts": self.start,
+            "end_ts": self.end,
+            "span_ms": self.end - self.start,
+            "events": self.events,
+            "links": self.links,
+            "sources": [link["source"] for link in chain],
+            "cause": chain[0]["source"],
+            "chain": chain,
+        }
+
+
+def correlate(streams: Iterable[Iterable[LogEvent]], options: Optional[Dict] = None) -> List[Dict]:
+    """Ranked causal chains per incident; each stream must already be sorted by ``ts``."""
+    opts = {**DEFAULTS, **(options or {})}
+    link_ms = int(opts["link_cycles"]) * CYCLE_MS
+    gap_ms = int(opts["incident_gap_cycles"]) * CYCLE_MS
+    min_sources = int(opts["min_sources"])
+
+    incidents: List[_Incident] = []
+    current: Optional[_Incident] = None
+    last_ts: Dict[str, int] = {}  # latest event time per source within the incident
+    for event in heapq.merge(*streams, key=lambda e: e.ts):
+        if current is None or event.ts - current.end > gap_ms:
+            if current is not None and len(current.first) >= min_sources:
+                incidents.append(current)
+            current = _Incident(event)
+            last_ts.clear()
+        linked = any(
+            event.ts - ts <= link_ms for source, ts in last_ts.items() if source != event.source
+        )
+        current.add(event, linked)
+        last_ts[event.source] = event.ts
+    if current is not None and len(current.first) >= min_sources:
+        incidents.append(current)
+
+    incidents.sort(key=lambda inc: (-len(inc.first), -inc.links, inc.end - inc.start, inc.start))
+    ranked = []
+    for rank, incident in enumerate(incidents[: int(opts["max_incidents"])], start=1):
+        item = incident.to_dict()
+        item["rank"] = rank
+        ranked.append(item)
+    return ranked
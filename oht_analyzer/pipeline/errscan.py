@@ -0,0 +1,231 @@
+"""Bounded-memory error scanning for text logs.
+
+``ErrorScanner`` looks at every error line of a file and keeps a fixed-size
+picture of them:
+
+* exact totals (error lines, and error lines per tag, e.g. per axis);
+* per-signature counts with Space-Saving: a signature is the message with
+  decimal numbers replaced by ``#`` (``0x`` codes are kept, they identify the
+  fault). Up to ``top_k`` signatures are tracked; counts stay exact
+  (``error == 0``) until that many distinct signatures were seen, after which
+  a new signature evicts the least frequent one and inherits its count as
+  ``error`` (an upper bound on the overestimate);
+* the first and last occurrence of every tracked signature;
+* a uniform reservoir sample of ``sample_size`` lines over the whole file,
+  plus one per tag, so late failures are represented as well as early ones.
+
+Memory is ``O(sample_size * (1 + tags) + top_k)`` whatever the file size.
+The sample is for reports only: consumers that need every error line (the
+cross-log time-join) pass an ``on_hit`` callback, which sees each line as it is
+scanned and keeps whatever it needs of it.
+"""
+from __future__ import annotations
+
+import heapq
+import random
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+STRICT_ERR_PAT = re.compile(r"(\bERROR\b|\bFAULT\b|\bALARM\b|ALM\b|0x[0-9A-Fa-f]{2,8})")
+
+DEFAULTS = {
+    "sample_size": 500,
+    "top_k": 200,
+}
+
+_HEX = re.compile(r"0x[0-9A-Fa-f]+")
+_NUM = re.compile(r"\d+")
+_SPACE = re.compile(r"\s+")
+SIGNATURE_CHARS = 160  # longer messages share a signature by their prefix
+
+
+def signature(text: str) -> str:
+    """Normalised message shape: decimal numbers become ``#``, whitespace collapses."""
+    if "0x" not in text:
+        return _SPACE.sub(" ", _NUM.sub("#", text)).strip()[:SIGNATURE_CHARS]
+    parts = []
+    pos = 0
+    for m in _HEX.finditer(text):  # keep hex codes, strip numbers around them
+        parts.append(_NUM.sub("#", text[pos : m.start()]))
+        parts.append(m.group(0))
+        pos = m.end()
+    parts.append(_NUM.sub("#", text[pos:]))
+    return _SPACE.sub(" ", "".join(parts)).strip()[:SIGNATURE_CHARS]
+
+
+def iter_error_lines(text: str, pattern: "re.Pattern" = STRICT_ERR_PAT) -> Iterator[Tuple[int, str]]:
+    """``(line_no, line)`` for each line matching ``pattern``, without splitting the text.
+
+    The pattern runs over the whole text and only matching lines are cut out,
+    so no list of all lines is built.
+    """
+    line_no = 1
+    counted_to = 0
+    search = pattern.search
+    m = search(text)
+    while m is not None:
+        start = text.rfind("\n", 0, m.start()) + 1
+        line_no += text.count("\n", counted_to, start)
+        counted_to = start
+        end = text.find("\n", m.end())
+        if end < 0:
+            end = len(text)
+        yield line_no, text[start:end]
+        m = search(text, end + 1)  # resume on the next line
+
+
+class _Reservoir:
+    """Algorithm R: a uniform sample of ``size`` items from a stream of unknown length."""
+
+    __slots__ = ("size", "seen", "items", "_rng")
+
+    def __init__(self, size: int, rng: random.Random):
+        self.size = size
+        self.seen = 0
+        self.items: List[Dict] = []
+        self._rng = rng
+
+    def offer(self, hit: Dict) -> None:
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(hit)
+        else:
+            j = self._rng.randrange(self.seen)
+            if j < self.size:
+                self.items[j] = hit
+
+    def sorted(self) -> List[Dict]:
+        return sorted(self.items, key=lambda h: h["line"])
+
+
+@dataclass
+class _Signature:
+    count: int
+    error: int
+    first: Dict
+    last: Dict
+
+
+@dataclass
+class ErrorScan:
+    """What :class:`ErrorScanner` kept of one file."""
+
+    lines: int
+    total: int
+    sample: List[Dict]  # reservoir over all error lines, in line order
+    signatures: List[Dict]  # most frequent first
+    tag_counts: Dict[str, int] = field(default_factory=dict)
+    tag_samples: Dict[str, List[Dict]] = field(default_factory=dict)
+
+    def hits(self) -> List[Dict]:
+        """Sample plus first/last occurrence of every signature, deduplicated, in line order."""
+        by_line = {h["line"]: h for h in self.sample}
+        for sig in self.signatures:
+            by_line.setdefault(sig["first"]["line"], sig["first"])
+            by_line.setdefault(sig["last"]["line"], sig["last"])
+        return [by_line[line] for line in sorted(by_line)]
+
+
+class ErrorScanner:
+    """Streaming error scanner; feed lines with :meth:`add` or whole texts with :meth:`scan`.
+
+    ``tagger`` maps an error line to tags (e.g. ``AxisRouter.classify``); each
+    tag gets an exact count and its own reservoir of ``sample_size`` lines.
+    The sample is seeded, so the same file always yields the same output.
+    ``on_hit(line_no, text)`` is called for every error line, sampled or not.
+    """
+
+    def __init__(
+        self,
+        sample_size: int = DEFAULTS["sample_size"],
+        top_k: int = DEFAULTS["top_k"],
+        tagger: Optional[Callable[[str], Iterable]] = None,
+        seed: int = 0,
+        on_hit: Optional[Callable[[int, str], None]] = None,
+    ):
+        self.sample_size = max(1, int(sample_size))
+        self.top_k = max(1, int(top_k))
+        self.tagger = tagger
+        self.on_hit = on_hit
+        self._rng = random.Random(seed)
+        self.lines = 0
+        self.total = 0
+        self._sample = _Reservoir(self.sample_size, self._rng)
+        self._sigs: Dict[str, _Signature] = {}
+        # min-heap of (count, seq, signature), one entry per tracked signature;
+        # counts in it may be stale (too low) and are refreshed when popped
+        self._heap: List[Tuple[int, int, str]] = []
+        self._seq = 0
+        self._tags: Dict[str, _Reservoir] = {}
+
+    def add(self, line_no: int, line: str) -> None:
+        """Account one error line."""
+        hit = {"line": line_no, "text": line.strip()}
+        self.total += 1
+        self.lines = max(self.lines, line_no)
+        if self.on_hit is not None:
+            self.on_hit(line_no, hit["text"])
+        self._sample.offer(hit)
+        self._count(signature(hit["text"]), hit)
+        if self.tagger is not None:
+            for tag in self.tagger(hit["text"]):
+                key = str(tag)
+                res = self._tags.get(key)
+                if res is None:
+                    res = self._tags[key] = _Reservoir(self.sample_size, self._rng)
+                res.offer(hit)
+
+    def _count(self, sig: str, hit: Dict) -> None:
+        entry = self._sigs.get(sig)
+        if entry is not None:
+            entry.count += 1
+            entry.last = hit
+            return
+        floor = 0
+        if len(self._sigs) >= self.top_k:  # Space-Saving: replace the least frequent signature
+            while True:
+                count, seq, victim = heapq.heappop(self._heap)
+                current = self._sigs[victim].count
+                if current == count:
+                    break
+                heapq.heappush(self._heap, (current, seq, victim))
+            del self._sigs[victim]
+            floor = count
+        self._sigs[sig] = _Signature(floor + 1, floor, hit, hit)
+        self._seq += 1
+        heapq.heappush(self._heap, (floor + 1, self._seq, sig))
+
+    def scan(self, text: str) -> "ErrorScanner":
+        """Feed every error line of ``text`` (line numbers continue from earlier input)."""
+        offset = self.lines
+        for line_no, line in iter_error_lines(text):
+            self.add(offset + line_no, line)
+        self.lines = offset + text.count("\n") + (0 if not text or text.endswith("\n") else 1)
+        return self
+
+    def result(self) -> ErrorScan:
+        sigs = sorted(self._sigs.items(), key=lambda kv: (-kv[1].count, kv[1].first["line"]))
+        return ErrorScan(
+            lines=self.lines,
+            total=self.total,
+            sample=self._sample.sorted(),
+            signatures=[
+                {"signature": s, "count": e.count, "error": e.error, "first": e.first, "last": e.last}
+                for s, e in sigs
+            ],
+            tag_counts={tag: res.seen for tag, res in self._tags.items()},
+            tag_samples={tag: res.sorted() for tag, res in self._tags.items()},
+        )
+
+
+def scan_errors(
+    text: str,
+    options: Optional[Dict] = None,
+    tagger: Optional[Callable[[str], Iterable]] = None,
+    on_hit: Optional[Callable[[int, str], None]] = None,
+) -> ErrorScan:
+    """One-shot :class:`ErrorScanner` over ``text`` with ``DEFAULTS`` overridden by ``options``."""
+    opts = {**DEFAULTS, **(options or {})}
+    scanner = ErrorScanner(opts["sample_size"], opts["top_k"], tagger=tagger, on_hit=on_hit)
+    return scanner.scan(text).result()
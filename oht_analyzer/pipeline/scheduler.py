@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class Stage:
+    """A named unit of work; ``run`` receives the results of its dependencies."""
+
+    name: str
+    run: Callable[[Dict[str, Any]], Any]
+    deps: Tuple[str, ...] = ()
+
+
+@dataclass
+class StageRun:
+    name: str
+    result: Any = None
+    started: float = 0.0
+    finished: float = 0.0
+    error: Optional[BaseException] = field(default=None, repr=False)
+
+    @property
+    def duration_s(self) -> float:
+        return max(0.0, self.finished - self.started)
+
+
+class StageScheduler:
+    """Run stages on a thread pool as soon as their dependencies have finished.
+
+    Stages without a path between them run concurrently; CPU-heavy stages are
+    expected to hand their work to a process pool themselves. ``max_workers``
+    defaults to the number of stages, so stages that feed each other through
+    queues can never starve one another of a thread.
+    """
+
+    def __init__(self, stages: List[Stage], max_workers: Optional[int] = None):
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError("duplicate stage names")
+        for stage in stages:
+            unknown = set(stage.deps) - set(names)
+            if unknown:
+                raise ValueError(f"stage {stage.name!r} depends on unknown {sorted(unknown)}")
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_workers = max_workers or len(stages)
+
+    def _call(self, stage: Stage, runs: Dict[str, StageRun]) -> Any:
+        run = runs[stage.name]
+        run.started = time.perf_counter()
+        try:
+            return stage.run({dep: runs[dep].result for dep in stage.deps})
+        finally:
+            run.finished = time.perf_counter()
+
+    def run(self) -> Dict[str, StageRun]:
+        """Execute every stage; re-raises the first stage error after all running stages finish."""
+        runs = {name: StageRun(name) for name in self.stages}
+        pending = dict(self.stages)
+        done: set = set()
+        futures: Dict[Future, str] = {}
+        failed: Optional[StageRun] = None
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage") as pool:
+            while pending or futures:
+                if failed is None:
+                    for name, stage in list(pending.items()):
+                        if all(dep in done for dep in stage.deps):
+                            futures[pool.submit(self._call, stage, runs)] = name
+                            del pending[name]
+                if not futures:
+                    if failed is None:
+                        raise ValueError(f"dependency cycle among {sorted(pending)}")
+                    break
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = futures.pop(future)
+                    try:
+                        runs[name].result = future.result()
+                        done.add(name)
+                    except BaseException as exc:  # noqa: BLE001 - surfaced below
+                        runs[name].error = exc
+                        failed = failed or runs[name]
+        if failed is not None:
+            raise failed.error
+        return runs
@@ -0,0 +1,236 @@
+"""Watch a drop directory and analyze bundles as soon as they are complete.
+
+New names are noticed through inotify when ``inotify_simple`` is installed,
+otherwise by polling the directory. A bundle is considered complete once its
+size/mtime signature has not changed for ``settle_s`` seconds (copies and
+uploads land in pieces). Complete bundles are queued onto a bounded process
+pool running :func:`analyze_in_order`; every finished bundle is published to
+``index.json`` in the output directory, which the UI reads.
+
+Each bundle keeps the artifacts dir it was first given (also across restarts,
+through the index), so ``OHT01.zip`` and a folder ``OHT01`` never share one.
+Edits inside a folder bundle raise no event at the watched level, so with
+inotify the analyzed folders are re-stat'ed every ``DONE_RESTAT_S`` seconds.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from .batch import BUNDLE_SUFFIXES, BundleSummary, artifact_dirs, run_bundle
+
+try:  # optional: event-driven wakeups instead of a directory scan per poll
+    from inotify_simple import INotify, flags
+
+    HAS_INOTIFY = True
+except ImportError:  # pragma: no cover - depends on the environment
+    HAS_INOTIFY = False
+
+INDEX_FILE = "index.json"
+IGNORED_SUFFIXES = (".part", ".tmp", ".crdownload", ".partial")
+DONE_RESTAT_S = 30.0  # inotify mode: how often analyzed folder bundles are re-stat'ed
+
+Signature = Tuple[int, int, float]  # files, bytes, newest mtime
+
+
+def _signature(path: Path) -> Optional[Signature]:
+    try:
+        if path.is_dir():
+            files = [p.stat() for p in path.rglob("*") if p.is_file()]
+            return (len(files), sum(s.st_size for s in files), max((s.st_mtime for s in files), default=0.0))
+        st = path.stat()
+        return (1, st.st_size, st.st_mtime)
+    except OSError:  # vanished or renamed mid-copy
+        return None
+
+
+def _is_candidate(path: Path) -> bool:
+    name = path.name.lower()
+    if name.startswith(".") or name.endswith(IGNORED_SUFFIXES):
+        return False
+    return path.is_dir() or name.endswith(BUNDLE_SUFFIXES)
+
+
+def load_index(out_dir: str | os.PathLike) -> List[Dict]:
+    """Published entries, newest first (empty if nothing was published yet)."""
+    try:
+        data = json.loads((Path(out_dir) / INDEX_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return []
+    return sorted(data.get("bundles", {}).values(), key=lambda e: e.get("finished_at", ""), reverse=True)
+
+
+@dataclass
+class _Pending:
+    path: Path
+    signature: Optional[Signature]
+    changed_at: float  # monotonic time the signature last changed
+    landed_at: float  # wall-clock time first seen
+
+
+class BundleWatcher:
+    def __init__(
+        self,
+        drop_dir: str | os.PathLike,
+        out_dir: str | os.PathLike,
+        axis_focus: int = 3,
+        jobs: int = 1,
+        settle_s: float = 2.0,
+        poll_s: float = 1.0,
+        on_result: Optional[Callable[[Dict], None]] = None,
+    ):
+        self.drop = Path(drop_dir)
+        self.out = Path(out_dir)
+        self.out.mkdir(parents=True, exist_ok=True)
+        self.axis_focus = axis_focus
+        self.jobs = max(1, jobs)
+        self.settle_s = settle_s
+        self.poll_s = poll_s
+        self.on_result = on_result
+        self._pending: Dict[Path, _Pending] = {}
+        self._ready: Deque[_Pending] = deque()
+        self._running: Dict[Future, _Pending] = {}
+        self._queued: Set[Path] = set()  # paths in _ready or _running
+        self._done: Dict[Path, Signature] = {}  # signature each bundle was last analyzed at
+        self._index: Dict[str, Dict] = {e["bundle"]: e for e in load_index(self.out)}
+        self._dirs: Dict[Path, Path] = {  # artifacts dir assigned to each bundle
+            Path(e["bundle"]): Path(e["artifacts_dir"]) for e in self._index.values() if e.get("artifacts_dir")
+        }
+        self._restat_at = 0.0  # monotonic time of the next _done folder re-stat
+        self._inotify = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    # --- discovery ---
+    def _start_inotify(self) -> None:
+        if not HAS_INOTIFY:
+            return
+        try:
+            self._inotify = INotify()
+            mask = flags.CREATE | flags.CLOSE_WRITE | flags.MOVED_TO | flags.MODIFY
+            self._inotify.add_watch(str(self.drop), mask)
+        except OSError:  # e.g. watch limit reached or unsupported filesystem
+            self._inotify = None
+
+    def _notice(self, path: Path) -> None:
+        if not _is_candidate(path):
+            return
+        if path in self._queued:
+            return  # ready or running; a change during the run is seen once it finishes
+        sig = _signature(path)
+        entry = self._pending.get(path)
+        if entry is None:
+            if sig is not None and self._done.get(path) == sig:
+                return  # unchanged since it was analyzed
+            self._pending[path] = _Pending(path, sig, time.monotonic(), time.time())
+        elif sig != entry.signature:
+            entry.signature, entry.changed_at = sig, time.monotonic()
+
+    def _scan(self) -> None:
+        try:
+            children = list(self.drop.iterdir())
+        except OSError:
+            return
+        for path in children:
+            self._notice(path)
+
+    def _wait_for_events(self, timeout_s: float) -> None:
+        if self._inotify is None:
+            time.sleep(timeout_s)
+            self._scan()
+            return
+        for event in self._inotify.read(timeout=int(timeout_s * 1000)):
+            if event.name:
+                self._notice(self.drop / event.name)
+        # folder bundles grow below the watched level: re-stat what is still settling
+        for path in list(self._pending):
+            self._notice(path)
+        # ... and analyzed ones may be edited in place
+        now = time.monotonic()
+        if now >= self._restat_at:
+            self._restat_at = now + DONE_RESTAT_S
+            for path in [p for p in self._done if p.is_dir()]:
+                self._notice(path)
+
+    def _promote_settled(self) -> None:
+        now = time.monotonic()
+        for path, entry in list(self._pending.items()):
+            if entry.signature is None:
+                if not path.exists():
+                    del self._pending[path]
+                continue
+            if now - entry.changed_at >= self.settle_s:
+                del self._pending[path]
+                self._ready.append(entry)
+                self._queued.add(path)
+
+    # --- execution ---
+    def _submit_ready(self) -> None:
+        while self._ready and len(self._running) < self.jobs:
+            entry = self._ready.popleft()
+            art_dir = self._artifact_dir(entry.path)
+            render_workers = 1 if self.jobs > 1 else None
+            args = (entry.path, art_dir, self.axis_focus, render_workers, False)
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.jobs)
+            self._running[self._pool.submit(run_bundle, *args)] = entry
+
+    def _artifact_dir(self, path: Path) -> Path:
+        art_dir = self._dirs.get(path)
+        if art_dir is None:
+            art_dir = self._dirs[path] = artifact_dirs([path], self.out, taken=self._dirs.values())[0]
+        return art_dir
+
+    def _collect(self) -> None:
+        for future in [f for f in self._running if f.done()]:
+            entry = self._running.pop(future)
+            self._queued.discard(entry.path)
+            try:
+                summary: BundleSummary = future.result()
+            except Exception as e:  # worker crashed; record and move on
+                summary = BundleSummary(str(entry.path), "", "error", str(self._dirs[entry.path]), error=repr(e))
+            if entry.signature is not None:
+                self._done[entry.path] = entry.signature
+            self._publish(entry, summary)
+
+    def _publish(self, entry: _Pending, summary: BundleSummary) -> None:
+        finished = time.time()
+        record = asdict(summary)
+        record.update(
+            landed_at=datetime.fromtimestamp(entry.landed_at).isoformat(timespec="seconds"),
+            finished_at=datetime.fromtimestamp(finished).isoformat(timespec="seconds"),
+            latency_s=round(finished - entry.landed_at, 3),
+        )
+        self._index[record["bundle"]] = record
+        payload = {"updated": record["finished_at"], "bundles": self._index}
+        tmp = self.out / (INDEX_FILE + ".tmp")
+        tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.out / INDEX_FILE)
+        if self.on_result is not None:
+            self.on_result(record)
+
+    def run(self, stop: Optional[Callable[[], bool]] = None) -> None:
+        """Serve until ``stop()`` returns True (or forever); existing bundles are picked up first."""
+        self.drop.mkdir(parents=True, exist_ok=True)
+        self._start_inotify()
+        self._scan()
+        try:
+            while not (stop and stop()):
+                self._promote_settled()
+                self._submit_ready()
+                self._collect()
+                # wake up early enough to catch the settle deadline and finished jobs
+                wait = min(self.poll_s, self.settle_s) if (self._pending or self._running) else self.poll_s
+                self._wait_for_events(wait)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._collect()
+            if self._inotify is not None:
+                self._inotify.close()
@@ -1,3 +1,3 @@
-from .mtrace_visualizer import visualize_from_bundle, VisualizeResult
+from .mtrace_visualizer import visualize_from_bundle, VisualizeResult, RenderQueue, is_mtrace_member
 
-__all__ = ["visualize_from_bundle", "VisualizeResult"]
+__all__ = ["visualize_from_bundle", "VisualizeResult", "RenderQueue", "is_mtrace_member"]
@@ -1,17 +1,54 @@
 from __future__ import annotations
-import io, re, math, tarfile, zipfile
+import hashlib, io, json, os, re, zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional, Dict, Tuple, Iterable
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
+from typing import List, Optional, Dict, Tuple
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from analyzer.mtrace_stream import AMC_DEFAULT_COLUMNS, stream_mtrace
+from core.config import load_config
+from oht_analyzer.bundle import iter_bundle_members
 
 # --- detection ---
 MTRACE_NAME = re.compile(r"(?i)\bM[-_]?TRACE\b")
-ENC = ("utf-8-sig","utf-8","cp949","euc-kr","latin-1")
 # AMC headerless index profile (현장 포맷 대응)
-AMC_IDX = {"time":0, "speed_cmd":3, "speed_act":4, "torque":5, "pos_cmd":6, "pos_act":9}
+AMC_IDX = AMC_DEFAULT_COLUMNS
+AMC_NAME = r"(?i)AMC[_-]?AXIS"
+
+@dataclass(frozen=True)
+class AmcProfile:
+    """Column indices of one firmware's headerless AMC_AXIS capture."""
+    version: str
+    columns: Dict[str,int]
+    name_pattern: str = AMC_NAME
+    def matches(self, name:str, ncols:int)->bool:
+        return ncols>max(self.columns.values()) and re.search(self.name_pattern, name) is not None
+
+# firmware version -> profile; later registrations are tried first
+AMC_PROFILES: Dict[str, AmcProfile] = {}
+def register_amc_profile(version:str, columns:Dict[str,int], name_pattern:str=AMC_NAME)->AmcProfile:
+    prof=AmcProfile(str(version), {k:int(v) for k,v in columns.items()}, name_pattern)
+    AMC_PROFILES.pop(prof.version, None); AMC_PROFILES[prof.version]=prof
+    return prof
+register_amc_profile("default", AMC_IDX)
+
+def _register_profiles(specs:Optional[Dict[str,dict]])->None:
+    """Register config mtrace.amc_profiles ({version: {columns: {...}, name_pattern: ...}})."""
+    for ver,spec in (specs or {}).items():
+        if isinstance(spec, dict) and spec.get("columns"):
+            register_amc_profile(ver, spec["columns"], spec.get("name_pattern") or AMC_NAME)
+
+def _profile_specs()->Dict[str,dict]:
+    return {v:{"columns":p.columns, "name_pattern":p.name_pattern} for v,p in AMC_PROFILES.items()}
+
+def amc_profile_for(name:str, ncols:int)->Optional[AmcProfile]:
+    for prof in reversed(list(AMC_PROFILES.values())):
+        if prof.matches(name, ncols): return prof
+    return None
 
 TOKENS = {
   "time":["time","timestamp","t","ms","time_ms","tick","sample","시간","타임"],
@@ -32,61 +69,14 @@ def _find_col(cols: List[str], keys: List[str])->Optional[str]:
             if t in v: return c
     return None
 
-def _read_csvlike(b: bytes) -> pd.DataFrame:
-    last=None
-    for enc in ENC:
-        try:
-            bio=io.BytesIO(b)
-            df=pd.read_csv(bio, sep=None, engine="python", encoding=enc)
-            if df.shape[1]==1:
-                bio.seek(0); df=pd.read_csv(bio, delim_whitespace=True, engine="python", encoding=enc)
-            return df
-        except Exception as e:
-            last=e
-    raise RuntimeError(last)
-
-def _build_time(df: pd.DataFrame, time_col: Optional[str]) -> pd.Series:
-    if time_col and time_col in df:
-        s=df[time_col]; s2=pd.to_numeric(s, errors="coerce")
-        if s2.notna().mean()>0.9:
-            med=s2.dropna().median()
-            return (s2/1000.0) if 1000<med<1e9 else s2
-        try:
-            ts=pd.to_datetime(s); return (ts-ts.iloc[0]).dt.total_seconds()
-        except Exception: pass
-    return pd.Series(np.arange(len(df))*0.001, name="time_s")
-
-def _downsample(df: pd.DataFrame, max_points:int)->pd.DataFrame:
-    n=len(df)
-    if n<=max_points: return df
-    step=math.ceil(n/max_points); return df.iloc[::step,:].reset_index(drop=True)
-
 def _plot_dual(time_s, lefts, labels, right, ylabel_left, title, outp: Path):
-    fig=plt.figure(figsize=(12,5))
-    ax1=plt.gca()
+    # object-oriented Agg API: no pyplot global state, safe in worker processes
+    fig=Figure(figsize=(12,5)); FigureCanvasAgg(fig)
+    ax1=fig.add_subplot()
     for s,l in zip(lefts,labels): ax1.plot(time_s, s, label=l)
     ax1.set_xlabel("Time (s)"); ax1.set_ylabel(ylabel_left); ax1.legend(loc="upper left")
     ax2=ax1.twinx(); ax2.plot(time_s, right, label="Torque", alpha=0.85); ax2.set_ylabel("Torque")
-    plt.title(title); fig.tight_layout(); fig.savefig(outp,dpi=150); plt.close(fig)
-
-def _iter_streams(bundle: Path):
-    if bundle.is_dir():
-        for fp in bundle.rglob("*"):
-            if fp.is_file(): yield (str(fp), fp.read_bytes()); 
-        return
-    low=bundle.name.lower()
-    if low.endswith(".zip"):
-        with zipfile.ZipFile(bundle,"r") as zp:
-            for n in zp.namelist(): yield (n, zp.read(n))
-        return
-    if low.endswith((".tar",".tar.gz",".tgz",".tar.bz2",".tbz2",".tar.xz",".txz")):
-        with tarfile.open(bundle,"r:*") as tp:
-            for m in tp.getmembers():
-                if not m.isfile(): continue
-                f=tp.extractfile(m); 
-                if f: yield (m.name, f.read())
-        return
-    if bundle.is_file(): yield (bundle.name, bundle.read_bytes())
+    ax1.set_title(title); fig.tight_layout(); fig.savefig(outp,dpi=150)
 
 @dataclass
 class VisualizeResult:
@@ -94,82 +84,162 @@ class VisualizeResult:
     speed_png: Optional[Path]
     pos_png: Optional[Path]
     notes: str
+    analysis_csv: Optional[Path] = None
+
+def _column_mapper(name:str):
+    """map_columns callback for stream_mtrace: header tokens first, then the AMC headerless profile."""
+    def _map(cols: List[str], has_header: bool)->Tuple[Dict[str,Optional[str]], str]:
+        mapping={k:_find_col(cols,TOKENS[k]) for k in ("time","torque","speed_act","speed_cmd","pos_act","pos_cmd")}
+        if any(mapping.values()):
+            return mapping, "header"
+        # AMC headerless (all numeric, name matches a registered firmware profile)
+        prof=None if has_header else amc_profile_for(Path(name).name, len(cols))
+        if prof:
+            return {k:cols[i] for k,i in prof.columns.items()}, "amc_idx"
+        return mapping, "header"
+    return _map
+
+def _write_analysis(analysis, out: Path, safe: str)->Path:
+    """intervals (following error / torque saturation) + step response + spectrum, one CSV each."""
+    path=out/(safe+"_intervals.csv")
+    analysis.intervals.to_csv(path, index=False)
+    analysis.steps.to_csv(out/(safe+"_steps.csv"), index=False)
+    analysis.spectrum.to_csv(out/(safe+"_spectrum.csv"), index=False)
+    return path
 
-def _by_header_or_profile(name:str, b:bytes)->Tuple[pd.DataFrame, Dict[str,Optional[str]], str]:
-    """Return (df, mapping, mode) where mode in {'header','amc_idx'}."""
-    # try header first
-    df=_read_csvlike(b)
-    cols=list(df.columns)
-    mapping={
-        "time":_find_col(cols,TOKENS["time"]),
-        "torque":_find_col(cols,TOKENS["torque"]),
-        "speed_act":_find_col(cols,TOKENS["speed_act"]),
-        "speed_cmd":_find_col(cols,TOKENS["speed_cmd"]),
-        "pos_act":_find_col(cols,TOKENS["pos_act"]),
-        "pos_cmd":_find_col(cols,TOKENS["pos_cmd"]),
-    }
-    if any(mapping.values()):
-        return df, mapping, "header"
-    # AMC headerless (all numeric, name has AMC_AXIS)
-    text=io.BytesIO(b).getvalue().decode("latin-1","ignore")
-    lines=[ln for ln in text.splitlines() if ln.strip()]
-    nums=[]
-    import re as _re
-    for ln in lines[:200]:
-        try: nums.append([float(x) for x in _re.split(r"[\t,\s]+", ln.strip()) if x!=""])
-        except: pass
-    if nums and len(nums[0])>max(AMC_IDX.values()) and re.search(r"(?i)AMC[_-]?AXIS", Path(name).name):
-        rows=[]
-        for ln in lines:
-            try: rows.append([float(x) for x in _re.split(r"[\t,\s]+", ln.strip()) if x!=""])
-            except: pass
-        arr=np.array(rows, dtype=float)
-        df=pd.DataFrame(arr); df.columns=[f"{i}" for i in range(df.shape[1])]
-        mapping={k:f"{AMC_IDX[k]}" for k in AMC_IDX}
-        return df, mapping, "amc_idx"
-    return df, mapping, "header"
-
-def visualize_from_bundle(bundle_path, out_dir, smooth_window=1, max_points=120_000):
-    bundle=Path(bundle_path); out=Path(out_dir); out.mkdir(parents=True, exist_ok=True)
-    results=[]; found=False
-    for name, data in _iter_streams(bundle):
-        base=Path(name).name
-        if not MTRACE_NAME.search(base): continue
-        found=True
+@contextmanager
+def _open_source(source):
+    """Worker side of a render job: zip members are reopened by name, tar members arrive as bytes."""
+    if isinstance(source, bytes):
+        yield io.BytesIO(source); return
+    kind, path, member=source
+    if kind=="zip":
+        with zipfile.ZipFile(path, "r") as zp, zp.open(member) as fh: yield fh
+        return
+    with open(path, "rb") as fh: yield fh
+
+def _render_member(name, source, out: Path, max_points, options, profiles=None)->VisualizeResult:
+    base=Path(name).name
+    _register_profiles(profiles)  # worker processes start with the built-in registry only
+    try:
+        # members are streamed in chunks; only decimated rows + running stats are kept
+        with _open_source(source) as fh:
+            stream=stream_mtrace(fh, _column_mapper(base), max_points, analytics=options)
+        mapping, mode=stream.mapping, stream.mode
+        if stream.frame.empty:
+            return VisualizeResult(name,None,None,"No recognizable columns")
+        t=stream.frame["__t__"]; df=stream.frame.drop(columns=["__t__"])
+        safe=re.sub(r"[^a-zA-Z0-9._-]+","_", base)
+        csv_path=_write_analysis(stream.analysis, out, safe)
+        sp=out/(safe+"_speed_vs_torque.png"); ps=out/(safe+"_position_vs_torque.png")
+        # speed vs torque
+        if mapping.get("torque") and mapping.get("speed_act"):
+            left=[df[mapping["speed_act"]]]; labels=["Actual Speed"]
+            if mapping.get("speed_cmd"): left.append(df[mapping["speed_cmd"]]); labels.append("Command Speed")
+            _plot_dual(t, left, labels, df[mapping["torque"]], "Speed", "Speed vs Torque (left: speed, right: torque)", sp)
+        else: sp=None
+        # position vs torque
+        if mapping.get("torque") and mapping.get("pos_act"):
+            left=[df[mapping["pos_act"]]]; labels=["Actual Position"]
+            if mapping.get("pos_cmd"): left.append(df[mapping["pos_cmd"]]); labels.append("Command Position")
+            _plot_dual(t, left, labels, df[mapping["torque"]], "Position", "Position vs Torque (left: position, right: torque)", ps)
+        else: ps=None
+        st=stream.stats.summary()
+        notes=f"mode={mode}; rows={st['rows']}; torque_peak={st['torque_peak']:.3f}; speed_err_max={st['speed_error_max']:.3f}; pos_err_max={st['pos_error_max']:.3f}"
+        return VisualizeResult(name, sp, ps, notes, csv_path)
+    except Exception as e:
+        return VisualizeResult(name, None, None, f"Error: {e!r}")
+
+# --- render cache: member content hash -> outputs ---
+RENDER_CACHE="render_cache.json"
+RENDER_VERSION="1"  # bump when plots/CSVs change for identical input
+
+def _cache_key(fingerprint:str, max_points, options)->str:
+    raw=json.dumps([RENDER_VERSION, fingerprint, max_points, options], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _load_cache(out: Path)->Dict[str, dict]:
+    try: return json.loads((out/RENDER_CACHE).read_text(encoding="utf-8"))
+    except (OSError, ValueError): return {}
+
+def _cached_result(entry: Optional[dict], key:str)->Optional[VisualizeResult]:
+    if not entry or entry.get("key")!=key: return None
+    paths=[entry.get(k) for k in ("speed_png","pos_png","analysis_csv")]
+    if any(p and not Path(p).exists() for p in paths): return None
+    sp, ps, csv=[Path(p) if p else None for p in paths]
+    return VisualizeResult(entry["source"], sp, ps, entry["notes"]+"; cached", csv)
+
+def _cache_entry(key:str, r: VisualizeResult)->dict:
+    return {"key":key, "source":r.source, "speed_png":str(r.speed_png) if r.speed_png else None,
+            "pos_png":str(r.pos_png) if r.pos_png else None, "notes":r.notes,
+            "analysis_csv":str(r.analysis_csv) if r.analysis_csv else None}
+
+def is_mtrace_member(name:str)->bool:
+    return bool(MTRACE_NAME.search(Path(name).name))
+
+class RenderQueue:
+    """Accepts bundle members one at a time while the bundle is being walked.
+
+    Cache hits resolve immediately; other members render in-process (workers=1)
+    or are submitted to a process pool with at most 2*workers jobs in flight,
+    so tar member bytes are not accumulated for the whole bundle.
+    """
+    def __init__(self, out_dir, max_points=120_000, workers:Optional[int]=None, use_cache=True):
+        self.out=Path(out_dir); self.out.mkdir(parents=True, exist_ok=True)
+        self.max_points=max_points; self.use_cache=use_cache
+        self.workers=workers or (os.cpu_count() or 1)
+        self.options=dict(load_config().get("mtrace") or {}); self.options.pop("anchor_window_s", None)
+        _register_profiles(self.options.pop("amc_profiles", None)); self.profiles=_profile_specs()
+        self.cache=_load_cache(self.out) if use_cache else {}
+        self.results: List[Optional[VisualizeResult]]=[]
+        self._pool: Optional[ProcessPoolExecutor]=None; self._inflight: deque=deque()
+
+    accepts=staticmethod(is_mtrace_member)
+
+    def add(self, member)->None:
+        if member.kind=="tar":
+            # tar members cannot be reopened cheaply by name: hash + ship the bytes
+            data=member.read_bytes()
+            fingerprint="sha256:"+hashlib.sha256(data).hexdigest(); source=data
+        else:
+            fingerprint=member.fingerprint()
+            source=("zip", str(member.bundle), member.name) if member.kind=="zip" else ("path", member.name if member.kind=="dir" else str(member.bundle), None)
+        key=_cache_key(fingerprint, self.max_points, [self.options, self.profiles])
+        hit=_cached_result(self.cache.get(member.name), key)
+        self.results.append(hit)
+        if hit is not None: return
+        slot=len(self.results)-1; args=(member.name, source, self.out, self.max_points, self.options, self.profiles)
+        if self.workers<=1:
+            self._store(slot, key, _render_member(*args)); return
+        if self._pool is None: self._pool=ProcessPoolExecutor(max_workers=self.workers)
+        self._inflight.append((slot, key, self._pool.submit(_render_member, *args)))
+        while len(self._inflight)>2*self.workers: self._drain_one()
+
+    def _store(self, slot, key, r: VisualizeResult):
+        self.results[slot]=r
+        if not r.notes.startswith("Error"): self.cache[r.source]=_cache_entry(key, r)
+
+    def _drain_one(self):
+        slot, key, fut=self._inflight.popleft(); self._store(slot, key, fut.result())
+
+    def finish(self)->List[VisualizeResult]:
         try:
-            df, mapping, mode=_by_header_or_profile(base, data)
-            keep=[c for c in [mapping.get("time"),mapping.get("torque"),mapping.get("speed_act"),mapping.get("speed_cmd"),mapping.get("pos_act"),mapping.get("pos_cmd")] if c]
-            if not keep:
-                results.append(VisualizeResult(name,None,None,"No recognizable columns")); continue
-            # time
-            if mode=="header":
-                t=_build_time(df, mapping.get("time"))
-            else:
-                t=pd.to_numeric(df[mapping["time"]], errors="coerce")
-                dt=float(t.diff().median()) if len(t)>1 else 1.0
-                scale=1000.0 if 1.0<=dt<=20.0 else 1.0
-                t=(t - t.iloc[0]) / scale
-            # numeric + downsample
-            for c in keep: df[c]=pd.to_numeric(df[c], errors="coerce")
-            tmp=pd.DataFrame({"__t__":t}); [tmp.__setitem__(c, df[c]) for c in keep]
-            tmp=_downsample(tmp, max_points); t=tmp["__t__"]; df=tmp.drop(columns=["__t__"])
-            safe=re.sub(r"[^a-zA-Z0-9._-]+","_", base)
-            sp=out/(safe+"_speed_vs_torque.png"); ps=out/(safe+"_position_vs_torque.png")
-            # speed vs torque
-            if mapping.get("torque") and mapping.get("speed_act"):
-                left=[df[mapping["speed_act"]]]; labels=["Actual Speed"]
-                if mapping.get("speed_cmd"): left.append(df[mapping["speed_cmd"]]); labels.append("Command Speed")
-                _plot_dual(t, left, labels, df[mapping["torque"]], "Speed", "Speed vs Torque (left: speed, right: torque)", sp)
-            else: sp=None
-            # position vs torque
-            if mapping.get("torque") and mapping.get("pos_act"):
-                left=[df[mapping["pos_act"]]]; labels=["Actual Position"]
-                if mapping.get("pos_cmd"): left.append(df[mapping["pos_cmd"]]); labels.append("Command Position")
-                _plot_dual(t, left, labels, df[mapping["torque"]], "Position", "Position vs Torque (left: position, right: torque)", ps)
-            else: ps=None
-            results.append(VisualizeResult(name, sp, ps, f"mode={mode}"))
-        except Exception as e:
-            results.append(VisualizeResult(name, None, None, f"Error: {e!r}"))
-    if not found:
-        results.append(VisualizeResult(str(bundle), None, None, "No M-Trace files found"))
-    return results
+            while self._inflight: self._drain_one()
+        finally:
+            if self._pool is not None: self._pool.shutdown(); self._pool=None
+        if self.use_cache:
+            (self.out/RENDER_CACHE).write_text(json.dumps(self.cache, ensure_ascii=False, indent=2), encoding="utf-8")
+        return list(self.results)
+
+def visualize_from_bundle(bundle_path, out_dir, smooth_window=1, max_points=120_000, workers:Optional[int]=None, use_cache=True):
+    """Render every M-Trace member of the bundle.
+
+    workers: process count (None = cpu count, 1 = in-process). Members whose
+    content hash matches render_cache.json (and whose outputs still exist) are
+    skipped.
+    """
+    bundle=Path(bundle_path); queue=RenderQueue(out_dir, max_points, workers, use_cache)
+    for member in iter_bundle_members(bundle, name_filter=is_mtrace_member):
+        queue.add(member)
+    results=queue.finish()
+    return results or [VisualizeResult(str(bundle), None, None, "No M-Trace files found")]
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""Follow growing OHT logs and print banner events as they change (live triage)."""
+from __future__ import annotations
+
+# Ensure repo root importable when running from scripts/
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import argparse
+import json
+
+from analyzer.engine import LiveAnalyzer
+from analyzer.parser import FileTailer
+from analyzer.rules import RuleSet
+from analyzer.storage import DATA, load_rules, load_source_index
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Tail log files/folders and emit new or updated error banners")
+    ap.add_argument("paths", nargs="+", help="Log files or folders to follow (rotated files are handled)")
+    ap.add_argument("--state", default=str(DATA / "follow_offsets.json"), help="Persistent read offsets")
+    ap.add_argument("--from-end", action="store_true", help="Skip what is already in the files on first start")
+    ap.add_argument("--interval", type=float, default=1.0, help="Seconds between polls when idle")
+    ap.add_argument("--codes", nargs="*", help="Only these error codes (e.g. E960 464)")
+    ap.add_argument("--source-mode", default=None, help="Code source mode (same as the app)")
+    args = ap.parse_args()
+
+    rules = RuleSet(load_rules(), code_index=load_source_index())
+    live = LiveAnalyzer(rules, target_codes=args.codes, source_mode=args.source_mode)
+    tailer = FileTailer(args.paths, state_path=Path(args.state), from_end=args.from_end)
+    try:
+        for batch in tailer.follow(args.interval):
+            for event in live.feed_many(batch):
+                print(json.dumps(event, ensure_ascii=False), flush=True)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
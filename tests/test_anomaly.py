@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import random
+from collections import Counter
+
+from analyzer.anomaly import BucketCounts, RateAnomalies
+from analyzer.templates import TemplateMiner
+
+HOUR_MS = 3_600_000
+BEFORE_MS = 3_000
+
+
+def _stamp(ts: int) -> str:
+    return f"[{ts // 3_600_000:02d}:{ts // 60_000 % 60:02d}:{ts // 1000 % 60:02d}.{ts % 1000:03d}]"
+
+
+def _word(k: int) -> str:
+    return "".join("abcdefghijklmnopqrstuvwxyz"[d] for d in divmod(k, 26))
+
+
+def _stationary(rng: random.Random, n: int = 200_000):
+    """Heartbeat every 18 ms plus background messages at random times (no bursts).
+
+    The 40 status shapes spread the lines over many (template, second)
+    keys; each must be counted exactly, or steady templates look like bursts.
+    """
+    background = ["AMC axis {} position {} ok", "User {} login", "CMD {} accepted id {}"]
+    background += [f"Module {_word(k)} status {{}} load {{}}" for k in range(40)]
+    lines = [(ts, f"{_stamp(ts)} HB tick {i}") for i, ts in enumerate(range(0, n * 18, 18))]
+    end = lines[-1][0]
+    for fmt in background:
+        for _ in range(end // 1_500):
+            ts = rng.randrange(end)
+            lines.append((ts, f"{_stamp(ts)} " + fmt.format(rng.randrange(8), rng.randrange(1000))))
+    lines.sort()
+    return lines
+
+
+def _feed(lines):
+    miner, rates = TemplateMiner(), RateAnomalies()
+    for ts, line in lines:
+        rates.add(miner.add(line, ts), ts)
+    return miner, rates
+
+
+def test_stationary_log_has_no_burst_suggestions():
+    rng = random.Random(7)
+    lines = _stationary(rng)
+    miner, rates = _feed(lines)
+    end = lines[-1][0]
+    anchors = [rng.randrange(BEFORE_MS + 60_000, end) for _ in range(200)]
+    windows = {"E101": [(ts, ts) for ts in sorted(anchors)]}
+    found = rates.suggest(miner, windows, BEFORE_MS)["E101"]
+    assert [c for c in found if c["kind"] == "burst"] == []
+
+
+def test_window_counts_are_exact():
+    lines = _stationary(random.Random(3), n=50_000)
+    miner, rates = _feed(lines)
+    hb = miner.add(f"{_stamp(0)} HB tick 0")
+    for start in (1_234, 100_000, 555_555):
+        first, last = start // 1000 * 1000, (start + BEFORE_MS - 1) // 1000 * 1000 + 1000
+        truth = sum(1 for ts, line in lines if first <= ts < last and " HB " in line)
+        assert rates.window_count(hb, start, start + BEFORE_MS) == truth
+
+
+def test_bucket_counts_merge_batches_exactly():
+    rng = random.Random(5)
+    counts, truth = BucketCounts(), Counter()
+    for _ in range(20):
+        for _ in range(rng.randrange(1, 3_000)):
+            tid, bucket = rng.randrange(50), rng.randrange(400)
+            counts.add((tid << 32) | bucket)
+            truth[tid, bucket] += 1
+        counts.flush()
+    assert len(counts.keys) == len(truth)
+    for tid in (0, 17, 49):
+        assert counts.count(tid, 100, 199) == sum(n for (t, b), n in truth.items() if t == tid and 100 <= b <= 199)
+
+
+def test_active_templates_match_the_histograms():
+    lines = _stationary(random.Random(9), n=50_000)
+    miner, _ = _feed(lines)
+    for start in (0, 59_999, 300_000, 899_000):
+        end = start + BEFORE_MS - 1
+        expected = [t.id for t in miner.templates if miner.count_between(t.id, start, end)]
+        assert miner.active_between(start, end) == expected
+
+
+def test_burst_and_new_message_are_suggested():
+    rng = random.Random(11)
+    lines = _stationary(rng, n=100_000)
+    anchor = 1_000_000
+    for ts in range(anchor - 2_000, anchor, 100):  # 20 lines in 2 s, normally ~2 per 3 s
+        lines.append((ts, f"{_stamp(ts)} User {rng.randrange(8)} login"))
+    lines.append((anchor - 500, f"{_stamp(anchor - 500)} Servo overheat warning"))
+    lines.sort()
+    miner, rates = _feed(lines)
+    found = {c["template"].split(" ", 1)[1]: c for c in rates.suggest(miner, {"E101": [(anchor, anchor)]}, BEFORE_MS)["E101"]}
+    assert found["User <*> login"]["kind"] == "burst"
+    assert found["Servo overheat warning"]["kind"] == "new"
+    assert found["Servo overheat warning"]["observed"] == 1
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from oht_analyzer.pipeline.analysis_order import (
+    AMC_RECV_PATTERNS,
+    MASTER_PATTERNS,
+    _DONE,
+    _TextStage,
+    _text_item,
+)
+from oht_analyzer.pipeline.crosslog import correlate
+
+INCIDENTS = 5_000
+
+
+def _stamp(ts: int) -> str:
+    return f"[{ts // 3_600_000:02d}:{ts // 60_000 % 60:02d}:{ts // 1000 % 60:02d}.{ts % 1000:03d}]"
+
+
+def _consume(stage: _TextStage, name: str, lines) -> None:
+    stage.queue.put((name, "\n".join(lines).encode()))
+    stage.queue.put(_DONE)
+    stage.consume({})
+
+
+def test_every_error_line_reaches_the_time_join():
+    # each master fault is answered by the AMC 2 ms later; faults are 2 s
+    # apart, so each pair is its own incident
+    master, amc = [], []
+    for i in range(INCIDENTS):
+        ts = 3_600_000 + i * 2_000
+        master.append(f"{_stamp(ts)} ERROR servo fault 0x1{i % 3}")
+        amc.append(f"{_stamp(ts + 1)} recv status ok")
+        amc.append(f"{_stamp(ts + 2)} ALARM axis {i % 4} stop")
+        amc.append(f"{_stamp(ts + 500)} recv status ok")
+    options = {"sample_size": 50}
+    master_stage = _TextStage("master", MASTER_PATTERNS, _text_item, options)
+    amc_stage = _TextStage("amc_recv", AMC_RECV_PATTERNS, _text_item, options)
+    _consume(master_stage, "log/master.log", master)
+    _consume(amc_stage, "log/amc_recv.log", amc)
+
+    assert len(master_stage.items[0]["errors"]) == 50  # the report keeps its sample
+    incidents = correlate([master_stage.events, amc_stage.events], {"max_incidents": INCIDENTS * 2})
+    assert len(incidents) == INCIDENTS
+    assert all(inc["cause"] == "master" and inc["links"] == 1 for inc in incidents)
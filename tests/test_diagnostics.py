@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from analyzer import diagnostics
+
+
+def test_source_context_is_cached_until_the_index_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(diagnostics, "SOURCE_INDEX_FILE", tmp_path / "source_index.json")
+    src = tmp_path / "src" / "err.c"
+    src.parent.mkdir()
+    src.write_text("\n".join(f"old {i}" for i in range(20)), encoding="utf-8")
+    index = {"provenance": {"101": [{"file": str(src), "line": 5}]}, "meta": {"paths": [str(src.parent)], "index_version": 1}}
+
+    first = diagnostics._collect_source_context("101", "E_SLIDE", index)
+    first[0]["context"].clear()  # callers get copies
+    assert diagnostics._collect_source_context("101", "E_SLIDE", index)[0]["context"][0]["text"] == "old 1"
+
+    src.write_text("\n".join(f"new {i}" for i in range(20)), encoding="utf-8")
+    assert diagnostics._collect_source_context("101", "E_SLIDE", index)[0]["context"][0]["text"] == "old 1"
+    index["meta"]["index_version"] = 2  # re-index
+    assert diagnostics._collect_source_context("101", "E_SLIDE", index)[0]["context"][0]["text"] == "new 1"
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from oht_analyzer.pipeline.errscan import scan_errors
+
+
+def test_on_hit_sees_every_error_line_while_sample_stays_bounded():
+    lines = []
+    for i in range(20_000):
+        lines.append(f"[10:00:00.000] ok {i}")
+        lines.append(f"[10:00:00.000] ERROR code {i % 7}")
+    seen = []
+    scan = scan_errors("\n".join(lines), {"sample_size": 50}, on_hit=lambda no, text: seen.append(no))
+
+    assert scan.total == 20_000
+    assert len(scan.sample) == 50
+    assert seen == list(range(2, 40_001, 2))
+    assert sum(sig["count"] for sig in scan.signatures) == scan.total
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from analyzer import engine, storage
+from analyzer.report import ms_to_hms
+from analyzer.rules import RuleSet
+
+
+def _live(monkeypatch) -> engine.LiveAnalyzer:
+    monkeypatch.setattr(storage, "required_sources_present", lambda *a, **k: True)
+    monkeypatch.setattr(engine, "assert_required_sources", lambda *a, **k: None)
+    return engine.LiveAnalyzer(RuleSet(storage.load_rules()))
+
+
+def test_live_times_stay_times_of_day_past_midnight(monkeypatch):
+    live = _live(monkeypatch)
+    live.feed("[master]_a.log", ["[23:59:59.000] [E101] slide overcurrent"])
+    (event,) = live.feed("[master]_a.log", ["[00:00:00.500] [E101] slide overcurrent"])
+
+    banner = event["banner"]
+    assert (ms_to_hms(banner["first"]), ms_to_hms(banner["last"])) == ("23:59:59.000", "00:00:00.500")
+    assert banner["count"] == 2  # one window across midnight
+    snap = live.snapshot()
+    assert [ms_to_hms(a["ts"]) for a in snap["by_code"]["101"]["anchors"]] == ["23:59:59.000", "00:00:00.500"]
+    assert snap["code_windows"]["101"] == [(engine.DAY_MS - 1_000, 500)]
+
+
+def test_ms_to_hms_does_not_wrap_hours():
+    assert ms_to_hms(25 * 3_600_000 + 1) == "25:00:00.001"
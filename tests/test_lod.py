@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import numpy as np
+
+from analyzer.lod import TracePyramid
+
+
+def _pyramid(n: int = 400_000, k: int = 3, seed: int = 0) -> TracePyramid:
+    rng = np.random.default_rng(seed)
+    time = np.arange(n) * 0.001  # 1 kHz
+    values = np.cumsum(rng.normal(size=(n, k)), axis=0)
+    values[99_990, 0] = 2e6  # larger spike just before the query range ...
+    values[100_005, 0] = 1e6  # ... sharing a bucket with the one inside it
+    return TracePyramid(time, values, [f"c{i}" for i in range(k)])
+
+
+def test_spike_at_the_range_edge_is_kept():
+    pyramid = _pyramid()
+    frame = pyramid.query(100.0, 200.0, 500)
+    assert len(frame) <= 500
+    assert frame["c0"].max() == 1e6
+
+
+def test_query_keeps_every_columns_extrema():
+    pyramid = _pyramid()
+    rng = np.random.default_rng(1)
+    ranges = [(0.5, 0.6, 100), (100.0, 200.0, 500)]
+    ranges += [(a, a + w, int(m)) for a, w, m in zip(rng.uniform(0, 390, 30), rng.uniform(0.05, 300, 30), rng.integers(40, 3000, 30))]
+    for start, end, max_points in ranges:
+        idx = pyramid.query_indices(start, end, max_points)
+        i0, i1 = pyramid.row_range(start, end)
+        window = pyramid.values[i0:i1]
+        assert len(idx) <= max_points
+        assert idx.min() >= i0 and idx.max() < i1
+        np.testing.assert_array_equal(pyramid.values[idx].max(axis=0), window.max(axis=0))
+        np.testing.assert_array_equal(pyramid.values[idx].min(axis=0), window.min(axis=0))
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from analyzer import trace_store
+from analyzer.trace import collect_trace_datasets
+
+pytestmark = pytest.mark.skipif(not trace_store.HAS_FEATHER, reason="needs pyarrow")
+
+
+class _Rules:
+    def categorize(self, name: str) -> str:
+        return "트레이스_M" if "M-TRACE" in name else "기타"
+
+    def axis_name(self, num: str) -> str:
+        return f"axis{num}"
+
+
+def test_pruned_entry_is_parsed_again_from_the_source(tmp_path, monkeypatch):
+    monkeypatch.setattr(trace_store, "TRACE_CACHE_DIR", tmp_path / "cache")
+    log = tmp_path / "M-TRACE_AXIS[2].log"
+    rows = ["time_ms,command_position,actual_position"]
+    rows += [f"{i},{i // 100},{i / 100:.2f}" for i in range(2_000)]
+    log.write_text("\n".join(rows), encoding="utf-8")
+
+    (dataset,) = collect_trace_datasets([log], _Rules(), {})
+    assert dataset.cache_key is not None and dataset._frame is None
+    assert trace_store.prune_cache(max_bytes=0, grace_s=-1) == 1
+
+    frame = dataset.load(["actual_position"])
+    np.testing.assert_allclose(frame["actual_position"].to_numpy()[-1], 19.99, rtol=1e-6)
+    assert trace_store.read_meta(dataset.cache_key) is not None  # cached again
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import json
+
+from oht_analyzer.pipeline.watcher import INDEX_FILE, BundleWatcher, _signature
+
+
+class _QuietInotify:
+    def read(self, timeout=None):
+        return []
+
+
+def test_bundles_with_one_stem_get_their_own_artifacts_dirs(tmp_path):
+    drop, out = tmp_path / "drop", tmp_path / "out"
+    bundles = [drop / "OHT01.zip", drop / "OHT01.tar.gz", drop / "OHT01"]
+    watcher = BundleWatcher(drop, out)
+    dirs = [watcher._artifact_dir(bundle) for bundle in bundles]
+    assert len(set(dirs)) == 3
+    assert watcher._artifact_dir(bundles[0]) == dirs[0]
+
+    # a restarted watcher takes the assignments over from the index
+    index = {str(b): {"bundle": str(b), "artifacts_dir": str(d)} for b, d in zip(bundles[:2], dirs[:2])}
+    (out / INDEX_FILE).write_text(json.dumps({"bundles": index}), encoding="utf-8")
+    restarted = BundleWatcher(drop, out)
+    assert restarted._artifact_dir(bundles[2]) not in dirs[:2]
+    assert restarted._artifact_dir(bundles[1]) == dirs[1]
+
+
+def test_edit_inside_analyzed_folder_is_noticed_with_inotify(tmp_path):
+    drop, out = tmp_path / "drop", tmp_path / "out"
+    folder = drop / "OHT02"
+    folder.mkdir(parents=True)
+    (folder / "master.log").write_text("[10:00:00.000] ERROR a\n", encoding="utf-8")
+    watcher = BundleWatcher(drop, out)
+    watcher._inotify = _QuietInotify()
+    watcher._done[folder] = _signature(folder)
+
+    watcher._wait_for_events(0)
+    assert folder not in watcher._pending
+
+    (folder / "master.log").write_text("[10:00:00.000] ERROR a\n[10:00:01.000] ERROR b\n", encoding="utf-8")
+    watcher._wait_for_events(0)
+    assert folder not in watcher._pending  # not re-stat'ed before DONE_RESTAT_S
+    watcher._restat_at = 0.0
+    watcher._wait_for_events(0)
+    assert folder in watcher._pending